@@ -0,0 +1,21 @@
+from referrals.models import ReferralStats
+from utils.mongo import analytics_alias
+from utils.mongo_async import get_async_db
+from .services import LEADERBOARD_FILTER, LEADERBOARD_SORT, leaderboard_row
+
+
+async def get_top_referrers(limit=10, offset=0):
+    """
+    Async top users by successful referrals.
+    """
+
+    stats = get_async_db(analytics_alias())[ReferralStats._get_collection_name()]
+
+    cursor = (
+        stats.find(LEADERBOARD_FILTER, {"user": 1, "successful_referrals": 1})
+        .sort(LEADERBOARD_SORT)
+        .skip(offset)
+        .limit(limit)
+    )
+
+    return [leaderboard_row(r) for r in await cursor.to_list(None)]
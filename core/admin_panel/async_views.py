@@ -0,0 +1,21 @@
+from rest_framework import status
+from utils.async_api import async_api_view, json_response
+from utils.auth import authenticate_async
+from utils.isAdmin import isAdminAsync as is_admin_async
+
+from . import async_services
+from .services import parse_leaderboard_params
+
+
+@async_api_view(["GET"])
+@authenticate_async
+@is_admin_async
+async def admin_top_referrers(request):
+
+    try:
+        limit, offset = parse_leaderboard_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await async_services.get_top_referrers(limit=limit, offset=offset)
+    return json_response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,602 @@
+"""
+Endpoint benchmark harness.
+
+Seeds a scratch database, drives every named API route through the
+Django test clients (AsyncClient for async views) and records latency,
+throughput and the Mongo commands each request issued. Results are
+plain dicts so the bench_endpoints command can store them as JSON and
+compare runs across commits.
+"""
+
+import asyncio
+import random
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+import jwt
+from bson import ObjectId
+from django.conf import settings
+from django.test import AsyncClient, Client
+from django.urls import URLResolver, get_resolver, reverse
+from mongoengine import connect, disconnect_all
+from mongoengine.connection import get_db
+from pymongo import monitoring
+
+from admin_panel.models import CreditJob
+from referrals.balances import verify_balances
+from referrals.config_cache import reward_config_cache
+from referrals.models import Referral, RewardConfig, RewardLedger
+from referrals.rollups import rebuild_rollups
+from referrals.stats import rebuild_stats
+from referrals.tree import rebuild_ancestry
+from user_auth.models import Otp, Session, User
+from utils.auth import SECRET_KEY
+from utils.hashing import hashing_pool
+from utils.mongo import check_scratch_database, register_connections
+from utils.principal_cache import principal_cache
+
+BENCH_PASSWORD = "benchmark-password"
+BENCH_OTP = "123456"
+BACKENDS = ("mongod", "mongomock")
+
+
+# -----------------------------------
+# Mongo command counting
+# -----------------------------------
+class CommandCounter(monitoring.CommandListener):
+    """
+    Counts every command sent by any pymongo client in the process.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        with self._lock:
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def use_scratch_database(name, backend):
+    """
+    Points every mongoengine alias at a scratch database (dropped first).
+    mongomock emits no command events, so op counts need a real mongod.
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}")
+
+    check_scratch_database(name)
+
+    disconnect_all()
+
+    if backend == "mongomock":
+        import mongomock  # optional: only needed for --backend mongomock
+
+        for alias in settings.MONGO_DATABASES:
+            connect(
+                db=name,
+                alias=alias,
+                host="mongodb://localhost",
+                mongo_client_class=mongomock.MongoClient,
+            )
+    else:
+        register_connections(settings.MONGO_DATABASES, name=name)
+
+    get_db().client.drop_database(name)
+
+    principal_cache.clear()
+    reward_config_cache.invalidate()
+
+
+# -----------------------------------
+# Seeding
+# -----------------------------------
+def _token(user_id):
+    payload = {
+        "user_id": str(user_id),
+        "exp": datetime.now() + timedelta(days=1),
+        "jti": uuid.uuid4().hex,  # distinct tokens for the same user
+    }
+
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+def _insert(model, docs, batch_size=10_000):
+    collection = model._get_collection()
+
+    for start in range(0, len(docs), batch_size):
+        collection.insert_many(docs[start : start + batch_size], ordered=False)
+
+
+def _users(prefix, count, password, verified=True, admin=False):
+    now = datetime.now()
+    docs = [
+        {
+            "_id": ObjectId(),
+            "name": f"{prefix} {i}",
+            "email": f"{prefix}-{i}@bench.local",
+            "password": password,
+            "is_verified": verified,
+            "isAdmin": admin,
+            "created_at": now,
+        }
+        for i in range(count)
+    ]
+    _insert(User, docs)
+
+    return docs
+
+
+def _sessions(user_ids):
+    now = datetime.now()
+    docs = [
+        {"user": user_id, "token": _token(user_id), "created_at": now}
+        for user_id in user_ids
+    ]
+    _insert(Session, docs)
+
+    return [doc["token"] for doc in docs]
+
+
+def seed(users=5000, referrals=20000, success_rate=0.6, fixtures=210, bulk_size=100):
+    """
+    Seeds users, referrals, ledger rows and the derived stats and rollups,
+    plus `fixtures` single-use items for every mutating endpoint.
+    Returns the fixtures the scenarios read.
+    """
+
+    random.seed(0)
+    password = hashing_pool.hash_password(BENCH_PASSWORD)
+    now = datetime.utcnow()
+
+    population = _users("user", users, password)
+    admin = _users("admin", 1, password, admin=True)[0]
+    bench_user = population[0]  # the skew below makes it the top referrer
+
+    for reward_type in ("SIGNUP", "FIRST_ORDER"):
+        RewardConfig(
+            reward_type=reward_type,
+            reward_value=100,
+            reward_unit="POINTS",
+            is_active=True,
+        ).save()
+
+    # skewed ownership: a few heavy referrers, a long tail of light ones
+    users_by_rank = [u["_id"] for u in population]
+    used_by = random.sample(users_by_rank, min(users, int(referrals * success_rate)))
+    referral_docs, ledger_docs = [], []
+
+    for i in range(referrals):
+        owner = users_by_rank[int(users * random.random() ** 3)]
+        user = used_by[i] if i < len(used_by) and used_by[i] != owner else None
+        used_at = now - timedelta(minutes=random.randint(0, 60 * 24 * 365))
+
+        referral_docs.append(
+            {
+                "_id": str(uuid.uuid4()),
+                "referral_code": f"B{i:09d}",
+                "referred_by": owner,
+                "referred_at": used_at - timedelta(days=1),
+                "referral_code_used": user,
+                "referral_used_at": used_at if user else None,
+            }
+        )
+
+        if user:
+            for beneficiary in (owner, user):
+                ledger_docs.append(
+                    {
+                        "_id": ObjectId(),
+                        "user": beneficiary,
+                        "referral": referral_docs[-1]["_id"],
+                        "reward_type": "SIGNUP",
+                        "reward_value": 100,
+                        "reward_unit": "POINTS",
+                        "status": "PENDING",
+                        "created_at": used_at,
+                    }
+                )
+
+    # unused codes owned by the bench user, one per apply request
+    apply_codes = [f"A{i:09d}" for i in range(fixtures)]
+    referral_docs += [
+        {
+            "_id": str(uuid.uuid4()),
+            "referral_code": code,
+            "referred_by": bench_user["_id"],
+            "referred_at": now,
+            "referral_code_used": None,
+            "referral_used_at": None,
+        }
+        for code in apply_codes
+    ]
+
+    _insert(Referral, referral_docs)
+    _insert(RewardLedger, ledger_docs)
+
+    rebuild_stats()
+    rebuild_rollups()
+    rebuild_ancestry()
+    verify_balances(repair=True)
+
+    # single-use fixtures for the mutating endpoints
+    unverified = _users("unverified", fixtures, password, verified=False)
+    _insert(
+        Otp,
+        [
+            {
+                "email": u["email"],
+                "otp": BENCH_OTP,
+                # the TTL index expires OTPs 5 minutes after created_at
+                "created_at": datetime.now() + timedelta(days=1),
+                "expires_at": datetime.now() + timedelta(days=1),
+            }
+            for u in unverified
+        ],
+    )
+
+    pending = [row["_id"] for row in ledger_docs]
+    credit_ids = [str(i) for i in pending[:fixtures]]
+    rest = [str(i) for i in pending[fixtures:]]
+    bulk_ids = [rest[i : i + bulk_size] for i in range(0, len(rest), bulk_size)]
+
+    # referred users, one first order each per batch
+    buyers = [str(user) for user in used_by]
+    buyer_batches = [
+        buyers[i : i + bulk_size] for i in range(0, len(buyers), bulk_size)
+    ]
+
+    job = CreditJob(filter={"reward_type": "SIGNUP"}, status="DONE")
+    job.save()
+
+    return {
+        "user_email": bench_user["email"],
+        "user_token": _sessions([bench_user["_id"]])[0],
+        "admin_token": _sessions([admin["_id"]])[0],
+        "otp_emails": [u["email"] for u in unverified],
+        "logout_tokens": _sessions([bench_user["_id"]] * fixtures),
+        "generate_tokens": _sessions(
+            [u["_id"] for u in _users("generate", fixtures, password)]
+        ),
+        "apply_tokens": _sessions(
+            [u["_id"] for u in _users("apply", fixtures, password)]
+        ),
+        "apply_codes": apply_codes,
+        "credit_ids": credit_ids,
+        "bulk_ids": bulk_ids or [[]],
+        "buyer_batches": buyer_batches or [[str(bench_user["_id"])]],
+        "credit_job_id": str(job.id),
+    }
+
+
+# -----------------------------------
+# Scenarios: url name -> request for iteration i
+# -----------------------------------
+def _user_get(query=None):
+    return lambda fx, i: {"method": "get", "token": fx["user_token"], "query": query}
+
+
+def _first_orders(fx, i):
+    buyers = fx["buyer_batches"][i % len(fx["buyer_batches"])]
+
+    return {
+        "method": "post",
+        "token": fx["admin_token"],
+        "data": {
+            "events": [
+                {"order_id": f"bench-{i}-{j}", "user_id": buyer}
+                for j, buyer in enumerate(buyers)
+            ]
+        },
+    }
+
+
+def _admin_get(query=None, kwargs=None):
+    return lambda fx, i: {
+        "method": "get",
+        "token": fx["admin_token"],
+        "query": query,
+        "kwargs": kwargs,
+    }
+
+
+SCENARIOS = {
+    # user_auth
+    "signup": lambda fx, i: {
+        "method": "post",
+        "data": {
+            "name": "Bench",
+            "email": f"signup-{i}@bench.local",
+            "password": BENCH_PASSWORD,
+        },
+    },
+    "verify-otp": lambda fx, i: {
+        "method": "post",
+        "data": {"email": fx["otp_emails"][i], "otp": BENCH_OTP},
+    },
+    "login": lambda fx, i: {
+        "method": "post",
+        "data": {"email": fx["user_email"], "password": BENCH_PASSWORD},
+    },
+    "verify-session": lambda fx, i: {"method": "post", "token": fx["user_token"]},
+    "logout": lambda fx, i: {"method": "post", "token": fx["logout_tokens"][i]},
+    # referrals
+    "generate-referral": lambda fx, i: {
+        "method": "post",
+        "token": fx["generate_tokens"][i],
+    },
+    "apply-referral": lambda fx, i: {
+        "method": "post",
+        "token": fx["apply_tokens"][i],
+        "data": {"referral_code": fx["apply_codes"][i]},
+    },
+    "referral-summary": _user_get(),
+    "referral-list": _user_get({"limit": 50}),
+    "referral-timeline": _user_get({"granularity": "week"}),
+    "referral-downline": _user_get({"max_depth": 3}),
+    "reward-history": _user_get({"limit": 50}),
+    "reward-balance": _user_get(),
+    "async-referral-summary": _user_get(),
+    "async-referral-list": _user_get({"limit": 50}),
+    "async-referral-timeline": _user_get({"granularity": "week"}),
+    "async-reward-history": _user_get({"limit": 50}),
+    # admin_panel
+    "admin-top-referrers": _admin_get({"limit": 10}),
+    "async-admin-top-referrers": _admin_get({"limit": 10}),
+    "admin-bulk-credit": lambda fx, i: {
+        "method": "post",
+        "token": fx["admin_token"],
+        "data": {"reward_ids": fx["bulk_ids"][i % len(fx["bulk_ids"])]},
+    },
+    "admin-credit-job": lambda fx, i: {
+        "method": "get",
+        "token": fx["admin_token"],
+        "kwargs": {"job_id": fx["credit_job_id"]},
+    },
+    "admin-credit-reward": lambda fx, i: {
+        "method": "post",
+        "token": fx["admin_token"],
+        "kwargs": {"reward_id": fx["credit_ids"][i]},
+    },
+    "admin-create-reward-config": lambda fx, i: {
+        "method": "post",
+        "token": fx["admin_token"],
+        "data": {
+            "reward_type": "SIGNUP",
+            "reward_value": 100,
+            "reward_unit": "POINTS",
+        },
+    },
+    # later passes over a batch measure the duplicate path
+    "admin-ingest-first-orders": _first_orders,
+    "admin-auth-cache-stats": _admin_get(),
+    "admin-outbox-stats": _admin_get(),
+    "admin-export": _admin_get({"output": "ndjson"}, {"source": "referrals"}),
+}
+
+
+def api_routes():
+    """
+    [(name, pattern, is_async), ...] for every named route under api/.
+    """
+
+    routes = []
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, prefix + str(pattern.pattern))
+            elif pattern.name:
+                routes.append(
+                    (
+                        pattern.name,
+                        prefix + str(pattern.pattern),
+                        asyncio.iscoroutinefunction(pattern.callback),
+                    )
+                )
+
+    walk(get_resolver().url_patterns, "")
+
+    return [route for route in routes if route[1].startswith("api/")]
+
+
+# -----------------------------------
+# Running
+# -----------------------------------
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[int(q * (len(samples) - 1))] if samples else 0.0
+
+
+def _request_args(name, spec):
+    path = reverse(name, kwargs=spec.get("kwargs"))
+    kwargs = {}
+
+    if spec.get("token"):
+        kwargs["headers"] = {"authorization": f"Bearer {spec['token']}"}
+
+    if spec["method"] == "post":
+        kwargs["data"] = spec.get("data") or {}
+        kwargs["content_type"] = "application/json"
+    elif spec.get("query"):
+        kwargs["data"] = spec["query"]
+
+    return spec["method"], path, kwargs
+
+
+def _consume(response):
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+def _summarize(path, latencies, elapsed, statuses, commands):
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "mongo_commands_per_request": (
+            None if commands is None else round(commands / len(latencies), 2)
+        ),
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def run_sync(name, path, scenario, fixtures, warmup, requests, counter):
+    client = Client()
+
+    def call(i):
+        method, url, kwargs = _request_args(name, scenario(fixtures, i))
+        response = getattr(client, method)(url, **kwargs)
+        _consume(response)
+        return response.status_code
+
+    for i in range(warmup):
+        call(i)
+
+    latencies, statuses = [], Counter()
+    commands = counter.count if counter else None
+    started = time.perf_counter()
+
+    for i in range(warmup, warmup + requests):
+        t0 = time.perf_counter()
+        statuses[call(i)] += 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    elapsed = time.perf_counter() - started
+    if counter:
+        commands = counter.count - commands
+
+    return _summarize(path, latencies, elapsed, statuses, commands)
+
+
+async def run_async(name, path, scenario, fixtures, warmup, requests, counter):
+    client = AsyncClient()
+
+    async def call(i):
+        method, url, kwargs = _request_args(name, scenario(fixtures, i))
+        response = await getattr(client, method)(url, **kwargs)
+        return response.status_code
+
+    for i in range(warmup):
+        await call(i)
+
+    latencies, statuses = [], Counter()
+    commands = counter.count if counter else None
+    started = time.perf_counter()
+
+    for i in range(warmup, warmup + requests):
+        t0 = time.perf_counter()
+        statuses[await call(i)] += 1
+        latencies.append((time.perf_counter() - t0) * 1000)
+
+    elapsed = time.perf_counter() - started
+    if counter:
+        commands = counter.count - commands
+
+    return _summarize(path, latencies, elapsed, statuses, commands)
+
+
+def run_benchmarks(
+    fixtures, warmup, requests, backend, counter=None, only=None, on_result=None
+):
+    """
+    Runs every api route (or those in `only`) and returns
+    {name: summary or {"skipped": reason}}.
+    """
+
+    results = {}
+
+    async def run_all_async(pending):
+        # one event loop for every async route, so the async client is shared
+        for name, path in pending:
+            results[name] = await run_async(
+                name, path, SCENARIOS[name], fixtures, warmup, requests, counter
+            )
+            if on_result:
+                on_result(name, results[name])
+
+    pending_async = []
+
+    for name, path, is_async in api_routes():
+        if only and name not in only:
+            continue
+
+        if name not in SCENARIOS:
+            results[name] = {"path": path, "skipped": "no scenario defined"}
+        elif is_async and backend == "mongomock":
+            results[name] = {"path": path, "skipped": "async routes need mongod"}
+        elif is_async:
+            pending_async.append((name, path))
+            continue
+        else:
+            results[name] = run_sync(
+                name, path, SCENARIOS[name], fixtures, warmup, requests, counter
+            )
+
+        if on_result:
+            on_result(name, results[name])
+
+    if pending_async:
+        asyncio.run(run_all_async(pending_async))
+
+    return results
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """
+    [(name, old p50, new p50, change %, old cmds, new cmds), ...]
+    for endpoints measured in both runs.
+    """
+
+    rows = []
+
+    for name, new in current["endpoints"].items():
+        old = previous.get("endpoints", {}).get(name)
+        if not old or "p50_ms" not in old or "p50_ms" not in new:
+            continue
+
+        change = (
+            (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            if old["p50_ms"]
+            else 0.0
+        )
+        rows.append(
+            (
+                name,
+                old["p50_ms"],
+                new["p50_ms"],
+                change,
+                old.get("mongo_commands_per_request"),
+                new.get("mongo_commands_per_request"),
+            )
+        )
+
+    return rows
@@ -0,0 +1,288 @@
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from referrals.balances import record_transitions
+from referrals.models import RewardLedger
+from referrals.versions import bump_data_versions
+from .models import CreditJob
+
+CREDIT_BATCH_SIZE = 1000
+MAX_REWARD_IDS = 5000
+INLINE_FILTER_LIMIT = 5000
+JOB_LEASE_SECONDS = 300
+
+
+def _ledger():
+    return RewardLedger._get_collection()
+
+
+def _credit(ids):
+    """
+    Credits the still-PENDING rows among `ids`. The status condition is
+    part of the update filter, so each row flips at most once; the batch
+    stamp identifies exactly the rows this call flipped for the balances.
+    """
+
+    batch = uuid.uuid4().hex
+
+    result = _ledger().update_many(
+        {"_id": {"$in": ids}, "status": "PENDING"},
+        {
+            "$set": {
+                "status": "CREDITED",
+                "credited_at": datetime.utcnow(),
+                "credit_batch": batch,
+            }
+        },
+    )
+
+    if result.modified_count:
+        groups = [
+            (row["_id"]["user"], row["_id"]["unit"], row["value"])
+            for row in _ledger().aggregate(
+                [
+                    {"$match": {"_id": {"$in": ids}, "credit_batch": batch}},
+                    {
+                        "$group": {
+                            "_id": {"user": "$user", "unit": "$reward_unit"},
+                            "value": {"$sum": "$reward_value"},
+                        }
+                    },
+                ]
+            )
+        ]
+
+        record_transitions(groups, "PENDING", "CREDITED")
+        bump_data_versions([user for user, _, _ in groups])
+
+    return result.modified_count
+
+
+def credit_reward_ids(reward_ids, batch_size=CREDIT_BATCH_SIZE):
+    """
+    Credits a list of reward ids in batched update_many calls.
+    """
+
+    if not isinstance(reward_ids, list) or not reward_ids:
+        raise ValueError("reward_ids must be a non-empty list")
+
+    if len(reward_ids) > MAX_REWARD_IDS:
+        raise ValueError(
+            f"At most {MAX_REWARD_IDS} reward_ids per call; use a filter instead"
+        )
+
+    ids, invalid = [], []
+
+    for reward_id in dict.fromkeys(reward_ids):
+        try:
+            ids.append(ObjectId(reward_id))
+        except (InvalidId, TypeError):
+            invalid.append(reward_id)
+
+    credited = 0
+    for start in range(0, len(ids), batch_size):
+        credited += _credit(ids[start : start + batch_size])
+
+    return {
+        "requested": len(ids) + len(invalid),
+        "credited": credited,
+        "skipped": len(ids) - credited,  # missing or not PENDING
+        "invalid": invalid,
+    }
+
+
+def validate_credit_filter(data):
+    """
+    Normalises a bulk credit filter. Only PENDING rewards are credited.
+    """
+
+    if not isinstance(data, dict):
+        raise ValueError("filter must be an object")
+
+    unknown = set(data) - {"status", "reward_type", "from", "to"}
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {sorted(unknown)}")
+
+    if data.get("status", "PENDING") != "PENDING":
+        raise ValueError("Only PENDING rewards can be credited")
+
+    clean = {}
+
+    if data.get("reward_type"):
+        clean["reward_type"] = str(data["reward_type"])
+
+    for key in ("from", "to"):
+        if data.get(key):
+            try:
+                datetime.fromisoformat(data[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be an ISO date or datetime")
+            clean[key] = data[key]
+
+    return clean
+
+
+def credit_filter_query(clean):
+    query = {"status": "PENDING"}
+
+    if clean.get("reward_type"):
+        query["reward_type"] = clean["reward_type"]
+
+    created_at = {}
+    if clean.get("from"):
+        created_at["$gte"] = datetime.fromisoformat(clean["from"])
+    if clean.get("to"):
+        created_at["$lt"] = datetime.fromisoformat(clean["to"])
+    if created_at:
+        query["created_at"] = created_at
+
+    return query
+
+
+def credit_next_batch(query, after_id=None, batch_size=CREDIT_BATCH_SIZE):
+    """
+    Credits the next batch of matching rows after `after_id`.
+    Returns None when done, else (last_id, matched, credited).
+    """
+
+    if after_id:
+        query = {**query, "_id": {"$gt": after_id}}
+
+    ids = [
+        row["_id"]
+        for row in _ledger()
+        .find(query, {"_id": 1})
+        .sort("_id", 1)
+        .limit(batch_size)
+    ]
+
+    if not ids:
+        return None
+
+    return ids[-1], len(ids), _credit(ids)
+
+
+def credit_by_filter(clean, batch_size=CREDIT_BATCH_SIZE):
+    """
+    Runs a small filter to completion inline.
+    """
+
+    query = credit_filter_query(clean)
+    result = {"matched": 0, "credited": 0}
+    after_id = None
+
+    while True:
+        batch = credit_next_batch(query, after_id, batch_size)
+        if batch is None:
+            return result
+
+        after_id, matched, credited = batch
+        result["matched"] += matched
+        result["credited"] += credited
+
+
+def needs_background_job(clean):
+    query = credit_filter_query(clean)
+
+    return (
+        _ledger().count_documents(query, limit=INLINE_FILTER_LIMIT + 1)
+        > INLINE_FILTER_LIMIT
+    )
+
+
+def create_credit_job(clean, user):
+    job = CreditJob(filter=clean, created_by=user)
+    job.save()
+
+    return job
+
+
+def claim_credit_job():
+    """
+    Claims the oldest queued job, or a running job whose lease expired.
+    """
+
+    now = datetime.utcnow()
+
+    job = (
+        CreditJob.objects(status="QUEUED")
+        .order_by("created_at")
+        .modify(
+            set__status="RUNNING",
+            set__started_at=now,
+            set__locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            new=True,
+        )
+    )
+
+    if job:
+        return job
+
+    return CreditJob.objects(status="RUNNING", locked_until__lte=now).modify(
+        set__locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS),
+        new=True,
+    )
+
+
+def run_credit_job(job, batch_size=CREDIT_BATCH_SIZE):
+    """
+    Processes a claimed job batch by batch, recording progress after each
+    batch so a restarted worker resumes from `last_id`.
+    """
+
+    query = credit_filter_query(job.filter)
+    after_id = ObjectId(job.last_id) if job.last_id else None
+
+    try:
+        while True:
+            batch = credit_next_batch(query, after_id, batch_size)
+
+            if batch is None:
+                break
+
+            after_id, matched, credited = batch
+
+            CreditJob.objects(id=job.id).update_one(
+                inc__matched=matched,
+                inc__credited=credited,
+                set__last_id=str(after_id),
+                set__locked_until=datetime.utcnow()
+                + timedelta(seconds=JOB_LEASE_SECONDS),
+                push__batches={
+                    "matched": matched,
+                    "credited": credited,
+                    "last_id": str(after_id),
+                    "at": datetime.utcnow(),
+                },
+            )
+
+    except Exception as e:
+        CreditJob.objects(id=job.id).update_one(
+            set__status="FAILED",
+            set__error=str(e)[:500],
+            set__finished_at=datetime.utcnow(),
+            unset__locked_until=True,
+        )
+        raise
+
+    CreditJob.objects(id=job.id).update_one(
+        set__status="DONE",
+        set__finished_at=datetime.utcnow(),
+        unset__locked_until=True,
+    )
+
+
+def job_to_dict(job):
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "filter": job.filter,
+        "matched": job.matched,
+        "credited": job.credited,
+        "batches": job.batches,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
@@ -0,0 +1,177 @@
+import csv
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from referrals.models import Referral, RewardLedger
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORTS = {
+    "reward-ledger": {
+        "model": RewardLedger,
+        "date_field": "created_at",
+        "fields": [
+            "_id",
+            "user",
+            "referral",
+            "reward_type",
+            "reward_value",
+            "reward_unit",
+            "status",
+            "tier",
+            "order_id",
+            "created_at",
+            "credited_at",
+        ],
+        # rows written before tiers existed were all direct rewards
+        "defaults": {"tier": 1},
+    },
+    "referrals": {
+        "model": Referral,
+        "date_field": "referred_at",
+        "fields": [
+            "_id",
+            "referral_code",
+            "referred_by",
+            "referred_at",
+            "referral_code_used",
+            "referral_used_at",
+        ],
+    },
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO date or datetime")
+
+
+def build_export_query(source, params):
+    """
+    Mongo filter for an export. Raises ValueError on bad input.
+
+    Supported params: status, reward_type (ledger only), from, to and
+    after (resume strictly after this _id).
+    """
+
+    if source not in EXPORTS:
+        raise ValueError(f"Unknown export source: {source}")
+
+    spec = EXPORTS[source]
+    query = {}
+
+    status = params.get("status")
+    if status:
+        if source == "reward-ledger":
+            if status not in RewardLedger.STATUS:
+                raise ValueError(f"status must be one of {RewardLedger.STATUS}")
+            query["status"] = status
+        elif status == "SUCCESS":
+            query["referral_code_used"] = {"$ne": None}
+        elif status == "PENDING":
+            query["referral_code_used"] = None
+        else:
+            raise ValueError("status must be SUCCESS or PENDING")
+
+    reward_type = params.get("reward_type")
+    if reward_type:
+        if source != "reward-ledger":
+            raise ValueError("reward_type only applies to reward-ledger")
+        query["reward_type"] = reward_type
+
+    date_range = {}
+    if params.get("from"):
+        date_range["$gte"] = _parse_date(params["from"], "from")
+    if params.get("to"):
+        date_range["$lt"] = _parse_date(params["to"], "to")
+    if date_range:
+        query[spec["date_field"]] = date_range
+
+    after = params.get("after")
+    if after:
+        if source == "reward-ledger":
+            try:
+                after = ObjectId(after)
+            except InvalidId:
+                raise ValueError("after must be a reward _id")
+        query["_id"] = {"$gt": after}
+
+    return query
+
+
+def iter_export_rows(source, query, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Streams rows in _id order from a batched cursor.
+    """
+
+    spec = EXPORTS[source]
+    collection = spec["model"]._get_collection()
+    projection = {field: 1 for field in spec["fields"]}
+    defaults = spec.get("defaults", {})
+
+    cursor = (
+        collection.find(query, projection)
+        .sort("_id", 1)
+        .batch_size(batch_size)
+    )
+
+    try:
+        for doc in cursor:
+            yield {
+                field: _plain(doc.get(field, defaults.get(field)))
+                for field in spec["fields"]
+            }
+    finally:
+        cursor.close()
+
+
+def _plain(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+class _Echo:
+    # file-like object for csv.writer that hands back each line
+    def write(self, value):
+        return value
+
+
+def render_csv(rows, fields):
+    writer = csv.writer(_Echo())
+
+    yield writer.writerow(fields)
+
+    for row in rows:
+        yield writer.writerow(["" if row[f] is None else row[f] for f in fields])
+
+
+def render_export(source, query, output, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generator of text chunks for the requested format.
+    """
+
+    if output not in FORMATS:
+        raise ValueError(f"output must be one of {tuple(FORMATS)}")
+
+    rows = iter_export_rows(source, query, batch_size)
+
+    if output == "csv":
+        return render_csv(rows, EXPORTS[source]["fields"])
+
+    return render_ndjson(rows)
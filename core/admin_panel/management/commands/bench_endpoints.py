@@ -0,0 +1,175 @@
+import json
+import platform
+from datetime import datetime
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from mongoengine.connection import get_db
+from pymongo import monitoring
+from admin_panel.benchmarks import (
+    BACKENDS,
+    CommandCounter,
+    compare,
+    current_commit,
+    run_benchmarks,
+    seed,
+    use_scratch_database,
+)
+from utils.mongo import check_scratch_database
+
+
+def _name_list(value):
+    return {v.strip() for v in value.split(",") if v.strip()}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every API endpoint against a seeded scratch database: "
+        "p50/p95/p99 latency, requests/sec and Mongo commands per request. "
+        "Results are written as JSON for comparison across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=BACKENDS, default="mongod")
+        parser.add_argument("--db", default=f"{settings.MONGO_DB_NAME}-bench")
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--referrals", type=int, default=20000)
+        parser.add_argument(
+            "--success-rate",
+            type=float,
+            default=0.6,
+            help="Fraction of referrals that were used.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Measured requests per route."
+        )
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--only", type=_name_list, help="Comma-separated url names to run."
+        )
+        parser.add_argument(
+            "--output",
+            help="Result file (default: bench_results/endpoints-<commit>-<time>.json)",
+        )
+        parser.add_argument(
+            "--compare", help="Earlier result file to compare p50 and op counts with."
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch database."
+        )
+
+    def handle(self, *args, **options):
+        # the database is dropped before and after the run
+        try:
+            check_scratch_database(options["db"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        previous = None
+        if options["compare"]:
+            try:
+                previous = json.loads(Path(options["compare"]).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['compare']}: {e}")
+
+        # register before connecting: listeners attach to clients on creation
+        counter = None
+        if options["backend"] == "mongod":
+            counter = CommandCounter()
+            monitoring.register(counter)
+
+        use_scratch_database(options["db"], options["backend"])
+
+        # the async views build their client from MONGO_DB_NAME; one client
+        # replaying login would otherwise hit the rate limits
+        with override_settings(MONGO_DB_NAME=options["db"], RATE_LIMIT_ENABLED=False):
+            try:
+                results = self.run_suite(options, counter)
+            finally:
+                if not options["keep"]:
+                    get_db().client.drop_database(options["db"])
+
+        output = Path(
+            options["output"]
+            or f"bench_results/endpoints-{results['commit'] or 'nocommit'}-"
+            f"{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f"Results written to {output}"))
+
+        if previous:
+            self.report_comparison(previous, results)
+
+    def run_suite(self, options, counter):
+        fixtures = options["warmup"] + options["requests"]
+
+        self.stdout.write("Seeding scratch database...")
+        data = seed(
+            users=options["users"],
+            referrals=options["referrals"],
+            success_rate=options["success_rate"],
+            fixtures=fixtures,
+        )
+
+        self.stdout.write(
+            f"{'endpoint':<28} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'req/s':>8} {'mongo/req':>9}  statuses"
+        )
+
+        endpoints = run_benchmarks(
+            data,
+            options["warmup"],
+            options["requests"],
+            options["backend"],
+            counter=counter,
+            only=options["only"],
+            on_result=self.report_row,
+        )
+
+        return {
+            "commit": current_commit(),
+            "created_at": datetime.now().isoformat(),
+            "backend": options["backend"],
+            "python": platform.python_version(),
+            "seed": {
+                "users": options["users"],
+                "referrals": options["referrals"],
+                "success_rate": options["success_rate"],
+            },
+            "warmup": options["warmup"],
+            "requests": options["requests"],
+            "endpoints": endpoints,
+        }
+
+    def report_row(self, name, row):
+        if "skipped" in row:
+            self.stdout.write(
+                self.style.WARNING(f"{name:<28} skipped: {row['skipped']}")
+            )
+            return
+
+        commands = row["mongo_commands_per_request"]
+        self.stdout.write(
+            f"{name:<28} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['p99_ms']:>8.2f} {row['rps']:>8.1f} "
+            f"{'-' if commands is None else commands:>9}  {row['statuses']}"
+        )
+
+    def report_comparison(self, previous, current):
+        self.stdout.write(
+            f"\nvs {previous.get('commit')} ({previous.get('created_at')})\n"
+            f"{'endpoint':<28} {'old p50':>8} {'new p50':>8} {'change':>8} "
+            f"{'old ops':>8} {'new ops':>8}"
+        )
+
+        for name, old, new, change, old_ops, new_ops in compare(previous, current):
+            line = (
+                f"{name:<28} {old:>8.2f} {new:>8.2f} {change:>+7.1f}% "
+                f"{'-' if old_ops is None else old_ops:>8} "
+                f"{'-' if new_ops is None else new_ops:>8}"
+            )
+            self.stdout.write(
+                self.style.WARNING(line) if change > 10 else line  # regression
+            )
@@ -0,0 +1,152 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+from bson import ObjectId
+from admin_panel.services import LEADERBOARD_FILTER, top_referrers_pipeline
+from referrals.stats import stats_pipeline
+from utils.mongo import check_scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the full-scan top-referrers aggregation with the indexed "
+        "referral_stats leaderboard on a synthetic scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--referrals", type=int, default=1_000_000)
+        parser.add_argument("--referrers", type=int, default=100_000)
+        parser.add_argument(
+            "--success-rate",
+            type=float,
+            default=0.6,
+            help="Fraction of referrals that were used.",
+        )
+        parser.add_argument("--limit", type=int, default=10)
+        parser.add_argument("--offset", type=int, default=0)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--db", default=f"{settings.MONGO_DB_NAME}-bench")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch database."
+        )
+
+    def handle(self, *args, **options):
+        # collections are dropped while seeding, the database afterwards
+        try:
+            check_scratch_database(options["db"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        client = MongoClient(settings.MONGO_URI)
+        db = client[options["db"]]
+
+        try:
+            self.seed(db, options)
+
+            aggregation = self.timed(
+                options["repeat"],
+                lambda: list(
+                    db.referral.aggregate(
+                        top_referrers_pipeline(options["offset"] + options["limit"]),
+                        allowDiskUse=True,
+                    )
+                ),
+            )
+            leaderboard = self.timed(
+                options["repeat"],
+                lambda: list(
+                    db.referral_stats.find(
+                        LEADERBOARD_FILTER, {"user": 1, "successful_referrals": 1}
+                    )
+                    .sort([("successful_referrals", -1), ("user", 1)])
+                    .skip(options["offset"])
+                    .limit(options["limit"])
+                ),
+            )
+
+            self.report("aggregation", aggregation)
+            self.report("leaderboard", leaderboard)
+
+            speedup = statistics.median(aggregation) / statistics.median(leaderboard)
+            self.stdout.write(self.style.SUCCESS(f"speedup (median): {speedup:.0f}x"))
+
+        finally:
+            if not options["keep"]:
+                client.drop_database(options["db"])
+            client.close()
+
+    def seed(self, db, options):
+        if db.referral.estimated_document_count() >= options["referrals"]:
+            self.stdout.write("Reusing seeded scratch database.")
+            return
+
+        db.referral.drop()
+        db.referral_stats.drop()
+
+        referrers = [ObjectId() for _ in range(options["referrers"])]
+        started = time.perf_counter()
+        batch = []
+
+        for _ in range(options["referrals"]):
+            # skewed: a few heavy referrers, a long tail of light ones
+            owner = referrers[int(len(referrers) * random.random() ** 3)]
+            used = random.random() < options["success_rate"]
+
+            batch.append(
+                {
+                    "_id": str(uuid.uuid4()),
+                    "referral_code": uuid.uuid4().hex[:10],
+                    "referred_by": owner,
+                    "referred_at": datetime.utcnow(),
+                    "referral_code_used": ObjectId() if used else None,
+                    "referral_used_at": datetime.utcnow() if used else None,
+                }
+            )
+
+            if len(batch) == 10_000:
+                db.referral.insert_many(batch, ordered=False)
+                batch = []
+
+        if batch:
+            db.referral.insert_many(batch, ordered=False)
+
+        db.referral.create_index("referral_code_used")
+
+        # materialize the leaderboard the same way rebuild_referral_stats does
+        db.referral.aggregate(
+            stats_pipeline()
+            + [
+                {"$addFields": {"user": "$_id"}},
+                {"$project": {"_id": 0}},
+                {"$out": "referral_stats"},
+            ],
+            allowDiskUse=True,
+        )
+        db.referral_stats.create_index([("successful_referrals", -1), ("user", 1)])
+
+        self.stdout.write(
+            f"Seeded {options['referrals']} referrals in "
+            f"{time.perf_counter() - started:.1f}s"
+        )
+
+    def timed(self, repeat, fn):
+        samples = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+
+        return samples
+
+    def report(self, name, samples):
+        samples = sorted(samples)
+        self.stdout.write(
+            f"{name:<12} median={statistics.median(samples):9.2f}ms "
+            f"p95={samples[int(0.95 * (len(samples) - 1))]:9.2f}ms"
+        )
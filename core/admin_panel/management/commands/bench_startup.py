@@ -0,0 +1,96 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from admin_panel.startup_probe import DEFAULT_PATH
+
+PROFILES = ("core.settings", "core.settings_api")
+
+METRICS = (
+    ("spawn_to_response_ms", "spawn->resp ms"),
+    ("load_ms", "load ms"),
+    ("first_response_ms", "first resp ms"),
+    ("warm_request_us", "warm req us"),
+    ("modules", "modules"),
+    ("max_rss_kb", "rss KB"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare cold start of the settings profiles: interpreter+import "
+        "time, time to first response and warm per-request cost, each "
+        "measured in fresh processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            default=",".join(PROFILES),
+            help="Comma-separated settings modules.",
+        )
+        parser.add_argument(
+            "--runs", type=int, default=5, help="Fresh processes per profile."
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Warm requests per run."
+        )
+        parser.add_argument("--path", default=DEFAULT_PATH)
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options["profiles"].split(",") if p.strip()]
+
+        self.stdout.write(
+            f"{'profile':<22}"
+            + "".join(f"{label:>15}" for _, label in METRICS)
+            + "  status"
+        )
+
+        for profile in profiles:
+            runs = [self.probe(profile, options) for _ in range(options["runs"])]
+
+            medians = {
+                key: statistics.median(run[key] for run in runs) for key, _ in METRICS
+            }
+            self.stdout.write(
+                f"{profile:<22}"
+                + "".join(f"{medians[key]:>15.1f}" for key, _ in METRICS)
+                + f"  {runs[0]['first_status']}"
+            )
+
+    def probe(self, profile, options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": profile}
+
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                "-m",
+                "admin_panel.startup_probe",
+                options["path"],
+                str(options["requests"]),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+
+        # includes interpreter start-up, which the probe cannot see
+        ready = process.stdout.readline()
+        spawn_to_response = (time.perf_counter() - started) * 1000
+
+        stdout, stderr = process.communicate()
+
+        if process.returncode != 0 or ready.strip() != "ready":
+            raise CommandError(f"{profile} failed:\n{stderr}")
+
+        run = json.loads(stdout.strip().splitlines()[-1])
+        run["spawn_to_response_ms"] = spawn_to_response
+
+        return run
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from admin_panel.query_plans import check_query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain every service query shape and fail on collection scans "
+        "or in-memory sorts."
+    )
+
+    def handle(self, *args, **options):
+        failures = 0
+
+        for name, problems in check_query_plans():
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: {problems}"))
+            else:
+                self.stdout.write(f"ok   {name}")
+
+        if failures:
+            raise CommandError(f"{failures} query shape(s) without a usable index")
+
+        self.stdout.write(self.style.SUCCESS("All query plans use indexes."))
@@ -0,0 +1,48 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from admin_panel.exports import (
+    EXPORTS,
+    EXPORT_BATCH_SIZE,
+    FORMATS,
+    build_export_query,
+    render_export,
+)
+
+
+class Command(BaseCommand):
+    help = "Stream the reward ledger or referrals as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", choices=sorted(EXPORTS))
+        parser.add_argument("--output", choices=sorted(FORMATS), default="ndjson")
+        parser.add_argument("--status")
+        parser.add_argument("--reward-type", dest="reward_type")
+        parser.add_argument("--from", dest="from", help="ISO date, inclusive.")
+        parser.add_argument("--to", dest="to", help="ISO date, exclusive.")
+        parser.add_argument("--after", help="Resume after this _id.")
+        parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+        parser.add_argument("--file", help="Write here instead of stdout.")
+
+    def handle(self, *args, **options):
+        params = {
+            key: options[key]
+            for key in ("status", "reward_type", "from", "to", "after")
+            if options[key]
+        }
+
+        try:
+            query = build_export_query(options["source"], params)
+            chunks = render_export(
+                options["source"], query, options["output"], options["batch_size"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        out = open(options["file"], "w", newline="") if options["file"] else sys.stdout
+
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
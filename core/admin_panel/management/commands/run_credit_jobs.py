@@ -0,0 +1,49 @@
+import time
+from django.core.management.base import BaseCommand
+from admin_panel.credits import CREDIT_BATCH_SIZE, claim_credit_job, run_credit_job
+
+
+class Command(BaseCommand):
+    help = "Process queued bulk credit jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=CREDIT_BATCH_SIZE)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep when no job is queued.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process queued jobs, then exit instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_credit_job()
+
+            if not job:
+                if options["once"]:
+                    return
+                time.sleep(options["interval"])
+                continue
+
+            started = time.perf_counter()
+            self.stdout.write(f"job {job.id} filter={job.filter}")
+
+            try:
+                run_credit_job(job, batch_size=options["batch_size"])
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"job {job.id} failed: {e}"))
+                continue
+
+            job.reload()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"job {job.id} done: matched={job.matched} "
+                    f"credited={job.credited} "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+            )
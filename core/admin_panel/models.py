@@ -1,3 +1,40 @@
-from django.db import models
+from datetime import datetime
+from mongoengine import (
+    Document,
+    StringField,
+    IntField,
+    DateTimeField,
+    DictField,
+    ListField,
+    ReferenceField,
+    NULLIFY,
+)
+from user_auth.models import User
 
-# Create your models here.
+
+class CreditJob(Document):
+    """
+    Background bulk credit of PENDING rewards matching a filter.
+    """
+
+    STATUS = ("QUEUED", "RUNNING", "DONE", "FAILED")
+
+    status = StringField(choices=STATUS, default="QUEUED")
+    filter = DictField(required=True)  # validated request filter
+    created_by = ReferenceField(User, reverse_delete_rule=NULLIFY)
+
+    matched = IntField(default=0)
+    credited = IntField(default=0)
+    last_id = StringField()  # resume point
+    batches = ListField(DictField())
+    error = StringField()
+
+    locked_until = DateTimeField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {
+        "collection": "credit_jobs",
+        "indexes": [("status", "created_at")],
+    }
@@ -0,0 +1,305 @@
+"""
+Query-plan regression checks.
+
+Every query shape the services issue is listed in QUERY_SHAPES, built
+from the same filter helpers the services use. `check_query_plans` runs
+explain() on each one and reports winning plans that scan the whole
+collection (COLLSCAN) or sort in memory (SORT).
+"""
+
+from datetime import date, datetime
+from bson import ObjectId
+from admin_panel.credits import credit_filter_query
+from admin_panel.exports import build_export_query
+from admin_panel.models import CreditJob
+from admin_panel.services import LEADERBOARD_FILTER
+from referrals.models import (
+    ConfigGeneration,
+    DataVersion,
+    Referral,
+    ReferralDailyRollup,
+    ReferralStats,
+    RewardBalance,
+    RewardConfig,
+    RewardLedger,
+)
+from referrals.orders import first_order_paid_filter, first_order_referral_filter
+from referrals.rollups import UTC, rollup_filter
+from referrals.services import referral_list_filter, reward_history_filter
+from referrals.tree import downline_by_depth_pipeline, downline_filter
+from user_auth.models import EmailOutbox, Otp, RevokedToken, Session, User
+
+_USER = ObjectId()
+_CURSOR_ID = ObjectId()
+_NOW = datetime.utcnow()
+
+# (name, model, filter, sort, pipeline)
+QUERY_SHAPES = [
+    # utils/auth.py
+    ("auth: session by token", Session, {"token": "t"}, None, None),
+    ("auth: user by id", User, {"_id": _USER}, None, None),
+    # user_auth/views.py
+    ("signup: otps by email", Otp, {"email": "a@b.c"}, None, None),
+    (
+        "signup: user by email",
+        User,
+        {"email": "a@b.c", "is_verified": True},
+        None,
+        None,
+    ),
+    ("verify-otp: otp", Otp, {"email": "a@b.c", "otp": "123456"}, None, None),
+    ("logout: session by token", Session, {"token": "t"}, None, None),
+    # utils/revocation.py
+    (
+        "revocation: full sync",
+        RevokedToken,
+        {"expires_at": {"$gt": _NOW}},
+        None,
+        None,
+    ),
+    (
+        "revocation: incremental sync",
+        RevokedToken,
+        {"revoked_at": {"$gte": _NOW}},
+        None,
+        None,
+    ),
+    # user_auth/outbox.py
+    (
+        "outbox: claim due",
+        EmailOutbox,
+        {"status": "PENDING", "next_attempt_at": {"$lte": _NOW}},
+        None,
+        None,
+    ),
+    (
+        "outbox: reclaim expired lease",
+        EmailOutbox,
+        {"status": "SENDING", "locked_until": {"$lte": _NOW}},
+        None,
+        None,
+    ),
+    (
+        "outbox: oldest pending",
+        EmailOutbox,
+        {"status": "PENDING"},
+        [("next_attempt_at", 1)],
+        None,
+    ),
+    ("outbox: recent sent", EmailOutbox, {"status": "SENT"}, [("sent_at", -1)], None),
+    # referrals/services.py
+    (
+        "generate: my unused referral",
+        Referral,
+        {"referred_by": _USER, "referral_code_used": None},
+        [("referred_at", -1), ("_id", -1)],
+        None,
+    ),
+    (
+        "apply: claim code",
+        Referral,
+        {
+            "referral_code": "SVH-AAAAAA",
+            "referral_code_used": None,
+            "referred_by": {"$ne": _USER},
+        },
+        None,
+        None,
+    ),
+    ("apply: user already used", Referral, {"referral_code_used": _USER}, None, None),
+    (
+        "ledger: reward by referral",
+        RewardLedger,
+        {"referral": "r", "reward_type": "SIGNUP", "user": _USER},
+        None,
+        None,
+    ),
+    ("apply: active configs", RewardConfig, {"is_active": True}, None, None),
+    (
+        "apply: config generation",
+        ConfigGeneration,
+        {"name": "reward_config"},
+        None,
+        None,
+    ),
+    ("analytics: data version", DataVersion, {"user": _USER}, None, None),
+    ("apply: referrer ancestry", Referral, {"referral_code_used": _USER}, None, None),
+    ("apply: descendants fix-up", Referral, {"ancestry.user": _USER}, None, None),
+    ("downline: count", Referral, downline_filter(_USER, 3), None, None),
+    ("downline: by depth", Referral, None, None, downline_by_depth_pipeline(_USER, 3)),
+    ("summary: stats", ReferralStats, {"user": _USER}, None, None),
+    (
+        "list: first page",
+        Referral,
+        referral_list_filter(_USER, None),
+        [("referred_at", -1), ("_id", -1)],
+        None,
+    ),
+    (
+        "list: next page",
+        Referral,
+        referral_list_filter(_USER, (_NOW, "id")),
+        [("referred_at", -1), ("_id", -1)],
+        None,
+    ),
+    (
+        "timeline: rollups in range",
+        ReferralDailyRollup,
+        rollup_filter(_USER, date(2025, 1, 1), date(2025, 3, 31), UTC),
+        [("day", 1)],
+        None,
+    ),
+    (
+        "history: first page",
+        RewardLedger,
+        reward_history_filter(_USER, None),
+        [("created_at", -1), ("_id", -1)],
+        None,
+    ),
+    (
+        "history: next page",
+        RewardLedger,
+        reward_history_filter(_USER, (_NOW, _CURSOR_ID)),
+        [("created_at", -1), ("_id", -1)],
+        None,
+    ),
+    ("balance: by user", RewardBalance, {"user": _USER}, None, None),
+    # referrals/orders.py
+    (
+        "first orders: buyers' referrals",
+        Referral,
+        first_order_referral_filter([_USER]),
+        None,
+        None,
+    ),
+    (
+        "first orders: already paid",
+        RewardLedger,
+        first_order_paid_filter(["r"]),
+        None,
+        None,
+    ),
+    # admin_panel/services.py, credits.py, exports.py
+    (
+        "admin: top referrers",
+        ReferralStats,
+        LEADERBOARD_FILTER,
+        [("successful_referrals", -1), ("user", 1)],
+        None,
+    ),
+    (
+        "admin: credit reward",
+        RewardLedger,
+        {"_id": _CURSOR_ID, "status": "PENDING"},
+        None,
+        None,
+    ),
+    (
+        "admin: credited batch",
+        RewardLedger,
+        {"_id": {"$in": [_CURSOR_ID]}, "credit_batch": "b"},
+        None,
+        None,
+    ),
+    (
+        "admin: bulk credit filter",
+        RewardLedger,
+        {
+            **credit_filter_query({"reward_type": "SIGNUP", "from": "2025-01-01"}),
+            "_id": {"$gt": _CURSOR_ID},
+        },
+        [("_id", 1)],
+        None,
+    ),
+    (
+        "admin: claim credit job",
+        CreditJob,
+        {"status": "QUEUED"},
+        [("created_at", 1)],
+        None,
+    ),
+    (
+        "admin: export ledger",
+        RewardLedger,
+        build_export_query("reward-ledger", {"status": "PENDING"}),
+        [("_id", 1)],
+        None,
+    ),
+]
+
+
+def _winning_plans(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == "winningPlan":
+                yield value
+            elif key != "rejectedPlans":
+                yield from _winning_plans(value)
+
+    elif isinstance(node, list):
+        for value in node:
+            yield from _winning_plans(value)
+
+
+def _stages(node):
+    if isinstance(node, dict):
+        if "stage" in node:
+            yield node
+        for value in node.values():
+            yield from _stages(value)
+
+    elif isinstance(node, list):
+        for value in node:
+            yield from _stages(value)
+
+
+def plan_problems(explain):
+    """
+    COLLSCAN anywhere, or a SORT that is not sorting $group output.
+    """
+
+    problems = set()
+
+    for plan in _winning_plans(explain):
+        for node in _stages(plan):
+            if node["stage"] == "COLLSCAN":
+                problems.add("COLLSCAN")
+
+            if node["stage"] == "SORT" and not any(
+                child["stage"] == "GROUP" for child in _stages(node)
+            ):
+                problems.add("SORT")
+
+    return sorted(problems)
+
+
+def explain_shape(model, query, sort, pipeline):
+    collection = model._get_collection()
+
+    if pipeline is not None:
+        return collection.database.command(
+            "explain",
+            {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}},
+            verbosity="queryPlanner",
+        )
+
+    cursor = collection.find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+
+    return cursor.limit(1).explain()
+
+
+def check_query_plans(shapes=QUERY_SHAPES):
+    """
+    Returns [(name, problems), ...] for every shape, ensuring the
+    declared indexes exist first.
+    """
+
+    for model in {shape[1] for shape in shapes}:
+        model.ensure_indexes()
+
+    return [
+        (name, plan_problems(explain_shape(model, query, sort, pipeline)))
+        for name, model, query, sort, pipeline in shapes
+    ]
@@ -1,12 +1,70 @@
-from referrals.models import Referral, RewardLedger, RewardConfig
+from datetime import datetime
+from referrals.models import RewardLedger, RewardConfig, ReferralStats
+from referrals.balances import record_transitions
+from referrals.config_cache import bump_generation, reward_config_cache
+from referrals.versions import bump_data_versions
+from utils.mongo import analytics_collection
 
 
-def get_top_referrers(limit=10):
+MAX_LEADERBOARD_PAGE = 100
+
+LEADERBOARD_FILTER = {"successful_referrals": {"$gt": 0}}
+LEADERBOARD_SORT = [("successful_referrals", -1), ("user", 1)]
+
+
+def get_top_referrers(limit=10, offset=0):
     """
     Returns top users by successful referrals.
+
+    Served from the referral_stats counters (kept current by
+    apply_referral_code) as an indexed range read on the analytics alias.
+    """
+
+    rows = (
+        analytics_collection(ReferralStats)
+        .find(LEADERBOARD_FILTER, {"user": 1, "successful_referrals": 1})
+        .sort(LEADERBOARD_SORT)
+        .skip(offset)
+        .limit(limit)
+    )
+
+    return [leaderboard_row(r) for r in rows]
+
+
+def leaderboard_row(r):
+    return {
+        "user_id": str(r["user"]),
+        "successful_referrals": r["successful_referrals"],
+    }
+
+
+def parse_leaderboard_params(params):
+    """
+    Reads `limit` and `offset` from query params. Raises ValueError.
+    """
+
+    try:
+        limit = int(params.get("limit", 10))
+        offset = int(params.get("offset", 0))
+    except (TypeError, ValueError):
+        raise ValueError("limit and offset must be integers")
+
+    if limit < 1 or limit > MAX_LEADERBOARD_PAGE:
+        raise ValueError(f"limit must be between 1 and {MAX_LEADERBOARD_PAGE}")
+
+    if offset < 0:
+        raise ValueError("offset must be positive")
+
+    return limit, offset
+
+
+def top_referrers_pipeline(limit):
+    """
+    Full-scan aggregation the leaderboard replaced; kept as the
+    baseline for bench_leaderboard.
     """
 
-    pipeline = [
+    return [
         {"$match": {"referral_code_used": {"$ne": None}}},
         {
             "$group": {
@@ -18,36 +76,31 @@ def get_top_referrers(limit=10):
         {"$limit": limit},
     ]
 
-    results = Referral.objects.aggregate(*pipeline)
-
-    response = []
-
-    for r in results:
-        response.append(
-            {
-                "user_id": str(r["_id"]),
-                "successful_referrals": r["successful_referrals"],
-            }
-        )
-
-    return response
-
 
 def credit_reward(reward_id):
     """
     Credit a pending reward.
     """
 
-    reward = RewardLedger.objects(id=reward_id).first()
+    reward = RewardLedger.objects(id=reward_id, status="PENDING").modify(
+        set__status="CREDITED",
+        set__credited_at=datetime.utcnow(),
+        new=True,
+    )
 
+    # the status condition makes the flip happen once; explain the miss
     if not reward:
-        raise ValueError("Reward not found")
+        if not RewardLedger.objects(id=reward_id).only("id").first():
+            raise ValueError("Reward not found")
 
-    if reward.status != "PENDING":
         raise ValueError("Only pending rewards can be credited")
 
-    reward.status = "CREDITED"
-    reward.save()
+    user_id = reward.to_mongo()["user"]
+
+    record_transitions(
+        [(user_id, reward.reward_unit, reward.reward_value)], "PENDING", "CREDITED"
+    )
+    bump_data_versions([user_id])
 
     return reward
 
@@ -72,4 +125,8 @@ def create_reward_config(data):
     )
     config.save()
 
+    # other workers pick this up on their next generation check
+    bump_generation()
+    reward_config_cache.invalidate()
+
     return config
@@ -0,0 +1,86 @@
+"""
+Cold-start probe for bench_startup; run in a fresh interpreter:
+
+    DJANGO_SETTINGS_MODULE=core.settings_api python -m admin_panel.startup_probe
+
+Times loading the WSGI application (settings, apps, middleware), the
+first request (URLconf and view imports) and warm requests, all through
+the WSGI callable gunicorn uses. Prints "ready" as soon as the first
+response is out (the parent times process start to that line), then one
+JSON object.
+"""
+
+import io
+import json
+import resource
+import statistics
+import sys
+import time
+
+# any route that answers without Mongo: no token -> 401 from utils.auth
+DEFAULT_PATH = "/api/referrals/analytics/summary/"
+
+
+def _request(application, path):
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": "",
+        "SERVER_NAME": "bench",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "bench",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": sys.stderr,
+        "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": False,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    statuses = []
+
+    body = application(environ, lambda status, headers, *_: statuses.append(status))
+    try:
+        b"".join(body)
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+
+    return statuses[0]
+
+
+def main(path=DEFAULT_PATH, requests=200):
+    started = time.perf_counter()
+
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    loaded = time.perf_counter()
+
+    status = _request(application, path)
+    first = time.perf_counter()
+    print("ready", flush=True)
+
+    samples = []
+    for _ in range(requests):
+        t = time.perf_counter()
+        _request(application, path)
+        samples.append((time.perf_counter() - t) * 1e6)
+
+    print(
+        json.dumps(
+            {
+                "load_ms": (loaded - started) * 1000,
+                "first_response_ms": (first - started) * 1000,
+                "first_status": status,
+                "warm_request_us": statistics.median(samples) if samples else None,
+                "modules": len(sys.modules),
+                "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2], *[int(n) for n in sys.argv[2:3]])
@@ -1,3 +1,9 @@
-from django.test import TestCase
+from utils.testing import MongoTestCase
+from .query_plans import check_query_plans
 
-# Create your tests here.
+
+class QueryPlanTests(MongoTestCase):
+    def test_service_queries_use_indexes(self):
+        failures = [(name, p) for name, p in check_query_plans() if p]
+
+        self.assertEqual(failures, [])
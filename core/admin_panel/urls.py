@@ -1,8 +1,31 @@
 from django.urls import path
-from .views import admin_top_referrers, admin_credit_reward, admin_create_reward_config
+from .views import (
+    admin_top_referrers,
+    admin_credit_reward,
+    admin_create_reward_config,
+    admin_auth_cache_stats,
+    admin_outbox_stats,
+    admin_export,
+    admin_bulk_credit,
+    admin_credit_job,
+    admin_ingest_first_orders,
+)
+from . import async_views
 
 urlpatterns = [
     path("referrals/top/", admin_top_referrers, name="admin-top-referrers"),
+    path(
+        "async/referrals/top/",
+        async_views.admin_top_referrers,
+        name="async-admin-top-referrers",
+    ),
+    path("rewards/bulk-credit/", admin_bulk_credit, name="admin-bulk-credit"),
+    path("credit-jobs/<str:job_id>/", admin_credit_job, name="admin-credit-job"),
+    path(
+        "rewards/first-orders/",
+        admin_ingest_first_orders,
+        name="admin-ingest-first-orders",
+    ),
     path(
         "rewards/<str:reward_id>/credit",
         admin_credit_reward,
@@ -13,4 +36,11 @@ urlpatterns = [
         admin_create_reward_config,
         name="admin-create-reward-config",
     ),
+    path(
+        "auth-cache/stats/",
+        admin_auth_cache_stats,
+        name="admin-auth-cache-stats",
+    ),
+    path("outbox/stats/", admin_outbox_stats, name="admin-outbox-stats"),
+    path("export/<str:source>/", admin_export, name="admin-export"),
 ]
@@ -1,3 +1,5 @@
+from bson import ObjectId
+from django.http import StreamingHttpResponse
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -5,7 +7,26 @@ from rest_framework import status
 
 from utils.isAdmin import isAdmin as is_admin
 from utils.auth import authenticate
-from .services import get_top_referrers, credit_reward, create_reward_config
+from utils.principal_cache import principal_cache
+from utils.revocation import revocation_list
+from user_auth.outbox import outbox_stats
+from referrals.orders import ingest_first_orders, parse_events
+from .services import (
+    get_top_referrers,
+    credit_reward,
+    create_reward_config,
+    parse_leaderboard_params,
+)
+from .exports import FORMATS, build_export_query, render_export
+from .credits import (
+    credit_reward_ids,
+    validate_credit_filter,
+    needs_background_job,
+    credit_by_filter,
+    create_credit_job,
+    job_to_dict,
+)
+from .models import CreditJob
 
 
 @api_view(["GET"])
@@ -13,7 +34,15 @@ from .services import get_top_referrers, credit_reward, create_reward_config
 @is_admin
 def admin_top_referrers(request):
 
-    data = get_top_referrers()
+    try:
+        limit, offset = parse_leaderboard_params(request.query_params)
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    data = get_top_referrers(limit=limit, offset=offset)
     return Response(data, status=status.HTTP_200_OK)
 
 
@@ -65,3 +94,112 @@ def admin_create_reward_config(request):
             {"error": str(e)},
             status=status.HTTP_400_BAD_REQUEST,
         )
+
+
+@api_view(["GET"])
+@authenticate
+@is_admin
+def admin_auth_cache_stats(request):
+
+    return Response(
+        {**principal_cache.stats(), "revocations": revocation_list.stats()},
+        status=status.HTTP_200_OK,
+    )
+
+
+@api_view(["GET"])
+@authenticate
+@is_admin
+def admin_outbox_stats(request):
+
+    return Response(outbox_stats(), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@authenticate
+@is_admin
+def admin_export(request, source):
+
+    output = request.query_params.get("output", "ndjson")
+
+    try:
+        query = build_export_query(source, request.query_params)
+        chunks = render_export(source, query, output)
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[output])
+    response["Content-Disposition"] = f'attachment; filename="{source}.{output}"'
+
+    return response
+
+
+@api_view(["POST"])
+@authenticate
+@is_admin
+def admin_bulk_credit(request):
+
+    reward_ids = request.data.get("reward_ids")
+    credit_filter = request.data.get("filter")
+
+    if (reward_ids is None) == (credit_filter is None):
+        return Response(
+            {"error": "Provide either reward_ids or filter"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        if reward_ids is not None:
+            return Response(credit_reward_ids(reward_ids), status=status.HTTP_200_OK)
+
+        clean = validate_credit_filter(credit_filter)
+
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    if request.data.get("background") or needs_background_job(clean):
+        job = create_credit_job(clean, request.user)
+
+        return Response(job_to_dict(job), status=status.HTTP_202_ACCEPTED)
+
+    return Response(credit_by_filter(clean), status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@authenticate
+@is_admin
+def admin_credit_job(request, job_id):
+
+    job = CreditJob.objects(id=job_id).first() if ObjectId.is_valid(job_id) else None
+
+    if not job:
+        return Response(
+            {"error": "Credit job not found"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+
+    return Response(job_to_dict(job), status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@authenticate
+@is_admin
+def admin_ingest_first_orders(request):
+
+    # raw body: DRF's parsers do not accept NDJSON
+    try:
+        events = parse_events(request.body, request.content_type or "")
+        data = ingest_first_orders(events)
+    except ValueError as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response(data, status=status.HTTP_200_OK)
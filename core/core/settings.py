@@ -11,12 +11,61 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from mongoengine import connect
-from decouple import config
+from pymongo import monitoring
+from decouple import config, Csv
+from utils.mongo import read_preference, register_connections
+from utils.mongo_metrics import command_metrics
 import os
 import logging
 
-connect(db="Jwt-Auth-Django", host=config("MONGO_URI"))
+MONGO_URI = config("MONGO_URI")
+MONGO_DB_NAME = "Jwt-Auth-Django"
+
+# MongoClient options shared by every alias. A client is created lazily
+# in each process (utils.mongo), so these are per-process pool limits.
+MONGO_CLIENT_OPTIONS = {
+    "maxPoolSize": config("MONGO_MAX_POOL_SIZE", default=50, cast=int),
+    "minPoolSize": config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+    "maxIdleTimeMS": config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int),
+    "connectTimeoutMS": config("MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int),
+    "socketTimeoutMS": config("MONGO_SOCKET_TIMEOUT_MS", default=30000, cast=int),
+    "serverSelectionTimeoutMS": config(
+        "MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int
+    ),
+}
+
+# e.g. "zstd,snappy,zlib"; zstd and snappy need their python packages
+MONGO_COMPRESSORS = config("MONGO_COMPRESSORS", default="", cast=Csv())
+if MONGO_COMPRESSORS:
+    MONGO_CLIENT_OPTIONS["compressors"] = MONGO_COMPRESSORS
+
+# Analytics and leaderboard reads go to the "analytics" alias. With a
+# secondary read preference, users whose data changed within the last
+# MONGO_ANALYTICS_MAX_STALENESS seconds are still read from the primary.
+MONGO_ANALYTICS_URI = config("MONGO_ANALYTICS_URI", default=MONGO_URI)
+MONGO_ANALYTICS_READ_PREFERENCE = config(
+    "MONGO_ANALYTICS_READ_PREFERENCE", default="secondaryPreferred"
+)
+MONGO_ANALYTICS_MAX_STALENESS = config(
+    "MONGO_ANALYTICS_MAX_STALENESS", default=90, cast=int
+)
+
+MONGO_DATABASES = {
+    "default": {"name": MONGO_DB_NAME, "host": MONGO_URI, **MONGO_CLIENT_OPTIONS},
+    "analytics": {
+        "name": MONGO_DB_NAME,
+        "host": MONGO_ANALYTICS_URI,
+        "read_preference": read_preference(
+            MONGO_ANALYTICS_READ_PREFERENCE, MONGO_ANALYTICS_MAX_STALENESS
+        ),
+        **MONGO_CLIENT_OPTIONS,
+    },
+}
+
+# per-request Mongo command metrics; must be registered before any client exists
+monitoring.register(command_metrics)
+
+register_connections(MONGO_DATABASES)
 
 logger = logging.getLogger(__name__)
 
@@ -66,7 +115,105 @@ EMAIL_USE_TLS = config("EMAIL_USE_TLS", cast=bool)
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = config("EMAIL_HOST_PASSWORD")
 
+# In-process cache of authenticated principals (utils.principal_cache)
+AUTH_CACHE_MAX_SIZE = config("AUTH_CACHE_MAX_SIZE", default=10000, cast=int)
+AUTH_CACHE_TTL = config("AUTH_CACHE_TTL", default=60, cast=int)
+
+# Email outbox worker (python manage.py drain_outbox)
+OUTBOX_BATCH_SIZE = config("OUTBOX_BATCH_SIZE", default=50, cast=int)
+OUTBOX_WORKERS = config("OUTBOX_WORKERS", default=4, cast=int)
+OUTBOX_MAX_ATTEMPTS = config("OUTBOX_MAX_ATTEMPTS", default=5, cast=int)
+OUTBOX_LEASE_SECONDS = config("OUTBOX_LEASE_SECONDS", default=120, cast=int)
+OUTBOX_BACKOFF_BASE = config("OUTBOX_BACKOFF_BASE", default=5, cast=float)
+OUTBOX_BACKOFF_MAX = config("OUTBOX_BACKOFF_MAX", default=900, cast=float)
+OUTBOX_POLL_INTERVAL = config("OUTBOX_POLL_INTERVAL", default=1, cast=float)
+
+# Stateless JWT auth: a signed, unexpired token with a jti is trusted without
+# a Session read; logouts are checked against utils.revocation instead
+AUTH_STATELESS = config("AUTH_STATELESS", default=False, cast=bool)
+REVOCATION_SYNC_INTERVAL = config("REVOCATION_SYNC_INTERVAL", default=5, cast=float)
+REVOCATION_FULL_SYNC_INTERVAL = config(
+    "REVOCATION_FULL_SYNC_INTERVAL", default=300, cast=float
+)
+REVOCATION_BLOOM_CAPACITY = config(
+    "REVOCATION_BLOOM_CAPACITY", default=100000, cast=int
+)
+
+# Token-bucket rate limits per URL name (utils.ratelimit). Scopes are
+# "ip", "email" (request body) and "user"; rates are "<count>/<period>",
+# e.g. "10/m" or "5/10m". Backend "local" is per process, "mongo" is shared.
+RATE_LIMIT_ENABLED = config("RATE_LIMIT_ENABLED", default=True, cast=bool)
+RATE_LIMIT_BACKEND = config("RATE_LIMIT_BACKEND", default="local")
+# Proxies that append to X-Forwarded-For in front of the app. The default
+# of 1 matches the Heroku router (Procfile); with 0 behind a router every
+# client shares the router's REMOTE_ADDR and one bucket. Use 0 only when
+# clients connect directly, or they could spoof the header.
+RATE_LIMIT_PROXY_COUNT = config("RATE_LIMIT_PROXY_COUNT", default=1, cast=int)
+RATE_LIMITS = {
+    "signup": {"ip": "10/h", "email": "3/h"},
+    "verify-otp": {"ip": "30/h", "email": "5/10m"},
+    "login": {"ip": "30/m", "email": "10/m"},
+    "apply-referral": {"ip": "60/m", "user": "10/m"},
+}
+
+# Password hashing (utils.hashing)
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", default=12, cast=int)
+HASH_POOL_WORKERS = config(
+    "HASH_POOL_WORKERS", default=max(1, (os.cpu_count() or 2) // 2), cast=int
+)
+HASH_POOL_MAX_QUEUE = config("HASH_POOL_MAX_QUEUE", default=32, cast=int)
+HASH_POOL_TIMEOUT = config("HASH_POOL_TIMEOUT", default=10, cast=float)
+
+# Seconds between RewardConfig generation checks (referrals.config_cache)
+REWARD_CONFIG_CHECK_INTERVAL = config(
+    "REWARD_CONFIG_CHECK_INTERVAL", default=5, cast=float
+)
+
+# Response cache behind the analytics ETags (referrals.caching).
+# Local memory by default; point it at a FileBasedCache directory to share
+# it between the processes of one host.
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "analytics": {
+        "BACKEND": config(
+            "ANALYTICS_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("ANALYTICS_CACHE_LOCATION", default="analytics"),
+        "TIMEOUT": config("ANALYTICS_CACHE_TTL", default=300, cast=int),
+        "OPTIONS": {
+            "MAX_ENTRIES": config(
+                "ANALYTICS_CACHE_MAX_ENTRIES", default=10000, cast=int
+            ),
+        },
+    },
+}
+
+# Bearer token required by /metrics/. Without one the endpoint is only
+# open while DEBUG is on.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+# Server-Timing header with per-collection Mongo timings on every response;
+# it reveals collection names, so it is off unless DEBUG or enabled here
+SERVER_TIMING_ENABLED = config("SERVER_TIMING_ENABLED", default=DEBUG, cast=bool)
+
+# Referral codes (referrals.utils, referrals.code_pool)
+REFERRAL_CODE_PREFIX = config("REFERRAL_CODE_PREFIX", default="SVH")
+REFERRAL_CODE_LENGTH = config("REFERRAL_CODE_LENGTH", default=6, cast=int)
+REFERRAL_CODE_ALPHABET = config(
+    "REFERRAL_CODE_ALPHABET", default="ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+)
+REFERRAL_CODE_POOL_TARGET = config(
+    "REFERRAL_CODE_POOL_TARGET", default=10000, cast=int
+)
+
+# Referral tree (referrals.tree): stored ancestry depth, and the percentage
+# of the base reward paid to tier 1 (direct referrer), tier 2, ...
+REFERRAL_TREE_MAX_DEPTH = config("REFERRAL_TREE_MAX_DEPTH", default=10, cast=int)
+REFERRAL_TIER_RATES = config("REFERRAL_TIER_RATES", default="100,50,25", cast=Csv(int))
+
 MIDDLEWARE = [
+    "utils.metrics.MongoMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
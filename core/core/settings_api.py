@@ -0,0 +1,55 @@
+"""
+API-only settings profile.
+
+Same configuration as core.settings, minus everything the Mongo-backed
+JSON API does not use: the Django admin, auth, sessions, messages,
+contenttypes and staticfiles apps, the sqlite database, the template
+engine and the middleware that only serves them. Authentication stays
+in utils.auth.authenticate.
+
+    DJANGO_SETTINGS_MODULE=core.settings_api gunicorn core.wsgi:application
+
+Compare boot and request cost with `python manage.py bench_startup`.
+"""
+
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    "rest_framework",
+    "user_auth",
+    "referrals",
+    "admin_panel",
+    "corsheaders",
+]
+
+# bearer tokens, no sessions: CSRF, auth, messages and frame options have
+# nothing to act on (DRF views are csrf-exempt anyway)
+MIDDLEWARE = [
+    "utils.metrics.MongoMetricsMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+TEMPLATES = []
+
+DATABASES = {}
+
+AUTH_PASSWORD_VALIDATORS = []
+
+USE_I18N = False
+
+# utils.auth sets request.user itself; without django.contrib.auth DRF must
+# not build an AnonymousUser or try session/basic authentication
+REST_FRAMEWORK = {
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    # same as DRF's default: clients may still post form-encoded bodies
+    "DEFAULT_PARSER_CLASSES": [
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "UNAUTHENTICATED_USER": None,
+}
@@ -15,12 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path, include
+from utils.metrics import metrics
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("api/auth/", include("user_auth.urls")),
     path("api/referrals/", include("referrals.urls")),
     path("api/admin/", include("admin_panel.urls")),
+    path("metrics/", metrics, name="metrics"),
 ]
+
+# not installed in the API-only profile (core.settings_api)
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.insert(0, path("admin/", admin.site.urls))
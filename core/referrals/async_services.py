@@ -0,0 +1,121 @@
+import asyncio
+from utils.mongo import analytics_alias
+from utils.mongo_async import get_async_db
+from .models import Referral, RewardLedger, ReferralStats, ReferralDailyRollup
+from .pagination import DEFAULT_PAGE_SIZE, page
+from .rollups import UTC, rollup_filter, timeline_from_rollups
+from .services import (
+    build_summary,
+    referral_list_filter,
+    referral_list_row,
+    reward_history_filter,
+    reward_history_row,
+)
+
+
+def _db():
+    return get_async_db(analytics_alias())
+
+
+def _referrals():
+    return _db()[Referral._get_collection_name()]
+
+
+def _ledger():
+    return _db()[RewardLedger._get_collection_name()]
+
+
+async def get_referral_summary(user):
+    """
+    Async analytics summary served from the ReferralStats counters.
+    Users without counters fall back to three concurrent reads.
+    """
+
+    stats = await _db()[ReferralStats._get_collection_name()].find_one(
+        {"user": user.id},
+        {"referral_code": 1, "total_referrals": 1, "successful_referrals": 1},
+    )
+
+    if stats:
+        return build_summary(
+            stats.get("referral_code"),
+            stats.get("total_referrals", 0),
+            stats.get("successful_referrals", 0),
+        )
+
+    my_referral, total, success = await asyncio.gather(
+        _referrals().find_one({"referred_by": user.id}, {"referral_code": 1}),
+        _referrals().count_documents({"referred_by": user.id}),
+        _referrals().count_documents(
+            {"referred_by": user.id, "referral_code_used": {"$ne": None}}
+        ),
+    )
+
+    if not my_referral:
+        return build_summary(None, 0, 0)
+
+    return build_summary(my_referral["referral_code"], total, success)
+
+
+async def get_referral_list(user, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Async page of users who used my referral code.
+    """
+
+    results = (
+        _referrals()
+        .find(
+            referral_list_filter(user.id, cursor),
+            {"referred_at": 1, "referral_code_used": 1, "referral_used_at": 1},
+        )
+        .sort([("referred_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+
+    rows, next_cursor = page(await results.to_list(None), limit, "referred_at")
+
+    return {
+        "results": [referral_list_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+async def get_referral_timeline(
+    user, start=None, end=None, granularity="day", tz=UTC
+):
+    """
+    Async successful referrals grouped by day, week or month in `tz`.
+    """
+
+    rollups = (
+        _db()[ReferralDailyRollup._get_collection_name()]
+        .find(
+            rollup_filter(user.id, start, end, tz),
+            {"day": 1, "count": 1, "slots": 1, "hours": 1},
+        )
+        .sort("day", 1)
+    )
+
+    return timeline_from_rollups(
+        await rollups.to_list(None), start, end, granularity, tz
+    )
+
+
+async def get_reward_history(user, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    Async page of rewards for logged-in user.
+    """
+
+    results = (
+        _ledger()
+        .find(reward_history_filter(user.id, cursor), {"user": 0, "referral": 0})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+
+    rows, next_cursor = page(await results.to_list(None), limit, "created_at")
+
+    return {
+        "results": [reward_history_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,59 @@
+from rest_framework import status
+from utils.async_api import async_api_view, json_response
+from utils.auth import authenticate_async
+
+from . import async_services
+from .caching import cached_analytics_async
+from .pagination import parse_page_params
+from .rollups import parse_timeline_params
+
+
+@async_api_view(["GET"])
+@authenticate_async
+@cached_analytics_async
+async def referral_summary(request):
+    data = await async_services.get_referral_summary(request.user)
+    return json_response(data, status=status.HTTP_200_OK)
+
+
+@async_api_view(["GET"])
+@authenticate_async
+@cached_analytics_async
+async def referral_list(request):
+    try:
+        limit, cursor = parse_page_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await async_services.get_referral_list(
+        request.user, limit=limit, cursor=cursor
+    )
+    return json_response(data, status=status.HTTP_200_OK)
+
+
+@async_api_view(["GET"])
+@authenticate_async
+@cached_analytics_async
+async def referral_timeline(request):
+    try:
+        params = parse_timeline_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await async_services.get_referral_timeline(request.user, **params)
+    return json_response(data, status=status.HTTP_200_OK)
+
+
+@async_api_view(["GET"])
+@authenticate_async
+@cached_analytics_async
+async def reward_history(request):
+    try:
+        limit, cursor = parse_page_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = await async_services.get_reward_history(
+        request.user, limit=limit, cursor=cursor
+    )
+    return json_response(data, status=status.HTTP_200_OK)
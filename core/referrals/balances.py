@@ -0,0 +1,311 @@
+"""
+Reward balances.
+
+reward_balances holds one row per (user, unit) with the pending,
+credited and revoked totals of that user's ledger. Every ledger insert
+and status change applies the matching $inc, so the balance endpoint is
+a single indexed read. verify_balances recomputes the totals from the
+ledger, repairs drift (e.g. a process dying between the ledger write and
+the $inc) and records a checkpoint.
+"""
+
+import time
+from collections import defaultdict
+from datetime import datetime
+from pymongo import DeleteOne, UpdateOne
+from utils.mongo import analytics_collection
+from .models import (
+    RewardBalance,
+    RewardBalanceCheckpoint,
+    RewardConfig,
+    RewardLedger,
+)
+
+TOTALS = ("pending", "credited", "revoked")
+
+
+def _balances():
+    return RewardBalance._get_collection()
+
+
+def _apply(deltas):
+    """
+    deltas: {(user, unit): {"pending": n, ...}} -> one upsert per row.
+    """
+
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"user": user, "unit": unit},
+            {"$inc": inc, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for (user, unit), inc in deltas.items()
+        if any(inc.values())
+    ]
+
+    if ops:
+        _balances().bulk_write(ops, ordered=False)
+
+
+# -----------------------------------
+# Maintaining the running totals
+# -----------------------------------
+def record_ledger_rows(rows):
+    """
+    Adds newly inserted ledger rows (raw documents) to their totals.
+    """
+
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for row in rows:
+        status = row.get("status", "PENDING").lower()
+        deltas[(row["user"], row["reward_unit"])][status] += row["reward_value"]
+
+    _apply(deltas)
+
+
+def record_transitions(groups, old, new):
+    """
+    Moves value between totals for rows that went from status `old` to
+    `new`. groups: [(user, unit, value), ...], value summed per group.
+    """
+
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for user, unit, value in groups:
+        deltas[(user, unit)][old.lower()] -= value
+        deltas[(user, unit)][new.lower()] += value
+
+    _apply(deltas)
+
+
+# -----------------------------------
+# Reading
+# -----------------------------------
+def empty_balance():
+    return {unit: {total: 0 for total in TOTALS} for unit in RewardConfig.UNITS}
+
+
+def get_reward_balance(user_id):
+    """
+    Pending, credited and revoked totals per reward unit.
+    """
+
+    balance = empty_balance()
+
+    rows = analytics_collection(RewardBalance).find(
+        {"user": user_id}, {"_id": 0, "user": 0}
+    )
+
+    for row in rows:
+        balance[row["unit"]] = {total: row.get(total, 0) for total in TOTALS}
+
+    return balance
+
+
+# -----------------------------------
+# Verification
+# -----------------------------------
+def ledger_totals_pipeline():
+    """
+    Totals per (user, unit) straight from the ledger, in balance index order.
+    """
+
+    def total(status):
+        matches = {"$eq": ["$status", status]}
+        return {"$sum": {"$cond": [matches, "$reward_value", 0]}}
+
+    return [
+        {"$match": {"user": {"$ne": None}}},
+        {
+            "$group": {
+                "_id": {"user": "$user", "unit": "$reward_unit"},
+                "pending": total("PENDING"),
+                "credited": total("CREDITED"),
+                "revoked": total("REVOKED"),
+                "rows": {"$sum": 1},
+            }
+        },
+        {"$sort": {"_id.user": 1, "_id.unit": 1}},
+    ]
+
+
+def _merge(expected_rows, stored_rows):
+    """
+    Walks both streams in (user, unit) order, yielding (key, expected,
+    stored) with None on the side that has no row for the key.
+    """
+
+    expected_rows, stored_rows = iter(expected_rows), iter(stored_rows)
+    expected, stored = next(expected_rows, None), next(stored_rows, None)
+
+    def key_of(row, nested):
+        ids = row["_id"] if nested else row
+        return (ids["user"], ids["unit"])
+
+    while expected is not None or stored is not None:
+        e_key = key_of(expected, True) if expected is not None else None
+        s_key = key_of(stored, False) if stored is not None else None
+
+        if s_key is None or (e_key is not None and e_key < s_key):
+            yield e_key, expected, None
+            expected = next(expected_rows, None)
+        elif e_key is None or s_key < e_key:
+            yield s_key, None, stored
+            stored = next(stored_rows, None)
+        else:
+            yield e_key, expected, stored
+            expected, stored = next(expected_rows, None), next(stored_rows, None)
+
+
+def _recheck(user, unit):
+    """
+    Fresh (stored, expected) totals of one row. The streaming pass reads
+    the ledger and the balances at different moments, so a write landing
+    in between looks like drift until it is re-read.
+    """
+
+    rows = list(
+        RewardLedger._get_collection().aggregate(
+            [{"$match": {"user": user, "reward_unit": unit}}]
+            + ledger_totals_pipeline()[1:]
+        )
+    )
+    stored = _balances().find_one({"user": user, "unit": unit})
+
+    expected = {t: rows[0][t] for t in TOTALS} if rows else None
+    current = {t: stored.get(t, 0) for t in TOTALS} if stored else None
+
+    return current, expected
+
+
+def _unchanged(user, unit, current):
+    """
+    Filter on the balance row still holding `current`: a repair computed
+    from an earlier read must not overwrite an $inc that landed since.
+    """
+
+    return {
+        "user": user,
+        "unit": unit,
+        **{t: current[t] if current[t] else {"$in": [0, None]} for t in TOTALS},
+    }
+
+
+def verify_balances(repair=False, batch_size=1000):
+    """
+    Recomputes every balance from the ledger in one streaming pass (no
+    per-user state is held) and records a checkpoint. With `repair`,
+    drifted rows get an $inc of the difference, missing rows are inserted
+    and orphaned rows removed, each only if the row is still as read; a
+    row that moved meanwhile is left for the next pass. Returns the report.
+    """
+
+    started = time.perf_counter()
+
+    expected_rows = RewardLedger._get_collection().aggregate(
+        ledger_totals_pipeline(), allowDiskUse=True
+    )
+    stored_rows = (
+        _balances()
+        .find({}, {"_id": 0, "user": 1, "unit": 1, **{t: 1 for t in TOTALS}})
+        .sort([("user", 1), ("unit", 1)])
+    )
+
+    report = {
+        "ledger_rows": 0,
+        "checked": 0,
+        "missing": 0,
+        "drifted": 0,
+        "orphaned": 0,
+        "samples": [],
+    }
+    totals = empty_balance()
+    ops = []
+
+    def flush():
+        if ops and repair:
+            _balances().bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for (user, unit), expected, stored in _merge(expected_rows, stored_rows):
+        if expected is None:
+            current, want = _recheck(user, unit)
+            if want is not None or current is None:
+                continue  # ledger rows landed after the pass read them
+
+            report["orphaned"] += 1
+            ops.append(DeleteOne(_unchanged(user, unit, current)))
+
+        else:
+            report["checked"] += 1
+            report["ledger_rows"] += expected["rows"]
+
+            want = {t: expected[t] for t in TOTALS}
+            for t in TOTALS:
+                totals.setdefault(unit, dict.fromkeys(TOTALS, 0))[t] += want[t]
+
+            current = {t: stored.get(t, 0) for t in TOTALS} if stored else None
+            if current == want:
+                continue
+
+            current, want = _recheck(user, unit)
+            if current == want or want is None:
+                continue
+
+            if current is None:
+                report["missing"] += 1
+            else:
+                report["drifted"] += 1
+                if len(report["samples"]) < 20:
+                    report["samples"].append(
+                        {
+                            "user": str(user),
+                            "unit": unit,
+                            "stored": current,
+                            "expected": want,
+                        }
+                    )
+
+            now = datetime.utcnow()
+
+            if current is None:
+                # a concurrent upsert creating the row wins; no overwrite
+                ops.append(
+                    UpdateOne(
+                        {"user": user, "unit": unit},
+                        {"$setOnInsert": {**want, "updated_at": now}},
+                        upsert=True,
+                    )
+                )
+            else:
+                ops.append(
+                    UpdateOne(
+                        _unchanged(user, unit, current),
+                        {
+                            "$inc": {t: want[t] - current[t] for t in TOTALS},
+                            "$set": {"updated_at": now},
+                        },
+                    )
+                )
+
+        if len(ops) >= batch_size:
+            flush()
+
+    flush()
+
+    RewardBalanceCheckpoint(
+        duration_ms=int((time.perf_counter() - started) * 1000),
+        ledger_rows=report["ledger_rows"],
+        checked=report["checked"],
+        missing=report["missing"],
+        drifted=report["drifted"],
+        orphaned=report["orphaned"],
+        repaired=repair,
+        totals=totals,
+    ).save()
+
+    report["totals"] = totals
+
+    return report
@@ -0,0 +1,125 @@
+"""
+Conditional GET for the analytics endpoints.
+
+The ETag is derived from the user's data version, the view and its query
+string, so a matching If-None-Match is answered with 304 after a single
+version lookup. Rendered data is kept in the "analytics" cache under the
+same key; any write bumps the version, so stale entries are never hit
+and simply age out. Misses read from the analytics alias, except right
+after a bump, when a secondary could still serve the previous data.
+"""
+
+import hashlib
+from functools import wraps
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import status
+from rest_framework.response import Response
+from utils.mongo import primary_reads
+from utils.mongo_async import get_async_db
+from .models import DataVersion
+from .versions import get_data_version, needs_primary_reads
+
+
+def _cache():
+    return caches["analytics"]
+
+
+def version_key(view_name, user_id, version, params):
+    """
+    Digest of everything the response depends on; the ETag is its quoted form.
+    """
+
+    query = "&".join(f"{k}={v}" for k, v in sorted(params.items()))
+    digest = hashlib.sha256(f"{view_name}|{user_id}|{version}|{query}".encode())
+
+    return digest.hexdigest()[:32]
+
+
+def etag_matches(request, etag):
+    header = request.headers.get("If-None-Match", "")
+    if header.strip() == "*":
+        return True
+
+    # If-None-Match uses weak comparison
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def _with_etag(response, etag):
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_analytics(view_func):
+    """
+    Sync (DRF) views: 304 on a matching ETag, else serve from cache.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        version, bumped_at = get_data_version(request.user.id)
+        key = version_key(
+            view_func.__name__, request.user.id, version, request.query_params
+        )
+        etag = f'"{key}"'
+
+        if etag_matches(request, etag):
+            return _with_etag(HttpResponseNotModified(), etag)
+
+        data = _cache().get(f"data:{key}")
+        if data is not None:
+            return _with_etag(Response(data, status=status.HTTP_200_OK), etag)
+
+        with primary_reads(needs_primary_reads(bumped_at)):
+            response = view_func(request, *args, **kwargs)
+
+        if response.status_code == status.HTTP_200_OK:
+            _cache().set(f"data:{key}", response.data)
+            _with_etag(response, etag)
+
+        return response
+
+    return wrapper
+
+
+def cached_analytics_async(view_func):
+    """
+    Async views: same contract, version read through the async client.
+    """
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        versions = get_async_db()[DataVersion._get_collection_name()]
+        doc = await versions.find_one(
+            {"user": request.user.id}, {"version": 1, "bumped_at": 1, "_id": 0}
+        )
+        doc = doc or {}
+        key = version_key(
+            view_func.__name__,
+            request.user.id,
+            doc.get("version", 0),
+            request.GET,
+        )
+        etag = f'"{key}"'
+
+        if etag_matches(request, etag):
+            return _with_etag(HttpResponseNotModified(), etag)
+
+        # async views return rendered JSON, so the body is cached as-is
+        body = await _cache().aget(f"body:{key}")
+        if body is not None:
+            return _with_etag(
+                HttpResponse(body, content_type="application/json"), etag
+            )
+
+        with primary_reads(needs_primary_reads(doc.get("bumped_at"))):
+            response = await view_func(request, *args, **kwargs)
+
+        if response.status_code == status.HTTP_200_OK:
+            await _cache().aset(f"body:{key}", response.content)
+            _with_etag(response, etag)
+
+        return response
+
+    return wrapper
@@ -0,0 +1,101 @@
+from datetime import datetime
+from django.conf import settings
+from pymongo.errors import BulkWriteError
+from .models import Referral, ReferralCodePool
+from .utils import build_referral_code
+
+# consecutive rounds that add nothing before fill_pool gives up
+MAX_EMPTY_ROUNDS = 10
+
+
+def claim_pooled_code():
+    """
+    Atomically takes one code out of the pool, or None when it is empty.
+    """
+
+    doc = ReferralCodePool._get_collection().find_one_and_delete(
+        {}, projection={"code": 1}
+    )
+
+    return doc["code"] if doc else None
+
+
+def fill_pool(target=None, batch_size=1000, max_empty_rounds=MAX_EMPTY_ROUNDS):
+    """
+    Tops the pool up to `target` codes. Candidates already used by a
+    Referral are dropped; the pool's unique index drops the rest.
+
+    Returns (added, exhausted). `exhausted` is True when it stopped short
+    of `target` because `max_empty_rounds` batches in a row added nothing
+    (the code space is close to full).
+    """
+
+    target = settings.REFERRAL_CODE_POOL_TARGET if target is None else target
+    pool = ReferralCodePool._get_collection()
+    added = 0
+    empty_rounds = 0
+
+    while True:
+        missing = target - pool.count_documents({})
+        if missing <= 0:
+            return added, False
+
+        if empty_rounds >= max_empty_rounds:
+            return added, True
+
+        candidates = {build_referral_code() for _ in range(min(missing, batch_size))}
+
+        taken = Referral._get_collection().distinct(
+            "referral_code", {"referral_code": {"$in": list(candidates)}}
+        )
+        fresh = candidates - set(taken)
+
+        if not fresh:
+            empty_rounds += 1
+            continue
+
+        now = datetime.utcnow()
+        try:
+            result = pool.insert_many(
+                [{"code": code, "created_at": now} for code in fresh], ordered=False
+            )
+            inserted = len(result.inserted_ids)
+
+        except BulkWriteError as e:
+            # duplicates against the pool are expected; anything else is not
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+            inserted = e.details["nInserted"]
+
+        added += inserted
+        empty_rounds = 0 if inserted else empty_rounds + 1
+
+
+def code_space_report():
+    """
+    Code-space occupancy and the collision rate a random draw would see.
+    """
+
+    alphabet = len(set(settings.REFERRAL_CODE_ALPHABET))
+    space = alphabet**settings.REFERRAL_CODE_LENGTH
+
+    used = Referral._get_collection().estimated_document_count()
+    pooled = ReferralCodePool._get_collection().estimated_document_count()
+
+    occupancy = min(1.0, (used + pooled) / space)
+
+    return {
+        "alphabet_size": alphabet,
+        "code_length": settings.REFERRAL_CODE_LENGTH,
+        "code_space": space,
+        "codes_used": used,
+        "codes_pooled": pooled,
+        "occupancy": occupancy,
+        # chance a fresh random code collides with an existing one
+        "collision_rate": occupancy,
+        "expected_draws_per_code": (
+            1 / (1 - occupancy) if occupancy < 1 else float("inf")
+        ),
+        # chance five direct retries all collide
+        "five_retry_failure_rate": occupancy**5,
+    }
@@ -0,0 +1,92 @@
+import threading
+import time
+from django.conf import settings
+from .models import ConfigGeneration, RewardConfig
+
+GENERATION_NAME = "reward_config"
+
+
+def bump_generation():
+    ConfigGeneration.objects(name=GENERATION_NAME).update_one(
+        upsert=True, inc__generation=1
+    )
+
+
+def current_generation():
+    stamp = (
+        ConfigGeneration.objects(name=GENERATION_NAME)
+        .only("generation")
+        .as_pymongo()
+        .first()
+    )
+
+    return stamp["generation"] if stamp else 0
+
+
+class RewardConfigCache:
+    """
+    Active RewardConfig per reward type, held in memory.
+
+    At most once per `check_interval` seconds the generation stamp is
+    read; the configs are reloaded only when it moved. Other processes
+    therefore see a new config within `check_interval` seconds.
+    """
+
+    def __init__(self, check_interval):
+        self.check_interval = check_interval
+
+        self._configs = None
+        self._generation = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, reward_type):
+        # one read of _configs: invalidate() may reset it at any moment
+        configs = self._configs
+
+        if configs is None or self._is_stale():
+            configs = self._refresh()
+
+        return configs.get(reward_type)
+
+    def invalidate(self):
+        with self._lock:
+            self._configs = None
+
+    def _is_stale(self):
+        return (
+            self._configs is None
+            or time.monotonic() - self._checked_at >= self.check_interval
+        )
+
+    def _refresh(self):
+        """
+        Reloads if still stale; returns the configs that are current
+        under the lock.
+        """
+
+        with self._lock:
+            if not self._is_stale():
+                return self._configs  # another thread refreshed meanwhile
+
+            # read the stamp first: a bump during the load forces a reload
+            generation = current_generation()
+
+            if self._configs is None or generation != self._generation:
+                configs = {}
+
+                # same pick as RewardConfig.objects(...).first(): natural order
+                for config in RewardConfig.objects(is_active=True):
+                    configs.setdefault(config.reward_type, config)
+
+                self._configs = configs
+                self._generation = generation
+
+            self._checked_at = time.monotonic()
+
+            return self._configs
+
+
+reward_config_cache = RewardConfigCache(
+    check_interval=settings.REWARD_CONFIG_CHECK_INTERVAL,
+)
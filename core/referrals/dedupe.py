@@ -0,0 +1,194 @@
+"""
+One-off cleanup before the unique referral indexes are built.
+
+The old apply path (read, check, then save) let concurrent applies
+through, so an existing database can hold users who claimed more than
+one code and several rewards of one type for the same referral. Neither
+unique index (referral_code_used_unique on referral, referral /
+reward_type / user on reward_ledger) builds until those are resolved:
+
+  claims   the earliest claim of each user is kept; the later ones are
+           released (the code is unused again) and their PENDING
+           rewards revoked
+  rewards  one row per key is kept, CREDITED before PENDING before
+           REVOKED, then the oldest; the others are deleted
+
+Everything here reads the raw collections: Model._get_collection()
+would try to build the very indexes the duplicates block.
+"""
+
+from datetime import datetime
+from mongoengine.connection import get_db
+from pymongo import DeleteOne
+from .models import Referral, RewardLedger
+
+# indexes the unique ones replace: same keys, so they must go first
+SUPERSEDED_INDEXES = ((Referral, "referral_code_used_1"),)
+
+STATUS_RANK = {"CREDITED": 0, "PENDING": 1, "REVOKED": 2}
+
+SAMPLE_SIZE = 20
+
+
+def _raw(model):
+    return get_db()[model._get_collection_name()]
+
+
+def _claim_order(doc):
+    used_at = doc.get("referral_used_at")
+    return (used_at is None, used_at or datetime.min, doc["_id"])
+
+
+def duplicates_pipeline(keys, match):
+    """
+    Groups of more than one document sharing the values of `keys`.
+    """
+
+    return [
+        {"$match": match},
+        {
+            "$group": {
+                "_id": {key: f"${key}" for key in keys},
+                "ids": {"$push": "$_id"},
+                "count": {"$sum": 1},
+            }
+        },
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+
+
+def _groups(model, keys, match, projection):
+    """
+    Yields each duplicate group's documents.
+    """
+
+    collection = _raw(model)
+
+    for group in collection.aggregate(
+        duplicates_pipeline(keys, match), allowDiskUse=True
+    ):
+        yield list(collection.find({"_id": {"$in": group["ids"]}}, projection))
+
+
+def resolve_duplicate_claims(apply=False):
+    """
+    Releases every claim but the earliest of each user. Returns the report.
+    """
+
+    report = {"users": 0, "released": 0, "revoked": 0, "samples": []}
+    released = []
+
+    for docs in _groups(
+        Referral,
+        ["referral_code_used"],
+        {"referral_code_used": {"$type": "objectId"}},
+        {"referral_code_used": 1, "referral_used_at": 1, "referral_code": 1},
+    ):
+        docs.sort(key=_claim_order)
+        keep, extra = docs[0], docs[1:]
+
+        report["users"] += 1
+        report["released"] += len(extra)
+        released += [doc["_id"] for doc in extra]
+
+        if len(report["samples"]) < SAMPLE_SIZE:
+            report["samples"].append(
+                {
+                    "user": str(keep["referral_code_used"]),
+                    "kept": keep["referral_code"],
+                    "released": [doc["referral_code"] for doc in extra],
+                }
+            )
+
+    rewards = {"referral": {"$in": released}, "status": "PENDING"}
+    report["revoked"] = _raw(RewardLedger).count_documents(rewards)
+    report["credited_kept"] = _raw(RewardLedger).count_documents(
+        {"referral": {"$in": released}, "status": "CREDITED"}
+    )
+
+    if apply and released:
+        _raw(Referral).update_many(
+            {"_id": {"$in": released}},
+            {
+                "$set": {
+                    "referral_code_used": None,
+                    "referral_used_at": None,
+                    "ancestry": [],
+                }
+            },
+        )
+        _raw(RewardLedger).update_many(rewards, {"$set": {"status": "REVOKED"}})
+
+    return report
+
+
+def resolve_duplicate_rewards(apply=False, batch_size=1000):
+    """
+    Keeps one ledger row per (referral, reward_type, user). Returns the
+    report.
+    """
+
+    report = {"keys": 0, "deleted": 0, "credited_deleted": 0, "samples": []}
+    ops = []
+
+    def flush():
+        if ops and apply:
+            _raw(RewardLedger).bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for docs in _groups(
+        RewardLedger,
+        ["referral", "reward_type", "user"],
+        {},
+        {"referral": 1, "reward_type": 1, "user": 1, "status": 1},
+    ):
+        docs.sort(key=lambda d: (STATUS_RANK.get(d.get("status"), 3), d["_id"]))
+        keep, extra = docs[0], docs[1:]
+
+        report["keys"] += 1
+        report["deleted"] += len(extra)
+        report["credited_deleted"] += sum(
+            1 for doc in extra if doc.get("status") == "CREDITED"
+        )
+
+        if len(report["samples"]) < SAMPLE_SIZE:
+            report["samples"].append(
+                {
+                    "referral": str(keep.get("referral")),
+                    "reward_type": keep.get("reward_type"),
+                    "user": str(keep.get("user")),
+                    "kept": str(keep["_id"]),
+                    "deleted": [str(doc["_id"]) for doc in extra],
+                }
+            )
+
+        ops.extend(DeleteOne({"_id": doc["_id"]}) for doc in extra)
+        if len(ops) >= batch_size:
+            flush()
+
+    flush()
+
+    return report
+
+
+def drop_superseded_indexes(apply=False):
+    """
+    Names of the superseded indexes present (dropped when `apply`).
+    """
+
+    found = []
+
+    for model, name in SUPERSEDED_INDEXES:
+        collection = _raw(model)
+
+        if name in collection.index_information():
+            found.append(f"{collection.name}.{name}")
+            if apply:
+                collection.drop_index(name)
+
+    return found
+
+
+def build_unique_indexes():
+    for model in (Referral, RewardLedger):
+        model.ensure_indexes()
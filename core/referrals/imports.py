@@ -0,0 +1,549 @@
+"""
+Bulk import of users and referral relationships from CSV or JSONL.
+
+One row per user: email, name, password (plain) or password_hash
+(bcrypt), optional is_verified, created_at, referred_by (the
+referrer's email) and referred_at. The file is read twice, streaming:
+
+  users      bcrypt runs in a process pool one batch ahead of the
+             unordered User insert_many
+  referrals  referrer and user emails resolved per batch with one $in,
+             then unordered Referral and RewardLedger inserts
+
+Memory is bounded by the batch size. After every batch the row number
+is saved in an ImportCheckpoint; the unique indexes on email,
+referral_code_used and the ledger make a replayed batch a no-op.
+"""
+
+import csv
+import json
+import math
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import bcrypt
+from bson import ObjectId
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from pymongo.errors import BulkWriteError
+from user_auth.models import EMAIL_COLLATION, User
+from .config_cache import reward_config_cache
+from .models import ImportCheckpoint, Referral, RewardLedger
+from .utils import build_referral_code
+
+IMPORT_BATCH_SIZE = 1000
+FORMATS = ("csv", "jsonl")
+REWARDS = ("none", "pending", "credited")
+
+_CODE_RETRIES = 5
+_TRUE = {"1", "true", "yes", "y"}
+
+
+# -----------------------------------
+# Reading
+# -----------------------------------
+def detect_format(path):
+    return "csv" if str(path).lower().endswith(".csv") else "jsonl"
+
+
+def read_rows(path, fmt):
+    """
+    Yields (row number, dict), numbered from 1, one row at a time.
+    """
+
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from enumerate(csv.DictReader(f), 1)
+            return
+
+        number = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            number += 1
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+def batches(rows, size):
+    batch = []
+
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def _parse_datetime(value, field):
+    if not value:
+        return None
+
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be an ISO datetime")
+
+
+def _is_bcrypt(value):
+    return isinstance(value, str) and value.startswith(("$2a$", "$2b$", "$2y$"))
+
+
+# -----------------------------------
+# Password hashing (runs in worker processes)
+# -----------------------------------
+def _hash_chunk(passwords, rounds):
+    return [
+        bcrypt.hashpw(p.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode()
+        for p in passwords
+    ]
+
+
+def submit_hashes(pool, workers, passwords, rounds):
+    """
+    Splits one batch across the pool. Returns the futures, in order.
+    """
+
+    if not passwords:
+        return []
+
+    size = math.ceil(len(passwords) / workers)
+
+    return [
+        pool.submit(_hash_chunk, passwords[start : start + size], rounds)
+        for start in range(0, len(passwords), size)
+    ]
+
+
+def collect_hashes(futures):
+    return [hashed for future in futures for hashed in future.result()]
+
+
+# -----------------------------------
+# Phase 1: users
+# -----------------------------------
+def user_doc(row):
+    """
+    (User document without password, plain password or None). Raises
+    ValueError.
+    """
+
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+
+    email = (row.get("email") or "").strip()
+    name = (row.get("name") or "").strip()
+
+    if not email or not name:
+        raise ValueError("email and name are required")
+
+    # insert_many skips the EmailField validation User.save() runs
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError(f"{email!r} is not a valid email address")
+
+    password, password_hash = row.get("password"), row.get("password_hash")
+
+    if password_hash and not _is_bcrypt(password_hash):
+        raise ValueError("password_hash must be a bcrypt hash")
+
+    if not password and not password_hash:
+        raise ValueError("password or password_hash is required")
+
+    verified = row.get("is_verified", True)
+    if isinstance(verified, str):
+        verified = verified.strip().lower() in _TRUE
+
+    doc = {
+        "_id": ObjectId(),
+        "name": name,
+        "email": email,
+        "password": password_hash,
+        "is_verified": bool(verified),
+        "isAdmin": False,
+        "created_at": _parse_datetime(row.get("created_at"), "created_at")
+        or datetime.now(),
+    }
+
+    return doc, None if password_hash else str(password)
+
+
+def prepare_users(batch, counts, errors):
+    """
+    (docs, plain passwords to hash for the docs whose password is None).
+    Emails that differ only in case from an existing user or an earlier
+    row of the batch are reported; exact repeats are left to the unique
+    index (a replayed batch).
+    """
+
+    parsed = []
+
+    for number, row in batch:
+        try:
+            parsed.append((number, *user_doc(row)))
+        except ValueError as e:
+            _invalid(counts, errors, number, str(e))
+
+    registered = _registered_emails([doc["email"] for _, doc, _ in parsed])
+    seen = {email.lower(): email for email in registered}
+    docs, passwords = [], []
+
+    for number, doc, password in parsed:
+        other = seen.setdefault(doc["email"].lower(), doc["email"])
+        if other != doc["email"] and doc["email"] not in registered:
+            _invalid(counts, errors, number, f"email already registered as {other}")
+            continue
+
+        docs.append(doc)
+        if password is not None:
+            passwords.append(password)
+
+    return docs, passwords
+
+
+def _registered_emails(emails):
+    """
+    Stored emails equal to any of `emails` ignoring case (one $in).
+    """
+
+    if not emails:
+        return set()
+
+    return {
+        doc["email"]
+        for doc in User._get_collection().find(
+            {"email": {"$in": emails}}, {"email": 1}, collation=EMAIL_COLLATION
+        )
+    }
+
+
+def insert_users(docs, hashes, counts):
+    hashes = iter(hashes)
+
+    for doc in docs:
+        if doc["password"] is None:
+            doc["password"] = next(hashes)
+
+    inserted = _insert_unordered(User, docs)
+
+    counts["users"] = counts.get("users", 0) + len(inserted)
+    counts["existing_users"] = counts.get("existing_users", 0) + (
+        len(docs) - len(inserted)
+    )
+
+
+# -----------------------------------
+# Phase 2: referrals and rewards
+# -----------------------------------
+def import_referrals(batch, rewards, counts, errors):
+    """
+    Creates a used Referral (and the referrer's SIGNUP reward) for every
+    row with a referred_by email.
+
+    Rewards are built from the batch's referrals as stored, not from the
+    ones this call inserted: a run that died between the two inserts
+    left referrals whose rewards a resumed run must still write.
+    """
+
+    wanted = []
+
+    for number, row in batch:
+        if not isinstance(row, dict):
+            continue
+
+        email = (row.get("email") or "").strip()
+        referrer = (row.get("referred_by") or "").strip()
+        if not email or not referrer:
+            continue
+
+        try:
+            used_at = _parse_datetime(row.get("referred_at"), "referred_at")
+        except ValueError as e:
+            _invalid(counts, errors, number, str(e))
+            continue
+
+        wanted.append((number, email, referrer, used_at or datetime.utcnow()))
+
+    if not wanted:
+        return
+
+    emails = {email for _, user, referrer, _ in wanted for email in (user, referrer)}
+    ids = {}
+
+    # exact matches win over case variants
+    for doc in User._get_collection().find(
+        {"email": {"$in": list(emails)}}, {"email": 1}, collation=EMAIL_COLLATION
+    ):
+        ids.setdefault(doc["email"].lower(), doc["_id"])
+        ids[doc["email"]] = doc["_id"]
+
+    def resolve(email):
+        return ids.get(email) or ids.get(email.lower())
+
+    docs = []
+
+    for number, user, referrer, used_at in wanted:
+        if user.lower() == referrer.lower():
+            _invalid(counts, errors, number, "A user cannot refer themselves")
+            continue
+
+        user_id, referrer_id = resolve(user), resolve(referrer)
+
+        if not user_id or not referrer_id:
+            counts["unresolved"] = counts.get("unresolved", 0) + 1
+            continue
+
+        docs.append(
+            {
+                "_id": str(uuid.uuid4()),
+                "referral_code": build_referral_code(),
+                "referred_by": referrer_id,
+                "referred_at": used_at,
+                "referral_code_used": user_id,
+                "referral_used_at": used_at,
+            }
+        )
+
+    inserted = _insert_referrals(docs)
+
+    counts["referrals"] = counts.get("referrals", 0) + len(inserted)
+    counts["existing_referrals"] = counts.get("existing_referrals", 0) + (
+        len(docs) - len(inserted)
+    )
+
+    config = reward_config_cache.get("SIGNUP") if rewards != "none" else None
+
+    if config and docs:
+        # existing rewards are dropped by the ledger's unique index
+        rows = [
+            reward_doc(referral, config, rewards)
+            for referral in stored_referrals(docs)
+        ]
+        written = _insert_unordered(RewardLedger, rows)
+        counts["rewards"] = counts.get("rewards", 0) + len(written)
+
+
+def stored_referrals(docs):
+    """
+    The stored referrals matching `docs` (same user and referrer), with
+    one $in on referral_code_used.
+    """
+
+    edges = {(doc["referral_code_used"], doc["referred_by"]) for doc in docs}
+
+    found = Referral._get_collection().find(
+        {
+            "referral_code_used": {
+                "$in": [user for user, _ in edges],
+                "$type": "objectId",  # the partial unique index
+            }
+        },
+        {"referral_code_used": 1, "referred_by": 1, "referral_used_at": 1},
+    )
+
+    return [r for r in found if (r["referral_code_used"], r["referred_by"]) in edges]
+
+
+def reward_doc(referral, config, rewards):
+    """
+    Direct-referrer reward; deeper tiers need the ancestry, which is
+    only rebuilt once every relationship is in.
+    """
+
+    now = datetime.utcnow()
+    credited = rewards == "credited"
+
+    return {
+        "_id": ObjectId(),
+        "user": referral["referred_by"],
+        "referral": referral["_id"],
+        "reward_type": config.reward_type,
+        "reward_value": config.reward_value,
+        "reward_unit": config.reward_unit,
+        "status": "CREDITED" if credited else "PENDING",
+        "tier": 1,
+        "created_at": referral.get("referral_used_at") or now,
+        **({"credited_at": now} if credited else {}),
+    }
+
+
+# -----------------------------------
+# Writes
+# -----------------------------------
+def _insert_unordered(model, docs):
+    """
+    insert_many(ordered=False); duplicate-key rows are skipped.
+    Returns the docs that were inserted.
+    """
+
+    if not docs:
+        return []
+
+    try:
+        model._get_collection().insert_many(docs, ordered=False)
+        return docs
+
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(err["code"] != 11000 for err in errors):
+            raise
+
+        failed = {err["index"] for err in errors}
+        return [doc for i, doc in enumerate(docs) if i not in failed]
+
+
+def _insert_referrals(docs):
+    """
+    Like _insert_unordered, but a clash on referral_code (random, so
+    rare) is retried with a fresh code instead of being skipped.
+    """
+
+    inserted = []
+
+    for _ in range(_CODE_RETRIES):
+        if not docs:
+            break
+
+        try:
+            Referral._get_collection().insert_many(docs, ordered=False)
+            return inserted + docs
+
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(err["code"] != 11000 for err in errors):
+                raise
+
+            clashes = {
+                err["index"]
+                for err in errors
+                if "referral_code" in err.get("keyPattern", {})
+                or "referral_code_1 " in err.get("errmsg", "")
+            }
+            failed = {err["index"] for err in errors}
+
+            inserted += [doc for i, doc in enumerate(docs) if i not in failed]
+            docs = [doc for i, doc in enumerate(docs) if i in clashes]
+
+            for doc in docs:
+                doc["referral_code"] = build_referral_code()
+
+    return inserted
+
+
+def _invalid(counts, errors, number, message):
+    counts["invalid"] = counts.get("invalid", 0) + 1
+    if len(errors) < 20:
+        errors.append({"row": number, "error": message})
+
+
+# -----------------------------------
+# Driver
+# -----------------------------------
+def load_checkpoint(name, restart=False):
+    if restart:
+        ImportCheckpoint.objects(name=name).delete()
+
+    checkpoint = ImportCheckpoint.objects(name=name).first()
+
+    if not checkpoint:
+        checkpoint = ImportCheckpoint(name=name, counts={})
+        checkpoint.save()
+
+    return checkpoint
+
+
+def save_checkpoint(checkpoint, phase, row, counts):
+    checkpoint.phase = phase
+    checkpoint.row = row
+    checkpoint.counts = counts
+    checkpoint.updated_at = datetime.utcnow()
+    checkpoint.save()
+
+
+def run_import(
+    path,
+    checkpoint,
+    fmt=None,
+    batch_size=IMPORT_BATCH_SIZE,
+    workers=None,
+    rewards="pending",
+    on_batch=None,
+):
+    """
+    Runs the users and referrals phases from `checkpoint` onwards.
+    `on_batch(phase, row, counts, rows_per_sec)` is called after each
+    batch. Returns (counts, sample errors).
+    """
+
+    fmt = fmt or detect_format(path)
+    counts = dict(checkpoint.counts or {})
+    errors = []
+
+    def remaining(phase):
+        start = checkpoint.row if checkpoint.phase == phase else 0
+        return (r for r in read_rows(path, fmt) if r[0] > start)
+
+    def report(phase, row, done, started):
+        save_checkpoint(checkpoint, phase, row, counts)
+        if on_batch:
+            elapsed = time.perf_counter() - started
+            on_batch(phase, row, counts, done / elapsed if elapsed else 0)
+
+    # -----------------------------------
+    # users: hash batch N+1 while batch N is written
+    # -----------------------------------
+    if checkpoint.phase == "users":
+        workers = workers or settings.HASH_POOL_WORKERS
+        started, done = time.perf_counter(), 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = None
+
+            for batch in batches(remaining("users"), batch_size):
+                docs, passwords = prepare_users(batch, counts, errors)
+                futures = submit_hashes(
+                    pool, workers, passwords, settings.BCRYPT_ROUNDS
+                )
+
+                if pending:
+                    done += _finish_users(pending, counts)
+                    report("users", pending[0], done, started)
+
+                pending = (batch[-1][0], len(batch), docs, futures)
+
+            if pending:
+                done += _finish_users(pending, counts)
+                report("users", pending[0], done, started)
+
+        save_checkpoint(checkpoint, "referrals", 0, counts)
+
+    # -----------------------------------
+    # referrals: every user now exists, wherever it appears in the file
+    # -----------------------------------
+    if checkpoint.phase == "referrals":
+        started, done = time.perf_counter(), 0
+
+        for batch in batches(remaining("referrals"), batch_size):
+            import_referrals(batch, rewards, counts, errors)
+            done += len(batch)
+            report("referrals", batch[-1][0], done, started)
+
+        save_checkpoint(checkpoint, "rebuild", 0, counts)
+
+    return counts, errors
+
+
+def _finish_users(pending, counts):
+    _, size, docs, futures = pending
+    insert_users(docs, collect_hashes(futures), counts)
+    return size
@@ -0,0 +1,234 @@
+import statistics
+import time
+import uuid
+from datetime import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+from bson import ObjectId
+from referrals.tree import (
+    descendants_fixup,
+    downline_by_depth_pipeline,
+    downline_filter,
+    extend_ancestry,
+    graph_lookup_pipeline,
+)
+from utils.mongo import check_scratch_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare materialized-ancestry downline queries with $graphLookup "
+        "on deep (chain) and wide (complete tree) synthetic referral trees, "
+        "and time attaching new members."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chain", type=int, default=2000, help="Length of the deep tree."
+        )
+        parser.add_argument(
+            "--branching", type=int, default=10, help="Children per wide-tree node."
+        )
+        parser.add_argument(
+            "--levels", type=int, default=5, help="Levels below the wide-tree root."
+        )
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--db", default=f"{settings.MONGO_DB_NAME}-bench")
+        parser.add_argument(
+            "--keep", action="store_true", help="Keep the scratch database."
+        )
+
+    def handle(self, *args, **options):
+        # collections are dropped while seeding, the database afterwards
+        try:
+            check_scratch_database(options["db"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        client = MongoClient(settings.MONGO_URI)
+        db = client[options["db"]]
+        max_depth = settings.REFERRAL_TREE_MAX_DEPTH
+
+        try:
+            for shape, edges in (
+                ("deep", self.chain_edges(options["chain"])),
+                ("wide", self.tree_edges(options["branching"], options["levels"])),
+            ):
+                root = edges[0][0]
+                self.seed(db, edges, max_depth)
+                self.stdout.write(
+                    self.style.MIGRATE_HEADING(f"\n{shape}: {len(edges)} referrals")
+                )
+
+                for depth in sorted({1, 3, max_depth}):
+                    self.compare(db, root, depth, options["repeat"])
+
+                self.time_attach(db, edges, max_depth)
+
+        finally:
+            if not options["keep"]:
+                client.drop_database(options["db"])
+            client.close()
+
+    # -----------------------------------
+    # Synthetic trees: [(parent, child), ...] in insertion order
+    # -----------------------------------
+    def chain_edges(self, length):
+        users = [ObjectId() for _ in range(length + 1)]
+        return list(zip(users, users[1:]))
+
+    def tree_edges(self, branching, levels):
+        edges, frontier = [], [ObjectId()]
+
+        for _ in range(levels):
+            children = []
+            for parent in frontier:
+                for _ in range(branching):
+                    child = ObjectId()
+                    edges.append((parent, child))
+                    children.append(child)
+            frontier = children
+
+        return edges
+
+    def seed(self, db, edges, max_depth):
+        db.referral.drop()
+        started = time.perf_counter()
+
+        ancestry = {}
+        batch = []
+
+        for parent, child in edges:
+            ancestry[child] = extend_ancestry(
+                parent, ancestry.get(parent, []), limit=max_depth
+            )
+            batch.append(
+                {
+                    "_id": str(uuid.uuid4()),
+                    "referral_code": uuid.uuid4().hex[:10],
+                    "referred_by": parent,
+                    "referred_at": datetime.utcnow(),
+                    "referral_code_used": child,
+                    "referral_used_at": datetime.utcnow(),
+                    "ancestry": ancestry[child],
+                }
+            )
+
+            if len(batch) == 10_000:
+                db.referral.insert_many(batch, ordered=False)
+                batch = []
+
+        if batch:
+            db.referral.insert_many(batch, ordered=False)
+
+        db.referral.create_index([("ancestry.user", 1), ("ancestry.depth", 1)])
+        db.referral.create_index("referral_code_used")
+        db.referral.create_index("referred_by")  # for $graphLookup
+
+        self.stdout.write(f"seeded in {time.perf_counter() - started:.1f}s")
+
+    # -----------------------------------
+    # Measurements
+    # -----------------------------------
+    def compare(self, db, root, depth, repeat):
+        count = self.timed(
+            repeat, lambda: db.referral.count_documents(downline_filter(root, depth))
+        )
+        by_depth = self.timed(
+            repeat,
+            lambda: list(
+                db.referral.aggregate(downline_by_depth_pipeline(root, depth))
+            ),
+        )
+
+        try:
+            graph = self.timed(
+                repeat,
+                lambda: list(
+                    db.referral.aggregate(
+                        graph_lookup_pipeline(root, depth), allowDiskUse=True
+                    )
+                ),
+            )
+        except Exception as e:  # $graphLookup is bounded to 100MB of memory
+            graph = None
+            self.stdout.write(self.style.WARNING(f"graphLookup failed: {e}"))
+
+        size = db.referral.count_documents(downline_filter(root, depth))
+        self.stdout.write(f"depth<={depth} downline={size}")
+        self.report("  ancestry count", count)
+        self.report("  ancestry by depth", by_depth)
+
+        if graph:
+            self.report("  $graphLookup", graph)
+            speedup = statistics.median(graph) / statistics.median(count)
+            self.stdout.write(self.style.SUCCESS(f"  speedup (median): {speedup:.0f}x"))
+
+    def time_attach(self, db, edges, max_depth):
+        """
+        A new leaf under the last member, then the root itself joining
+        under a new referrer (pushes ancestry down the whole tree).
+        """
+
+        leaf_parent = edges[-1][1]
+        leaf = ObjectId()
+
+        started = time.perf_counter()
+        parent_doc = db.referral.find_one(
+            {"referral_code_used": leaf_parent}, {"ancestry": 1}
+        )
+        ancestry = extend_ancestry(
+            leaf_parent, parent_doc["ancestry"] if parent_doc else [], limit=max_depth
+        )
+        db.referral.insert_one(
+            {
+                "_id": str(uuid.uuid4()),
+                "referral_code": uuid.uuid4().hex[:10],
+                "referred_by": leaf_parent,
+                "referral_code_used": leaf,
+                "ancestry": ancestry,
+            }
+        )
+        query, pipeline = descendants_fixup(leaf, ancestry, limit=max_depth)
+        db.referral.update_many(query, pipeline)
+        self.stdout.write(
+            f"attach leaf:       {(time.perf_counter() - started) * 1000:9.2f}ms"
+        )
+
+        root, new_parent = edges[0][0], ObjectId()
+
+        started = time.perf_counter()
+        ancestry = extend_ancestry(new_parent, [], limit=max_depth)
+        db.referral.insert_one(
+            {
+                "_id": str(uuid.uuid4()),
+                "referral_code": uuid.uuid4().hex[:10],
+                "referred_by": new_parent,
+                "referral_code_used": root,
+                "ancestry": ancestry,
+            }
+        )
+        query, pipeline = descendants_fixup(root, ancestry, limit=max_depth)
+        result = db.referral.update_many(query, pipeline)
+        self.stdout.write(
+            f"attach root:       {(time.perf_counter() - started) * 1000:9.2f}ms "
+            f"({result.modified_count} descendants updated)"
+        )
+
+    def timed(self, repeat, fn):
+        samples = []
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - started) * 1000)
+
+        return samples
+
+    def report(self, name, samples):
+        samples = sorted(samples)
+        self.stdout.write(
+            f"{name:<20} median={statistics.median(samples):9.2f}ms "
+            f"p95={samples[int(0.95 * (len(samples) - 1))]:9.2f}ms"
+        )
@@ -0,0 +1,47 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from referrals.code_pool import code_space_report, fill_pool
+
+
+class Command(BaseCommand):
+    help = "Top up the pre-generated referral code pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", type=int, default=settings.REFERRAL_CODE_POOL_TARGET
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep the pool topped up instead of filling once.",
+        )
+        parser.add_argument("--interval", type=float, default=30)
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            added, exhausted = fill_pool(options["target"], options["batch_size"])
+
+            if added or not options["loop"]:
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Added {added} codes in {time.perf_counter() - started:.2f}s"
+                    )
+                )
+
+            if exhausted:
+                report = code_space_report()
+                self.stderr.write(
+                    self.style.WARNING(
+                        "Stopped short of the target: no fresh codes found "
+                        f"({report['occupancy']:.1%} of the code space is used). "
+                        "Increase REFERRAL_CODE_LENGTH or the alphabet."
+                    )
+                )
+
+            if not options["loop"]:
+                return
+
+            time.sleep(options["interval"])
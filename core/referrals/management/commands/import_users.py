@@ -0,0 +1,114 @@
+import time
+from datetime import datetime
+from pathlib import Path
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from referrals.imports import (
+    FORMATS,
+    IMPORT_BATCH_SIZE,
+    REWARDS,
+    load_checkpoint,
+    run_import,
+    save_checkpoint,
+)
+
+# derived collections, rebuilt once every row is in
+REBUILD_COMMANDS = (
+    ("rebuild_referral_tree",),
+    ("rebuild_referral_stats",),
+    ("rebuild_referral_rollups",),
+    ("verify_reward_balances", "--repair"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users and referral relationships from CSV or JSONL: parallel "
+        "bcrypt, batched unordered inserts, resumable from a checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument(
+            "--format", choices=FORMATS, help="Default: from the file extension."
+        )
+        parser.add_argument(
+            "--name", help="Checkpoint name (default: the file name)."
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            "--workers", type=int, help="Hashing processes (default HASH_POOL_WORKERS)."
+        )
+        parser.add_argument(
+            "--rewards",
+            choices=REWARDS,
+            default="pending",
+            help="SIGNUP reward for each imported referral's referrer.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and start from the first row.",
+        )
+        parser.add_argument(
+            "--skip-rebuild",
+            action="store_true",
+            help="Do not rebuild ancestry, stats, rollups and balances afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"No such file: {path}")
+
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        checkpoint = load_checkpoint(options["name"] or path.name, options["restart"])
+
+        if checkpoint.phase == "done":
+            self.stdout.write(
+                f"Import {checkpoint.name} already finished; use --restart to rerun."
+            )
+            return
+
+        if checkpoint.row:
+            self.stdout.write(
+                f"Resuming {checkpoint.name}: {checkpoint.phase} after row "
+                f"{checkpoint.row}"
+            )
+
+        started = time.perf_counter()
+
+        counts, errors = run_import(
+            path,
+            checkpoint,
+            fmt=options["format"],
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            rewards=options["rewards"],
+            on_batch=self.report_batch,
+        )
+
+        for error in errors:
+            self.stdout.write(
+                self.style.WARNING(f"row {error['row']}: {error['error']}")
+            )
+
+        if not options["skip_rebuild"]:
+            for command in REBUILD_COMMANDS:
+                self.stdout.write(f"Running {' '.join(command)}...")
+                call_command(*command, stdout=self.stdout, stderr=self.stderr)
+
+        checkpoint.finished_at = datetime.utcnow()
+        save_checkpoint(checkpoint, "done", 0, counts)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Import done in {time.perf_counter() - started:.1f}s: "
+                + " ".join(f"{k}={v}" for k, v in sorted(counts.items()))
+            )
+        )
+
+    def report_batch(self, phase, row, counts, rate):
+        self.stdout.write(f"{phase}: row {row} ({rate:.0f} rows/s) {counts}")
@@ -0,0 +1,113 @@
+import itertools
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from referrals.orders import MAX_EVENTS, ingest_first_orders
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Create FIRST_ORDER rewards from a file of order events (JSON array "
+        "or NDJSON, '-' for stdin), in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Events file, or - for stdin.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--results", help="Write per-event results to this NDJSON file."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if not 1 <= batch_size <= MAX_EVENTS:
+            raise CommandError(f"--batch-size must be between 1 and {MAX_EVENTS}")
+
+        stream = (
+            sys.stdin
+            if options["path"] == "-"
+            else open(options["path"], encoding="utf-8")
+        )
+        results = open(options["results"], "w") if options["results"] else None
+
+        totals = {}
+        offset = 0
+        started = time.perf_counter()
+
+        try:
+            for batch in _batches(self.events(stream), batch_size):
+                data = ingest_first_orders(batch)
+
+                for result in data["results"]:
+                    if results:
+                        result = {**result, "index": result["index"] + offset}
+                        results.write(json.dumps(result) + "\n")
+
+                offset += len(batch)
+                metrics = data["metrics"]
+
+                for key, value in metrics.items():
+                    if key not in ("elapsed_ms", "events_per_sec"):
+                        totals[key] = totals.get(key, 0) + value
+
+                self.stdout.write(
+                    f"batch of {metrics['events']}: "
+                    f"rewarded={metrics['rewarded']} "
+                    f"duplicate={metrics['duplicate']} "
+                    f"no_referral={metrics['no_referral']} "
+                    f"invalid={metrics['invalid']} "
+                    f"({metrics['events_per_sec']} events/s)"
+                )
+
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if results:
+                results.close()
+
+        elapsed = time.perf_counter() - started
+        rate = offset / elapsed if elapsed else 0
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{offset} events in {elapsed:.1f}s ({rate:.0f} events/s): "
+                + " ".join(f"{k}={v}" for k, v in totals.items() if k != "events")
+            )
+        )
+
+    def events(self, stream):
+        """
+        NDJSON is read line by line; a JSON array is loaded whole.
+        """
+
+        first = stream.readline()
+
+        if first.lstrip().startswith("["):
+            try:
+                events = json.loads(first + stream.read())
+            except ValueError:
+                raise ValueError("File is not a valid JSON array")
+
+            yield from events
+            return
+
+        for number, line in enumerate(itertools.chain([first], stream), 1):
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON")
@@ -0,0 +1,75 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from referrals.dedupe import (
+    build_unique_indexes,
+    drop_superseded_indexes,
+    resolve_duplicate_claims,
+    resolve_duplicate_rewards,
+)
+from referrals.management.commands.import_users import REBUILD_COMMANDS
+from referrals.versions import bump_all_data_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Resolve duplicate claims and reward rows, drop the superseded "
+        "referral_code_used index and build the unique indexes. Run once "
+        "on an existing database before deploying."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Write the changes (default: only report them).",
+        )
+
+    def handle(self, *args, **options):
+        apply = options["apply"]
+
+        claims = resolve_duplicate_claims(apply=apply)
+        for sample in claims["samples"]:
+            self.stdout.write(
+                f"claims user={sample['user']} kept={sample['kept']} "
+                f"released={','.join(sample['released'])}"
+            )
+
+        rewards = resolve_duplicate_rewards(apply=apply)
+        for sample in rewards["samples"]:
+            self.stdout.write(
+                f"rewards referral={sample['referral']} "
+                f"type={sample['reward_type']} user={sample['user']} "
+                f"kept={sample['kept']} deleted={','.join(sample['deleted'])}"
+            )
+
+        indexes = drop_superseded_indexes(apply=apply)
+
+        self.stdout.write(
+            f"users={claims['users']} released={claims['released']} "
+            f"revoked={claims['revoked']} credited_kept={claims['credited_kept']} "
+            f"reward_keys={rewards['keys']} deleted={rewards['deleted']} "
+            f"credited_deleted={rewards['credited_deleted']} "
+            f"superseded_indexes={','.join(indexes) or '-'}"
+        )
+
+        if claims["credited_kept"] or rewards["credited_deleted"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Some CREDITED rewards belong to released claims or are "
+                    "duplicates; the balance repair below recomputes them "
+                    "from what remains in the ledger."
+                )
+            )
+
+        if not apply:
+            self.stdout.write(self.style.WARNING("Dry run: rerun with --apply."))
+            return
+
+        build_unique_indexes()
+
+        for command in REBUILD_COMMANDS:
+            self.stdout.write(f"Running {' '.join(command)}...")
+            call_command(*command, stdout=self.stdout, stderr=self.stderr)
+
+        bump_all_data_versions()
+        self.stdout.write(self.style.SUCCESS("Unique indexes built."))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from referrals.stats import rebuild_stats
+from referrals.versions import bump_all_data_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild per-user referral counters (summary and admin leaderboard) "
+        "from the Referral collection."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drift, do not write.",
+        )
+
+    def handle(self, *args, **options):
+        report = rebuild_stats(dry_run=options["dry_run"])
+
+        if not options["dry_run"]:
+            bump_all_data_versions()  # repaired counters must not be served cached
+
+        for sample in report["samples"]:
+            self.stdout.write(
+                f"drift user={sample['user']} "
+                f"stored={sample['stored']} expected={sample['expected']}"
+            )
+
+        summary = (
+            f"checked={report['checked']} missing={report['missing']} "
+            f"drifted={report['drifted']} orphaned={report['orphaned']}"
+        )
+
+        if report["missing"] or report["drifted"] or report["orphaned"]:
+            action = "found" if options["dry_run"] else "repaired"
+            self.stdout.write(self.style.WARNING(f"Drift {action}: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"No drift: {summary}"))
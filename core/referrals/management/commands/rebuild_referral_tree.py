@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from referrals.tree import rebuild_ancestry
+from referrals.versions import bump_all_data_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the materialized ancestry of every used referral "
+        "(backfill, or repair after a concurrent apply)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        updated = rebuild_ancestry(batch_size=options["batch_size"])
+        bump_all_data_versions()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Updated {updated} ancestries in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+        )
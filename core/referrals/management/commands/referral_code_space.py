@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from referrals.code_pool import code_space_report
+
+
+class Command(BaseCommand):
+    help = "Report referral code-space occupancy and projected collision rate."
+
+    def handle(self, *args, **options):
+        report = code_space_report()
+
+        self.stdout.write(
+            f"alphabet={report['alphabet_size']} length={report['code_length']} "
+            f"space={report['code_space']:,}"
+        )
+        self.stdout.write(
+            f"used={report['codes_used']:,} pooled={report['codes_pooled']:,} "
+            f"occupancy={report['occupancy']:.6%}"
+        )
+        self.stdout.write(
+            f"collision rate per draw={report['collision_rate']:.6%} "
+            f"expected draws per code={report['expected_draws_per_code']:.4f} "
+            f"five-retry failure rate={report['five_retry_failure_rate']:.2e}"
+        )
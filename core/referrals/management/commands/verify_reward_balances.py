@@ -0,0 +1,57 @@
+import time
+from django.core.management.base import BaseCommand
+from referrals.balances import verify_balances
+from referrals.versions import bump_all_data_versions
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute reward balances from the ledger in one streaming pass, "
+        "report (and optionally repair) drift and record a checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repair",
+            action="store_true",
+            help="Rewrite drifted or missing balances and drop orphaned ones.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Run every INTERVAL seconds instead of once.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.verify(options["repair"])
+
+            if not options["interval"]:
+                return
+
+            time.sleep(options["interval"])
+
+    def verify(self, repair):
+        report = verify_balances(repair=repair)
+        drift = report["missing"] or report["drifted"] or report["orphaned"]
+
+        if repair and drift:
+            bump_all_data_versions()  # repaired balances must not be served cached
+
+        for sample in report["samples"]:
+            self.stdout.write(
+                f"drift user={sample['user']} unit={sample['unit']} "
+                f"stored={sample['stored']} expected={sample['expected']}"
+            )
+
+        summary = (
+            f"ledger_rows={report['ledger_rows']} checked={report['checked']} "
+            f"missing={report['missing']} drifted={report['drifted']} "
+            f"orphaned={report['orphaned']} totals={report['totals']}"
+        )
+
+        if drift:
+            action = "repaired" if repair else "found"
+            self.stdout.write(self.style.WARNING(f"Drift {action}: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"No drift: {summary}"))
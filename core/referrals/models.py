@@ -7,6 +7,8 @@ from mongoengine import (
     DateTimeField,
     BooleanField,
     IntField,
+    DictField,
+    ListField,
     CASCADE,
     NULLIFY,
 )
@@ -29,15 +31,40 @@ class Referral(Document):
     referral_code_used = ReferenceField(User, null=True, reverse_delete_rule=NULLIFY)
     referral_used_at = DateTimeField()
 
+    # ancestors of the user who used it: [{"user": id, "depth": 1..}, ...]
+    ancestry = ListField(DictField())
+    # bumped by every ancestry write (referrals.tree)
+    tree_version = IntField(default=0)
+
     meta = {
         "indexes": [
-            "referred_by",
-            "referral_code_used",
+            ("referred_by", "-referred_at", "-id"),  # keyset page of my referrals
+            ("ancestry.user", "ancestry.depth"),  # downline / subtree queries
+            {
+                # one referral per user; unused codes (null) are not indexed
+                "fields": ["referral_code_used"],
+                "name": "referral_code_used_unique",
+                "unique": True,
+                "partialFilterExpression": {
+                    "referral_code_used": {"$type": "objectId"}
+                },
+            },
             "referral_code",
         ]
     }
 
 
+class ReferralCodePool(Document):
+    """
+    Pre-generated codes, checked unique against Referral when added.
+    """
+
+    code = StringField(required=True, unique=True)
+    created_at = DateTimeField(default=datetime.utcnow)
+
+    meta = {"collection": "referral_code_pool"}
+
+
 class RewardConfig(Document):
 
     REWARD_TYPES = ("SIGNUP", "FIRST_ORDER")
@@ -51,6 +78,19 @@ class RewardConfig(Document):
 
     created_at = DateTimeField(default=datetime.utcnow)
 
+    meta = {"indexes": ["is_active"]}
+
+
+class ConfigGeneration(Document):
+    """
+    Generation stamp per config kind, bumped whenever that config changes.
+    """
+
+    name = StringField(required=True, unique=True)
+    generation = IntField(default=0)
+
+    meta = {"collection": "config_generations"}
+
 
 class RewardLedger(Document):
 
@@ -64,11 +104,142 @@ class RewardLedger(Document):
     reward_unit = StringField(required=True)
 
     status = StringField(choices=STATUS, default="PENDING")
+    tier = IntField(default=1)  # 1 = direct referrer, 2 = their referrer, ...
 
     created_at = DateTimeField(default=datetime.utcnow)
+    credited_at = DateTimeField()
+    credit_batch = StringField()  # bulk credit that flipped this row
+    order_id = StringField()  # order that triggered a FIRST_ORDER reward
 
     meta = {
         "indexes": [
-            "user",
+            ("user", "-created_at", "-id"),  # keyset page of reward history
+            ("status", "id"),  # bulk credit walks PENDING rows in _id order
+            {
+                # one reward of each type per referral and beneficiary
+                "fields": ["referral", "reward_type", "user"],
+                "unique": True,
+            },
         ]
     }
+
+
+class RewardBalance(Document):
+    """
+    Running reward totals per user and unit, maintained with $inc
+    whenever a ledger row is created or changes status.
+    """
+
+    user = ReferenceField(User, required=True, reverse_delete_rule=CASCADE)
+    unit = StringField(choices=RewardConfig.UNITS, required=True)
+
+    pending = IntField(default=0)
+    credited = IntField(default=0)
+    revoked = IntField(default=0)
+
+    updated_at = DateTimeField()
+
+    meta = {
+        "collection": "reward_balances",
+        "indexes": [
+            {"fields": ["user", "unit"], "unique": True},
+        ],
+    }
+
+
+class RewardBalanceCheckpoint(Document):
+    """
+    Result of one verification pass of reward_balances against the ledger.
+    """
+
+    taken_at = DateTimeField(default=datetime.utcnow)
+    duration_ms = IntField()
+
+    ledger_rows = IntField(default=0)
+    checked = IntField(default=0)
+    missing = IntField(default=0)
+    drifted = IntField(default=0)
+    orphaned = IntField(default=0)
+    repaired = BooleanField(default=False)
+
+    totals = DictField()  # unit -> {"pending", "credited", "revoked"}
+
+    meta = {
+        "collection": "reward_balance_checkpoints",
+        "indexes": ["-taken_at"],
+    }
+
+
+class ReferralStats(Document):
+    """
+    Per-user referral counters, maintained with $inc by the services.
+    """
+
+    user = ReferenceField(
+        User, required=True, unique=True, reverse_delete_rule=CASCADE
+    )
+
+    referral_code = StringField()
+    total_referrals = IntField(default=0)
+    successful_referrals = IntField(default=0)
+    last_used_at = DateTimeField()
+
+    meta = {
+        "collection": "referral_stats",
+        "indexes": [
+            ("-successful_referrals", "user"),  # admin leaderboard
+        ],
+    }
+
+
+class ReferralDailyRollup(Document):
+    """
+    Successful referrals per referrer and UTC day, with per-15-minute counts.
+    """
+
+    referrer = ReferenceField(User, required=True, reverse_delete_rule=CASCADE)
+    day = DateTimeField(required=True)  # UTC midnight
+    count = IntField(default=0)
+    slots = DictField()  # "0".."95" (15-minute slots) -> count
+    hours = DictField()  # "0".."23" -> count, rollups from before slots
+
+    meta = {
+        "collection": "referral_daily_rollups",
+        "indexes": [
+            {"fields": ["referrer", "day"], "unique": True},
+        ],
+    }
+
+
+class DataVersion(Document):
+    """
+    Per-user version of the analytics data (summary, list, timeline,
+    reward history), bumped by every write that changes any of them.
+    """
+
+    user = ReferenceField(
+        User, required=True, unique=True, reverse_delete_rule=CASCADE
+    )
+    version = IntField(default=0)
+    bumped_at = DateTimeField()
+
+    meta = {"collection": "data_versions"}
+
+
+class ImportCheckpoint(Document):
+    """
+    Progress of a bulk import, so an interrupted run resumes where it stopped.
+    """
+
+    PHASES = ("users", "referrals", "rebuild", "done")
+
+    name = StringField(required=True, unique=True)
+    phase = StringField(choices=PHASES, default="users")
+    row = IntField(default=0)  # last row of `phase` fully written
+    counts = DictField()
+
+    started_at = DateTimeField(default=datetime.utcnow)
+    updated_at = DateTimeField()
+    finished_at = DateTimeField()
+
+    meta = {"collection": "import_checkpoints"}
@@ -0,0 +1,278 @@
+"""
+FIRST_ORDER reward ingestion.
+
+The order system pushes batches of events, one per buyer's first order:
+{"order_id": "...", "user_id": "<buyer ObjectId>", "ordered_at": "..."}.
+A batch costs a fixed number of round trips whatever its size: one $in
+read for the buyers' referrals, one $in read for rewards already paid,
+one unordered insert_many, then the balance and version bumps.
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+from .balances import record_ledger_rows
+from .config_cache import reward_config_cache
+from .models import Referral, RewardLedger
+from .tree import tier_rewards
+from .versions import bump_data_versions
+
+REWARD_TYPE = "FIRST_ORDER"
+MAX_EVENTS = 10000
+
+NDJSON = "application/x-ndjson"
+
+
+# -----------------------------------
+# Parsing
+# -----------------------------------
+def parse_events(body, content_type=""):
+    """
+    JSON array, {"events": [...]}, a single event object or NDJSON (one
+    event per line). Raises ValueError.
+    """
+
+    if isinstance(body, bytes):
+        try:
+            body = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError("Body must be UTF-8")
+
+    text = body.strip()
+
+    if content_type.startswith(NDJSON) or not text.startswith(("[", "{")):
+        events = parse_ndjson(text.splitlines())
+    else:
+        try:
+            events = json.loads(text)
+        except ValueError:
+            # a single-line object is also valid NDJSON
+            events = parse_ndjson(text.splitlines())
+
+    if isinstance(events, dict):
+        events = events["events"] if "events" in events else [events]
+
+    if not isinstance(events, list) or not events:
+        raise ValueError("Expected a non-empty list of events")
+
+    if len(events) > MAX_EVENTS:
+        raise ValueError(f"At most {MAX_EVENTS} events per request")
+
+    return events
+
+
+def parse_ndjson(lines):
+    events = []
+
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+
+    return events
+
+
+def _validate(event):
+    """
+    (order_id, buyer ObjectId, ordered_at as naive UTC or None).
+    Raises ValueError.
+    """
+
+    if not isinstance(event, dict):
+        raise ValueError("Event must be an object")
+
+    order_id = event.get("order_id")
+    if not order_id:
+        raise ValueError("order_id is required")
+
+    try:
+        buyer = ObjectId(event.get("user_id"))
+    except (InvalidId, TypeError):
+        raise ValueError("user_id must be a valid id")
+
+    ordered_at = None
+
+    if event.get("ordered_at"):
+        try:
+            ordered_at = datetime.fromisoformat(event["ordered_at"])
+        except (TypeError, ValueError):
+            raise ValueError("ordered_at must be an ISO datetime")
+
+        # stored like every other timestamp: naive UTC
+        if ordered_at.tzinfo:
+            ordered_at = ordered_at.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return str(order_id), buyer, ordered_at
+
+
+# -----------------------------------
+# Ingestion
+# -----------------------------------
+def ingest_first_orders(events):
+    """
+    Creates PENDING FIRST_ORDER rewards for the ancestry of every buyer
+    who joined through a referral. Returns per-event results (in input
+    order) and throughput metrics. Raises ValueError when no FIRST_ORDER
+    config is active.
+    """
+
+    started = time.perf_counter()
+
+    config = reward_config_cache.get(REWARD_TYPE)
+
+    if not config:
+        raise ValueError("Reward config missing")
+
+    results = [
+        {"index": i, "order_id": None, "status": None} for i in range(len(events))
+    ]
+    buyers = {}  # buyer -> index of the first event for them
+    orders = {}  # index -> (order_id, ordered_at)
+
+    for i, event in enumerate(events):
+        try:
+            order_id, buyer, ordered_at = _validate(event)
+        except ValueError as e:
+            results[i].update(status="invalid", error=str(e))
+            continue
+
+        results[i]["order_id"] = order_id
+        orders[i] = (order_id, ordered_at)
+
+        if buyer in buyers:
+            results[i]["status"] = "duplicate"  # second event in this batch
+        else:
+            buyers[buyer] = i
+
+    # -----------------------------------
+    # 1. referrals of every buyer (one $in)
+    # -----------------------------------
+    referrals = {
+        doc["referral_code_used"]: doc
+        for doc in Referral._get_collection().find(
+            first_order_referral_filter(list(buyers)),
+            {"referral_code_used": 1, "referred_by": 1, "ancestry": 1},
+        )
+    }
+
+    # -----------------------------------
+    # 2. rewards already paid for those referrals (one $in)
+    # -----------------------------------
+    paid = set(
+        RewardLedger._get_collection().distinct(
+            "referral",
+            first_order_paid_filter([doc["_id"] for doc in referrals.values()]),
+        )
+    )
+
+    # -----------------------------------
+    # 3. ledger rows for the rest
+    # -----------------------------------
+    rows, row_events = [], []
+    now = datetime.utcnow()
+
+    for buyer, i in buyers.items():
+        referral = referrals.get(buyer)
+
+        if not referral:
+            results[i]["status"] = "no_referral"
+            continue
+
+        if referral["_id"] in paid:
+            results[i]["status"] = "duplicate"
+            continue
+
+        # legacy referrals without ancestry still pay the direct referrer
+        ancestry = referral.get("ancestry") or [
+            {"user": referral["referred_by"], "depth": 1}
+        ]
+
+        results[i].update(status="rewarded", rewards=0)
+        order_id, ordered_at = orders[i]
+
+        for beneficiary, tier, value in tier_rewards(ancestry, config.reward_value):
+            rows.append(
+                {
+                    "_id": ObjectId(),
+                    "user": beneficiary,
+                    "referral": referral["_id"],
+                    "reward_type": REWARD_TYPE,
+                    "reward_value": value,
+                    "reward_unit": config.reward_unit,
+                    "status": "PENDING",
+                    "tier": tier,
+                    "order_id": order_id,
+                    # backfilled events keep the time of the order
+                    "created_at": ordered_at or now,
+                }
+            )
+            row_events.append(i)
+            results[i]["rewards"] += 1
+
+    # -----------------------------------
+    # 4. unordered insert; concurrent duplicates hit the unique index
+    # -----------------------------------
+    attempted = len(rows)
+
+    if rows:
+        try:
+            RewardLedger._get_collection().insert_many(rows, ordered=False)
+
+        except BulkWriteError as e:
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+
+            duplicates = {err["index"] for err in e.details["writeErrors"]}
+
+            for index in duplicates:
+                results[row_events[index]]["rewards"] -= 1
+
+            rows = [row for n, row in enumerate(rows) if n not in duplicates]
+
+        record_ledger_rows(rows)
+        bump_data_versions([row["user"] for row in rows])
+
+    # every row of the event lost the race to a concurrent batch
+    if len(rows) < attempted:
+        for i in set(row_events):
+            if not results[i]["rewards"]:
+                results[i]["status"] = "duplicate"
+
+    elapsed = time.perf_counter() - started
+
+    return {
+        "results": results,
+        "metrics": ingest_metrics(results, len(rows), elapsed),
+    }
+
+
+def first_order_referral_filter(buyer_ids):
+    # $type lets the planner use the partial unique index
+    return {"referral_code_used": {"$in": buyer_ids, "$type": "objectId"}}
+
+
+def first_order_paid_filter(referral_ids):
+    return {"referral": {"$in": referral_ids}, "reward_type": REWARD_TYPE}
+
+
+def ingest_metrics(results, rows_written, elapsed):
+    counts = {"rewarded": 0, "duplicate": 0, "no_referral": 0, "invalid": 0}
+
+    for result in results:
+        counts[result["status"]] += 1
+
+    return {
+        "events": len(results),
+        **counts,
+        "ledger_rows_written": rows_written,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "events_per_sec": round(len(results) / elapsed, 1) if elapsed else None,
+    }
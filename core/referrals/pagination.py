@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def parse_page_params(params):
+    """
+    Reads `limit` and `cursor` from query params. Raises ValueError.
+    """
+
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    cursor = params.get("cursor") or None
+    if cursor:
+        cursor = decode_cursor(cursor)
+
+    return limit, cursor
+
+
+def encode_cursor(sort_value, doc_id):
+    # ObjectId and string ids are tagged so decoding restores the type
+    if isinstance(doc_id, ObjectId):
+        tagged_id = ["o", str(doc_id)]
+    else:
+        tagged_id = ["s", doc_id]
+
+    # legacy rows without the sort field page by _id alone
+    if sort_value is not None:
+        sort_value = sort_value.isoformat()
+
+    raw = json.dumps([sort_value, tagged_id]).encode("utf-8")
+
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_value, (kind, doc_id) = json.loads(raw)
+
+        if sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        doc_id = ObjectId(doc_id) if kind == "o" else str(doc_id)
+
+    except (ValueError, TypeError, InvalidId):
+        raise ValueError("Invalid cursor")
+
+    return sort_value, doc_id
+
+
+def keyset_filter(field, cursor):
+    """
+    Rows strictly after `cursor` for a (field desc, _id desc) ordering.
+    Rows where `field` is null or missing sort after every date.
+    """
+
+    if not cursor:
+        return {}
+
+    sort_value, doc_id = cursor
+
+    if sort_value is None:
+        return {field: None, "_id": {"$lt": doc_id}}
+
+    # $lt on a date never matches null, so the null tail is its own branch
+    return {
+        "$or": [
+            {field: {"$lt": sort_value}},
+            {field: sort_value, "_id": {"$lt": doc_id}},
+            {field: None},
+        ]
+    }
+
+
+def page(rows, limit, field):
+    """
+    Splits a `limit + 1` fetch into (rows, next_cursor).
+    """
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+
+    return rows, encode_cursor(last.get(field), last["_id"])
@@ -0,0 +1,225 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pymongo import ReplaceOne
+from .models import Referral, ReferralDailyRollup
+
+GRANULARITIES = ("day", "week", "month")
+UTC = ZoneInfo("UTC")
+MAX_RANGE_DAYS = 3660
+
+# every current UTC offset is a multiple of 15 minutes (+05:30, +05:45, ...)
+SLOT_MINUTES = 15
+
+
+def utc_day(moment):
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def utc_slot(moment):
+    """
+    Index of the 15-minute slot of the UTC day `moment` falls in (0..95).
+    """
+
+    return (moment.hour * 60 + moment.minute) // SLOT_MINUTES
+
+
+def record_referral_rollup(referrer_id, used_at):
+    """
+    Counts one successful referral in the referrer's (UTC day) rollup.
+    Per-slot counts let the timeline re-bucket days into any timezone.
+    """
+
+    ReferralDailyRollup._get_collection().update_one(
+        {"referrer": referrer_id, "day": utc_day(used_at)},
+        {"$inc": {"count": 1, f"slots.{utc_slot(used_at)}": 1}},
+        upsert=True,
+    )
+
+
+def parse_timeline_params(params):
+    """
+    Reads from/to (local dates, inclusive), granularity and tz.
+    Raises ValueError.
+    """
+
+    try:
+        tz = ZoneInfo(params.get("tz")) if params.get("tz") else UTC
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError("tz must be an IANA timezone name")
+
+    granularity = params.get("granularity") or "day"
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}")
+
+    bounds = {}
+    for key in ("from", "to"):
+        value = params.get(key)
+        try:
+            bounds[key] = date.fromisoformat(value) if value else None
+        except ValueError:
+            raise ValueError(f"{key} must be a YYYY-MM-DD date")
+
+    start, end = bounds["from"], bounds["to"]
+
+    if start and end:
+        if start > end:
+            raise ValueError("from must not be after to")
+        if (end - start).days > MAX_RANGE_DAYS:
+            raise ValueError(f"range must be at most {MAX_RANGE_DAYS} days")
+
+    return {"start": start, "end": end, "granularity": granularity, "tz": tz}
+
+
+def rollup_filter(user_id, start, end, tz):
+    """
+    UTC rollup days covering local dates [start, end] in `tz`.
+    """
+
+    query = {"referrer": user_id}
+    day = {}
+
+    if start:
+        local = datetime.combine(start, datetime.min.time(), tzinfo=tz)
+        day["$gte"] = utc_day(local.astimezone(timezone.utc))
+
+    if end:
+        next_day = end + timedelta(days=1)
+        local = datetime.combine(next_day, datetime.min.time(), tzinfo=tz)
+        day["$lte"] = utc_day(local.astimezone(timezone.utc))
+
+    if day:
+        query["day"] = day
+
+    return query
+
+
+def _bucket(local_date, granularity):
+    if granularity == "week":
+        return local_date - timedelta(days=local_date.weekday())  # ISO Monday
+    if granularity == "month":
+        return local_date.replace(day=1)
+    return local_date
+
+
+def timeline_from_rollups(rollups, start, end, granularity, tz):
+    """
+    Folds rollup docs into [{"date", "count"}] buckets for `tz`.
+    Slots are attributed by their start, which is exact for any offset
+    that is a multiple of 15 minutes. Rollups written before slots were
+    introduced only have per-hour counts, which are still read (accurate
+    to the hour) until rebuild_referral_rollups replaces them.
+    """
+
+    buckets = defaultdict(int)
+    is_utc = tz.key == "UTC"
+
+    def add(local_date, count):
+        if (start and local_date < start) or (end and local_date > end):
+            return
+        buckets[_bucket(local_date, granularity)] += count
+
+    for rollup in rollups:
+        day = rollup["day"]
+
+        if is_utc:
+            add(day.date(), rollup.get("count", 0))
+            continue
+
+        counts = [
+            (int(slot) * SLOT_MINUTES, count)
+            for slot, count in rollup.get("slots", {}).items()
+        ]
+        counts += [
+            (int(hour) * 60, count) for hour, count in rollup.get("hours", {}).items()
+        ]
+
+        for minutes, count in counts:
+            moment = (day + timedelta(minutes=minutes)).replace(tzinfo=timezone.utc)
+            add(moment.astimezone(tz).date(), count)
+
+    return [
+        {"date": bucket.strftime("%Y-%m-%d"), "count": count}
+        for bucket, count in sorted(buckets.items())
+        if count
+    ]
+
+
+def rebuild_pipeline():
+    return [
+        {"$match": {"referral_code_used": {"$ne": None}}},
+        {
+            "$group": {
+                "_id": {
+                    "referrer": "$referred_by",
+                    "day": {
+                        "$dateFromParts": {
+                            "year": {"$year": "$referral_used_at"},
+                            "month": {"$month": "$referral_used_at"},
+                            "day": {"$dayOfMonth": "$referral_used_at"},
+                        }
+                    },
+                    "slot": {
+                        "$add": [
+                            {"$multiply": [{"$hour": "$referral_used_at"}, 4]},
+                            {
+                                "$floor": {
+                                    "$divide": [
+                                        {"$minute": "$referral_used_at"},
+                                        SLOT_MINUTES,
+                                    ]
+                                }
+                            },
+                        ]
+                    },
+                },
+                "count": {"$sum": 1},
+            }
+        },
+        {"$sort": {"_id.referrer": 1, "_id.day": 1}},
+    ]
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recomputes every rollup from the Referral collection.
+    Returns the number of rollup docs written.
+    """
+
+    collection = ReferralDailyRollup._get_collection()
+    ops, written = [], 0
+    current_key, current = None, None
+
+    def emit():
+        nonlocal written
+        if current is None:
+            return
+        ops.append(
+            ReplaceOne(
+                {"referrer": current["referrer"], "day": current["day"]},
+                current,
+                upsert=True,
+            )
+        )
+        written += 1
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            ops.clear()
+
+    for row in Referral.objects.aggregate(rebuild_pipeline(), allowDiskUse=True):
+        key = (row["_id"]["referrer"], row["_id"]["day"])
+
+        if key != current_key:
+            emit()
+            current_key = key
+            current = {"referrer": key[0], "day": key[1], "count": 0, "slots": {}}
+
+        current["count"] += row["count"]
+        current["slots"][str(int(row["_id"]["slot"]))] = row["count"]
+
+    emit()
+
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+    return written
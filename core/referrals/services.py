@@ -1,103 +1,185 @@
 from mongoengine.errors import NotUniqueError
-from .models import Referral, RewardConfig, RewardLedger
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from utils.mongo import analytics_collection
+from .models import Referral, RewardLedger, ReferralStats, ReferralDailyRollup
+from .config_cache import reward_config_cache
 from datetime import datetime
 from .utils import build_referral_code
+from .code_pool import claim_pooled_code
+from .pagination import DEFAULT_PAGE_SIZE, keyset_filter, page
+from .rollups import (
+    UTC,
+    record_referral_rollup,
+    rollup_filter,
+    timeline_from_rollups,
+)
+from .versions import bump_data_versions
+from .balances import get_reward_balance, record_ledger_rows
+from .tree import (
+    attach_ancestry,
+    downline_by_depth_pipeline,
+    downline_summary,
+    tier_rewards,
+)
+from .stats import (
+    record_referral_generated,
+    record_referral_applied,
+    rebuild_user_stats,
+)
+
+
+class ReferralCodeUnavailable(Exception):
+    pass
 
 
 def generate_referral_for_user(user):
-    # Idempotent: If user already has code → return it. Else create new.
-
-    # check existing
-    existing = Referral.objects(referred_by=user).first()
+    # Idempotent: If user has an unused code → return it. Else create new.
+
+    # check existing; a used code cannot refer anyone else
+    existing = (
+        Referral.objects(referred_by=user, referral_code_used=None)
+        .order_by("-referred_at", "-id")
+        .first()
+    )
     if existing:
         return existing
 
-    # create new with retry (collision safe)
-    for _ in range(5):
+    # pooled codes are pre-checked, so this normally succeeds first time;
+    # fall back to direct generation when the pool is empty
+    codes = [claim_pooled_code()] + [build_referral_code() for _ in range(5)]
+
+    for code in codes:
+        if not code:
+            continue
+
         try:
             referral = Referral(
-                referral_code=build_referral_code(),
+                referral_code=code,
                 referred_by=user,
             )
             referral.save()
+            record_referral_generated(user.id, referral.referral_code)
+            bump_data_versions([user.id])
             return referral
 
         except NotUniqueError:
             # retry with new code
             continue
 
-    raise Exception("Could not generate unique referral code")
+    raise ReferralCodeUnavailable("Could not generate unique referral code")
 
 
 def apply_referral_code(user, code):
     """
     Apply referral for a user.
+
+    The claim is one conditional findAndModify. "One referral per user"
+    and "one reward per referral" are enforced by unique indexes, so
+    concurrent applies cannot both succeed.
     """
 
     # -------------------------------------------------
-    # 1. find referral
+    # 1. fetch reward config (before claiming the code)
     # -------------------------------------------------
-    referral = Referral.objects(referral_code=code).first()
-    if not referral:
-        raise ValueError("Invalid referral code")
+    config = reward_config_cache.get("SIGNUP")
 
-    # -------------------------------------------------
-    # 2. prevent self referral
-    # -------------------------------------------------
-    if referral.referred_by.id == user.id:
-        raise ValueError("You cannot use your own referral code")
+    if not config:
+        raise ValueError("Reward config missing")
 
     # -------------------------------------------------
-    # 3. already used by someone
+    # 2. claim: code exists, unused, not my own
     # -------------------------------------------------
-    if referral.referral_code_used:
-        raise ValueError("Referral code already used")
+    used_at = datetime.utcnow()
 
-    # -------------------------------------------------
-    # 4. user already used any code?
-    # -------------------------------------------------
-    already_used = Referral.objects(referral_code_used=user).first()
-    if already_used:
+    try:
+        claimed = Referral._get_collection().find_one_and_update(
+            {
+                "referral_code": code,
+                "referral_code_used": None,
+                "referred_by": {"$ne": user.id},
+            },
+            {"$set": {"referral_code_used": user.id, "referral_used_at": used_at}},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    except DuplicateKeyError:
+        # unique referral_code_used: user already used another code
         raise ValueError("You have already used a referral")
 
     # -------------------------------------------------
-    # 5. mark as used
+    # 3. claim failed: work out why (error path only)
     # -------------------------------------------------
-    referral.referral_code_used = user
-    referral.referral_used_at = datetime.utcnow()
-    referral.save()
+    if not claimed:
+        existing = (
+            Referral.objects(referral_code=code)
+            .only("referred_by")
+            .as_pymongo()
+            .first()
+        )
 
-    # -------------------------------------------------
-    # 6. fetch reward config
-    # -------------------------------------------------
-    config = RewardConfig.objects(reward_type="SIGNUP", is_active=True).first()
+        if not existing:
+            raise ValueError("Invalid referral code")
 
-    if not config:
-        raise ValueError("Reward config missing")
+        if existing.get("referred_by") == user.id:
+            raise ValueError("You cannot use your own referral code")
+
+        raise ValueError("Referral code already used")
+
+    referrer_id = claimed["referred_by"]
 
     # -------------------------------------------------
-    # 7. prevent duplicate reward
+    # 4. materialize ancestry; undo the claim on a cycle
     # -------------------------------------------------
-    existing_reward = RewardLedger.objects(
-        user=referral.referred_by,
-        referral=referral,
-        reward_type="SIGNUP",
-    ).first()
+    try:
+        ancestry = attach_ancestry(claimed["_id"], user.id, referrer_id)
+
+    except ValueError:
+        Referral._get_collection().update_one(
+            {"_id": claimed["_id"], "referral_code_used": user.id},
+            {"$set": {"referral_code_used": None, "referral_used_at": None}},
+        )
+        raise
 
-    if existing_reward:
-        return referral
+    claimed["ancestry"] = ancestry
+    referral = Referral._from_son(claimed)
+
+    record_referral_applied(referrer_id, used_at)
+    record_referral_rollup(referrer_id, used_at)
 
     # -------------------------------------------------
-    # 8. create PENDING reward for referrer
+    # 5. create PENDING rewards for every rewarded tier
+    #    (unique index turns a duplicate into a no-op)
     # -------------------------------------------------
-    RewardLedger(
-        user=referral.referred_by,
-        referral=referral,
-        reward_type=config.reward_type,
-        reward_value=config.reward_value,
-        reward_unit=config.reward_unit,
-        status="PENDING",
-    ).save()
+    rewards = tier_rewards(ancestry, config.reward_value)
+    rows = [
+        RewardLedger(
+            user=beneficiary,
+            referral=referral,
+            reward_type=config.reward_type,
+            reward_value=value,
+            reward_unit=config.reward_unit,
+            status="PENDING",
+            tier=tier,
+        ).to_mongo()
+        for beneficiary, tier, value in rewards
+    ]
+
+    if rows:
+        try:
+            RewardLedger._get_collection().insert_many(rows, ordered=False)
+
+        except BulkWriteError as e:
+            if any(err["code"] != 11000 for err in e.details["writeErrors"]):
+                raise
+
+            duplicates = {err["index"] for err in e.details["writeErrors"]}
+            rows = [row for i, row in enumerate(rows) if i not in duplicates]
+
+        record_ledger_rows(rows)
+
+    # after every write, so a reader never caches old data under the new version
+    bump_data_versions([a["user"] for a in ancestry])
 
     return referral
 
@@ -108,11 +190,35 @@ def get_referral_summary(user):
     """
 
     # -----------------------------------
-    # find user's referral code
+    # counters (one indexed read)
+    # -----------------------------------
+    stats = analytics_collection(ReferralStats).find_one(
+        {"user": user.id},
+        {"referral_code": 1, "total_referrals": 1, "successful_referrals": 1},
+    )
+
+    # -----------------------------------
+    # no counters yet: legacy data or no code
     # -----------------------------------
-    my_referral = Referral.objects(referred_by=user).first()
+    if not stats:
+        stats = rebuild_user_stats(user.id)
+
+    if not stats:
+        return build_summary(None, 0, 0)
+
+    return build_summary(
+        stats.get("referral_code"),
+        stats.get("total_referrals", 0),
+        stats.get("successful_referrals", 0),
+    )
 
-    if not my_referral:
+
+def build_summary(referral_code, total, success):
+    """
+    Shapes the summary payload shared by the sync and async endpoints.
+    """
+
+    if not referral_code:
         return {
             "my_referral_code": None,
             "total_referrals": 0,
@@ -120,16 +226,6 @@ def get_referral_summary(user):
             "conversion_rate": "0%",
         }
 
-    # -----------------------------------
-    # total referrals
-    # -----------------------------------
-    total = Referral.objects(referred_by=user).count()
-
-    # -----------------------------------
-    # successful referrals
-    # -----------------------------------
-    success = Referral.objects(referred_by=user, referral_code_used__ne=None).count()
-
     # -----------------------------------
     # conversion rate
     # -----------------------------------
@@ -138,105 +234,126 @@ def get_referral_summary(user):
         rate = int((success / total) * 100)
 
     return {
-        "my_referral_code": my_referral.referral_code,
+        "my_referral_code": referral_code,
         "total_referrals": total,
         "successful_referrals": success,
         "conversion_rate": f"{rate}%",
     }
 
 
-def get_referral_list(user):
+def get_referral_list(user, limit=DEFAULT_PAGE_SIZE, cursor=None):
     """
-    List of users who used my referral code.
+    One page of users who used my referral code, newest first.
     """
 
-    referrals = Referral.objects(referred_by=user)
+    rows = list(
+        analytics_collection(Referral)
+        .find(
+            referral_list_filter(user.id, cursor),
+            {"referred_at": 1, "referral_code_used": 1, "referral_used_at": 1},
+        )
+        .sort([("referred_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+
+    rows, next_cursor = page(rows, limit, "referred_at")
 
-    result = []
+    return {
+        "results": [referral_list_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
 
-    for r in referrals:
-        if r.referral_code_used:
-            status = "SUCCESS"
-            used_by = str(r.referral_code_used.id)
-            used_at = r.referral_used_at
-        else:
-            status = "PENDING"
-            used_by = None
-            used_at = None
 
-        result.append(
-            {
-                "used_by_user_id": used_by,
-                "used_at": used_at,
-                "status": status,
-            }
+def referral_list_filter(user_id, cursor):
+    return {"referred_by": user_id, **keyset_filter("referred_at", cursor)}
+
+
+def referral_list_row(r):
+    # raw ObjectId reference: no User dereference per row
+    used_by = r.get("referral_code_used")
+
+    if used_by:
+        return {
+            "used_by_user_id": str(used_by),
+            "used_at": r.get("referral_used_at"),
+            "status": "SUCCESS",
+        }
+
+    return {
+        "used_by_user_id": None,
+        "used_at": None,
+        "status": "PENDING",
+    }
+
+
+def get_referral_timeline(user, start=None, end=None, granularity="day", tz=UTC):
+    """
+    Returns successful referrals grouped by day, week or month in `tz`,
+    computed from the daily rollups for the requested range only.
+    """
+
+    rollups = (
+        analytics_collection(ReferralDailyRollup)
+        .find(
+            rollup_filter(user.id, start, end, tz),
+            {"day": 1, "count": 1, "slots": 1, "hours": 1},
         )
+        .sort("day", 1)
+    )
 
-    return result
+    return timeline_from_rollups(rollups, start, end, granularity, tz)
 
 
-def get_referral_timeline(user):
+def get_downline(user, depth):
     """
-    Returns successful referrals grouped by date.
+    Size of the user's downline up to `depth` tiers, per tier.
     """
 
-    pipeline = [
-        {
-            "$match": {
-                "referred_by": user.id,
-                "referral_code_used": {"$ne": None},
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "year": {"$year": "$referral_used_at"},
-                    "month": {"$month": "$referral_used_at"},
-                    "day": {"$dayOfMonth": "$referral_used_at"},
-                },
-                "count": {"$sum": 1},
-            }
-        },
-        {"$sort": {"_id": 1}},
-    ]
+    rows = analytics_collection(Referral).aggregate(
+        downline_by_depth_pipeline(user.id, depth)
+    )
 
-    results = Referral.objects.aggregate(*pipeline)
+    return downline_summary(rows, depth)
 
-    response = []
 
-    for r in results:
-        d = r["_id"]
-        date = datetime(d["year"], d["month"], d["day"]).strftime("%Y-%m-%d")
+def get_reward_history(user, limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """
+    One page of rewards for logged-in user, newest first.
+    """
 
-        response.append(
-            {
-                "date": date,
-                "count": r["count"],
-            }
-        )
+    rows = list(
+        analytics_collection(RewardLedger)
+        .find(reward_history_filter(user.id, cursor), {"user": 0, "referral": 0})
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
 
-    return response
+    rows, next_cursor = page(rows, limit, "created_at")
 
+    return {
+        "results": [reward_history_row(r) for r in rows],
+        "next_cursor": next_cursor,
+    }
 
-def get_reward_history(user):
+
+def get_balance(user):
     """
-    Returns all rewards for logged-in user.
+    Reward totals per unit, read from the running balances.
     """
 
-    rewards = RewardLedger.objects(user=user).order_by("-created_at")
+    return get_reward_balance(user.id)
 
-    result = []
 
-    for r in rewards:
-        result.append(
-            {
-                "reward_id": str(r.id),
-                "reward_type": r.reward_type,
-                "reward_value": r.reward_value,
-                "reward_unit": r.reward_unit,
-                "status": r.status,
-                "created_at": r.created_at,
-            }
-        )
+def reward_history_filter(user_id, cursor):
+    return {"user": user_id, **keyset_filter("created_at", cursor)}
+
 
-    return result
+def reward_history_row(r):
+    return {
+        "reward_id": str(r["_id"]),
+        "reward_type": r["reward_type"],
+        "reward_value": r["reward_value"],
+        "reward_unit": r["reward_unit"],
+        "status": r.get("status"),
+        "created_at": r.get("created_at"),
+    }
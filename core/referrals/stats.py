@@ -0,0 +1,133 @@
+from pymongo import DeleteOne, ReplaceOne
+from .models import Referral, ReferralStats
+
+
+def record_referral_generated(user_id, referral_code):
+    ReferralStats.objects(user=user_id).update_one(
+        upsert=True,
+        inc__total_referrals=1,
+        set__referral_code=referral_code,
+    )
+
+
+def record_referral_applied(referrer_id, used_at):
+    ReferralStats.objects(user=referrer_id).update_one(
+        upsert=True,
+        inc__successful_referrals=1,
+        max__last_used_at=used_at,
+    )
+
+
+def stats_pipeline(match=None):
+    """
+    Recomputes ReferralStats rows straight from the Referral collection.
+    referral_code is the code generate_referral_for_user hands out: the
+    newest unused one, else (every code used) the newest.
+    """
+
+    return [
+        {"$match": match or {}},
+        # $gt null: true for an ObjectId, false for null or missing
+        {"$set": {"_used": {"$gt": ["$referral_code_used", None]}}},
+        {"$sort": {"_used": 1, "referred_at": -1, "_id": -1}},
+        {
+            "$group": {
+                "_id": "$referred_by",
+                "referral_code": {"$first": "$referral_code"},
+                "total_referrals": {"$sum": 1},
+                "successful_referrals": {"$sum": {"$cond": ["$_used", 1, 0]}},
+                "last_used_at": {"$max": "$referral_used_at"},
+            }
+        },
+    ]
+
+
+STATS_FIELDS = (
+    "referral_code",
+    "total_referrals",
+    "successful_referrals",
+    "last_used_at",
+)
+
+
+def _as_stats_doc(row):
+    return {
+        "user": row["_id"],
+        "referral_code": row["referral_code"],
+        "total_referrals": row["total_referrals"],
+        "successful_referrals": row["successful_referrals"],
+        "last_used_at": row["last_used_at"],
+    }
+
+
+def rebuild_user_stats(user_id):
+    """
+    Recomputes one user's counters (legacy data without a stats row).
+    """
+
+    rows = list(Referral.objects.aggregate(stats_pipeline({"referred_by": user_id})))
+
+    if not rows:
+        return None
+
+    doc = _as_stats_doc(rows[0])
+
+    ReferralStats._get_collection().replace_one({"user": user_id}, doc, upsert=True)
+
+    return doc
+
+
+def rebuild_stats(dry_run=False, batch_size=1000):
+    """
+    Recomputes every user's counters and reports drift against the
+    stored rows. Unless `dry_run`, drifted rows are rewritten and rows
+    with no referrals behind them are removed.
+    """
+
+    collection = ReferralStats._get_collection()
+
+    projection = {"_id": 0, "user": 1, **{field: 1 for field in STATS_FIELDS}}
+
+    stored = {
+        row["user"]: {field: row.get(field) for field in STATS_FIELDS}
+        for row in collection.find({}, projection)
+    }
+
+    report = {"checked": 0, "missing": 0, "drifted": 0, "orphaned": 0, "samples": []}
+    ops = []
+
+    def flush():
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for row in Referral.objects.aggregate(stats_pipeline(), allowDiskUse=True):
+        report["checked"] += 1
+
+        expected = _as_stats_doc(row)
+        current = stored.pop(row["_id"], None)
+
+        if current is None:
+            report["missing"] += 1
+        elif current != {field: expected[field] for field in STATS_FIELDS}:
+            report["drifted"] += 1
+            if len(report["samples"]) < 20:
+                report["samples"].append(
+                    {"user": str(row["_id"]), "stored": current, "expected": expected}
+                )
+        else:
+            continue
+
+        ops.append(ReplaceOne({"user": row["_id"]}, expected, upsert=True))
+        if len(ops) >= batch_size:
+            flush()
+
+    for user_id in stored:
+        report["orphaned"] += 1
+        ops.append(DeleteOne({"user": user_id}))
+        if len(ops) >= batch_size:
+            flush()
+
+    flush()
+
+    return report
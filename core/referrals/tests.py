@@ -1,3 +1,595 @@
-from django.test import TestCase
+import base64
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+from bson import ObjectId
+from django.test import SimpleTestCase, override_settings
+from admin_panel.services import create_reward_config
+from user_auth.models import User
+from utils.testing import MongoTestCase
+from .balances import _merge, _unchanged, get_reward_balance, verify_balances
+from .imports import prepare_users, user_doc
+from .models import (
+    Referral,
+    ReferralDailyRollup,
+    ReferralStats,
+    RewardBalance,
+    RewardLedger,
+)
+from .orders import parse_events
+from .pagination import (
+    MAX_PAGE_SIZE,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+    page,
+    parse_page_params,
+)
+from .rollups import (
+    UTC,
+    rebuild_rollups,
+    record_referral_rollup,
+    timeline_from_rollups,
+    utc_slot,
+)
+from .services import apply_referral_code, generate_referral_for_user
+from .stats import rebuild_stats
+from .tree import extend_ancestry, tier_rewards
 
-# Create your tests here.
+THREADS = 24
+
+
+class ApplyReferralConcurrencyTests(MongoTestCase):
+    def setUp(self):
+        tag = uuid.uuid4().hex[:8]
+
+        self.users = [
+            User(
+                name=f"user {i}",
+                email=f"race-{tag}-{i}@example.com",
+                password="x",
+                is_verified=True,
+            ).save()
+            for i in range(THREADS + 1)
+        ]
+        self.referrer, self.appliers = self.users[0], self.users[1:]
+
+        create_reward_config(
+            {"reward_type": "SIGNUP", "reward_value": 10, "reward_unit": "POINTS"}
+        )
+
+    def run_concurrently(self, calls):
+        barrier = threading.Barrier(len(calls))
+
+        def run(call):
+            barrier.wait()
+            try:
+                call()
+                return True
+            except ValueError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+            return list(pool.map(run, calls))
+
+    def test_same_code_is_claimed_once(self):
+        code = generate_referral_for_user(self.referrer).referral_code
+
+        results = self.run_concurrently(
+            [lambda u=u: apply_referral_code(u, code) for u in self.appliers]
+        )
+
+        self.assertEqual(sum(results), 1)
+        self.assertEqual(RewardLedger.objects(user=self.referrer).count(), 1)
+        self.assertEqual(
+            ReferralStats.objects(user=self.referrer).first().successful_referrals, 1
+        )
+
+    def test_user_applies_only_one_code(self):
+        codes = [generate_referral_for_user(u).referral_code for u in self.appliers]
+        user = self.referrer
+
+        results = self.run_concurrently(
+            [lambda c=c: apply_referral_code(user, c) for c in codes]
+        )
+
+        self.assertEqual(sum(results), 1)
+        self.assertEqual(Referral.objects(referral_code_used=user).count(), 1)
+
+
+class ReferralCodeStatsTests(MongoTestCase):
+    """
+    A referrer with a used (imported) code and a newer unused one.
+    """
+
+    def setUp(self):
+        self.referrer, self.referred = [
+            User(
+                name=name, email=f"{name}@example.com", password="x", is_verified=True
+            ).save()
+            for name in ("referrer", "referred")
+        ]
+
+        now = datetime.utcnow()
+        Referral(
+            referral_code="SVH-USED01",
+            referred_by=self.referrer,
+            referred_at=now - timedelta(days=30),
+            referral_code_used=self.referred,
+            referral_used_at=now - timedelta(days=30),
+        ).save()
+        Referral(
+            referral_code="SVH-FRESH1", referred_by=self.referrer, referred_at=now
+        ).save()
+
+    def test_rebuild_picks_the_unused_code(self):
+        rebuild_stats()
+
+        stats = ReferralStats.objects(user=self.referrer).first()
+
+        self.assertEqual(stats.referral_code, "SVH-FRESH1")
+        self.assertEqual(stats.total_referrals, 2)
+        self.assertEqual(stats.successful_referrals, 1)
+        self.assertEqual(
+            generate_referral_for_user(self.referrer).referral_code, "SVH-FRESH1"
+        )
+
+    def test_rebuilt_stats_do_not_drift(self):
+        rebuild_stats()
+
+        self.assertEqual(rebuild_stats(dry_run=True)["drifted"], 0)
+
+    def test_generated_code_matches_rebuild(self):
+        Referral.objects(referral_code="SVH-FRESH1").delete()
+        rebuild_stats()
+
+        code = generate_referral_for_user(self.referrer).referral_code
+
+        self.assertNotEqual(code, "SVH-USED01")
+        self.assertEqual(
+            ReferralStats.objects(user=self.referrer).first().referral_code, code
+        )
+        self.assertEqual(rebuild_stats(dry_run=True)["drifted"], 0)
+
+
+@override_settings(REFERRAL_TREE_MAX_DEPTH=2)
+class ReferralTreeCycleTests(MongoTestCase):
+    """
+    A chain root <- 1 <- 2 <- 3, deeper than the two stored levels.
+    """
+
+    def setUp(self):
+        self.chain = [
+            User(
+                name=f"node {i}",
+                email=f"node-{i}@example.com",
+                password="x",
+                is_verified=True,
+            ).save()
+            for i in range(4)
+        ]
+
+        create_reward_config(
+            {"reward_type": "SIGNUP", "reward_value": 10, "reward_unit": "POINTS"}
+        )
+
+        for referrer, user in zip(self.chain, self.chain[1:]):
+            apply_referral_code(user, self.code(referrer))
+
+    def code(self, user):
+        return generate_referral_for_user(user).referral_code
+
+    def test_cycle_beyond_the_stored_ancestry_is_rejected(self):
+        root, leaf = self.chain[0], self.chain[-1]
+
+        with self.assertRaisesMessage(ValueError, "own downline"):
+            apply_referral_code(root, self.code(leaf))
+
+        self.assertFalse(Referral.objects(referral_code_used=root).count())
+        ancestry = Referral.objects.get(referral_code_used=self.chain[1]).ancestry
+        self.assertEqual([a["user"] for a in ancestry], [root.id])
+
+    def test_deep_chain_outside_the_downline_is_accepted(self):
+        outsider = User(
+            name="outsider", email="outsider@example.com", password="x"
+        ).save()
+
+        apply_referral_code(outsider, self.code(self.chain[-1]))
+
+        ancestry = Referral.objects.get(referral_code_used=outsider).ancestry
+        self.assertEqual(
+            [a["user"] for a in ancestry], [self.chain[3].id, self.chain[2].id]
+        )
+
+
+class TimelineFromRollupsTests(SimpleTestCase):
+    day = datetime(2025, 3, 10)
+
+    def timeline(self, rollups, tz, granularity="day", start=None, end=None):
+        return timeline_from_rollups(rollups, start, end, granularity, tz)
+
+    def test_slot_of_a_moment(self):
+        self.assertEqual(utc_slot(datetime(2025, 3, 10, 0, 14)), 0)
+        self.assertEqual(utc_slot(datetime(2025, 3, 10, 18, 29)), 73)
+        self.assertEqual(utc_slot(datetime(2025, 3, 10, 18, 30)), 74)
+        self.assertEqual(utc_slot(datetime(2025, 3, 10, 23, 59)), 95)
+
+    def test_half_hour_offset_splits_at_the_local_midnight(self):
+        # 18:15 UTC is 23:45 in Kolkata (+05:30), 18:30 UTC is 00:00 next day
+        rollup = {"day": self.day, "count": 2, "slots": {"73": 1, "74": 1}}
+
+        self.assertEqual(
+            self.timeline([rollup], ZoneInfo("Asia/Kolkata")),
+            [
+                {"date": "2025-03-10", "count": 1},
+                {"date": "2025-03-11", "count": 1},
+            ],
+        )
+
+    def test_quarter_hour_offset(self):
+        # 18:00 UTC is 23:45 in Kathmandu (+05:45), 18:15 UTC is 00:00
+        rollup = {"day": self.day, "count": 2, "slots": {"72": 1, "73": 1}}
+
+        self.assertEqual(
+            self.timeline([rollup], ZoneInfo("Asia/Kathmandu")),
+            [
+                {"date": "2025-03-10", "count": 1},
+                {"date": "2025-03-11", "count": 1},
+            ],
+        )
+
+    def test_utc_uses_the_day_count(self):
+        rollup = {"day": self.day, "count": 3, "slots": {"0": 1}}
+
+        self.assertEqual(
+            self.timeline([rollup], UTC), [{"date": "2025-03-10", "count": 3}]
+        )
+
+    def test_hourly_rollups_are_merged_with_slots(self):
+        rollups = [
+            {"day": self.day, "count": 3, "hours": {"1": 2}, "slots": {"8": 1}},
+            {"day": self.day + timedelta(days=1), "count": 1, "hours": {"23": 1}},
+        ]
+
+        self.assertEqual(
+            self.timeline(rollups, ZoneInfo("Europe/Berlin")),
+            [
+                {"date": "2025-03-10", "count": 3},
+                {"date": "2025-03-12", "count": 1},
+            ],
+        )
+
+    def test_weeks_and_range_bounds(self):
+        rollups = [
+            {"day": self.day + timedelta(days=i), "count": 1, "slots": {"40": 1}}
+            for i in range(8)
+        ]
+
+        self.assertEqual(
+            self.timeline(
+                rollups,
+                ZoneInfo("Asia/Kolkata"),
+                granularity="week",
+                end=date(2025, 3, 16),
+            ),
+            [{"date": "2025-03-10", "count": 7}],
+        )
+
+
+class ReferralRollupTests(MongoTestCase):
+    def setUp(self):
+        self.referrer = User(
+            name="referrer", email="rollup@example.com", password="x", is_verified=True
+        ).save()
+
+    def test_rebuild_matches_recorded_slots(self):
+        for i, moment in enumerate(
+            [datetime(2025, 3, 10, 18, 15), datetime(2025, 3, 10, 18, 44)]
+        ):
+            referred = User(
+                name=f"referred {i}",
+                email=f"rollup-{i}@example.com",
+                password="x",
+                is_verified=True,
+            ).save()
+            Referral(
+                referral_code=f"SVH-ROLL0{i}",
+                referred_by=self.referrer,
+                referred_at=moment,
+                referral_code_used=referred,
+                referral_used_at=moment,
+            ).save()
+            record_referral_rollup(self.referrer.id, moment)
+
+        recorded = ReferralDailyRollup.objects.get(referrer=self.referrer)
+        self.assertEqual(recorded.slots, {"73": 1, "74": 1})
+
+        rebuild_rollups()
+
+        rebuilt = ReferralDailyRollup.objects.get(referrer=self.referrer)
+        self.assertEqual(rebuilt.count, 2)
+        self.assertEqual(rebuilt.slots, recorded.slots)
+        self.assertEqual(rebuilt.hours, {})
+
+
+class ParseEventsTests(SimpleTestCase):
+    event = {"order_id": "o-1", "user_id": "65f000000000000000000001"}
+
+    def test_single_event_object_is_a_batch_of_one(self):
+        body = b'{"order_id": "o-1", "user_id": "65f000000000000000000001"}'
+
+        self.assertEqual(parse_events(body), [self.event])
+        self.assertEqual(
+            parse_events(body, "application/json; charset=utf-8"), [self.event]
+        )
+
+    def test_events_key_and_array(self):
+        for body in ('{"events": [{"order_id": "o-1"}]}', '[{"order_id": "o-1"}]'):
+            self.assertEqual(parse_events(body), [{"order_id": "o-1"}])
+
+    def test_empty_batch_is_rejected(self):
+        for body in ('{"events": []}', "[]", ""):
+            with self.assertRaises(ValueError):
+                parse_events(body)
+
+
+class CursorTests(SimpleTestCase):
+    moment = datetime(2025, 3, 10, 12, 30, 15, 250000)
+
+    def test_round_trip_keeps_the_id_type(self):
+        object_id = ObjectId()
+
+        for sort_value, doc_id in [
+            (self.moment, object_id),
+            (self.moment, "2f1c7a9e-uuid"),
+            (None, object_id),
+        ]:
+            cursor = encode_cursor(sort_value, doc_id)
+
+            self.assertNotIn("=", cursor)
+            self.assertEqual(decode_cursor(cursor), (sort_value, doc_id))
+            self.assertIs(type(decode_cursor(cursor)[1]), type(doc_id))
+
+    def test_garbage_is_rejected(self):
+        bad_id = base64.urlsafe_b64encode(b'[null, ["o", "not-an-id"]]').decode()
+
+        for cursor in ("not-a-cursor", "e30", bad_id):
+            with self.assertRaisesMessage(ValueError, "Invalid cursor"):
+                decode_cursor(cursor)
+
+    def test_page_params(self):
+        self.assertEqual(parse_page_params({}), (50, None))
+
+        cursor = encode_cursor(self.moment, "id-1")
+        self.assertEqual(
+            parse_page_params({"limit": "10", "cursor": cursor}),
+            (10, (self.moment, "id-1")),
+        )
+
+        for limit in ("0", str(MAX_PAGE_SIZE + 1), "ten"):
+            with self.assertRaises(ValueError):
+                parse_page_params({"limit": limit})
+
+    def test_page_cursor_points_at_the_last_row(self):
+        rows = [{"_id": f"id-{i}", "referred_at": self.moment} for i in range(3)]
+
+        self.assertEqual(page(rows, 3, "referred_at"), (rows, None))
+
+        kept, cursor = page(rows, 2, "referred_at")
+        self.assertEqual(kept, rows[:2])
+        self.assertEqual(decode_cursor(cursor), (self.moment, "id-1"))
+
+    def test_keyset_filter_includes_the_null_tail(self):
+        self.assertEqual(keyset_filter("referred_at", None), {})
+        self.assertEqual(
+            keyset_filter("referred_at", (None, "id-1")),
+            {"referred_at": None, "_id": {"$lt": "id-1"}},
+        )
+        self.assertIn(
+            {"referred_at": None},
+            keyset_filter("referred_at", (self.moment, "id-1"))["$or"],
+        )
+
+
+@override_settings(REFERRAL_TIER_RATES=[100, 50, 25], REFERRAL_TREE_MAX_DEPTH=4)
+class TierRewardsTests(SimpleTestCase):
+    ancestry = [{"user": f"u{depth}", "depth": depth} for depth in range(1, 5)]
+
+    def test_rates_per_tier(self):
+        self.assertEqual(
+            tier_rewards(self.ancestry, 100),
+            [("u1", 1, 100), ("u2", 2, 50), ("u3", 3, 25)],
+        )
+
+    def test_zero_values_are_skipped(self):
+        # 25% of 3 rounds down to nothing
+        self.assertEqual(tier_rewards(self.ancestry, 3), [("u1", 1, 3), ("u2", 2, 1)])
+
+        with override_settings(REFERRAL_TIER_RATES=[100, 0, 25]):
+            self.assertEqual(
+                [tier for _, tier, _ in tier_rewards(self.ancestry, 100)], [1, 3]
+            )
+
+    def test_extend_ancestry_shifts_and_caps(self):
+        self.assertEqual(
+            extend_ancestry("r", self.ancestry),
+            [{"user": "r", "depth": 1}]
+            + [{"user": f"u{depth}", "depth": depth + 1} for depth in range(1, 4)],
+        )
+        self.assertEqual(extend_ancestry("r", []), [{"user": "r", "depth": 1}])
+
+
+class BalanceDiffTests(SimpleTestCase):
+    def test_merge_pairs_rows_by_user_and_unit(self):
+        expected = [
+            {"_id": {"user": "a", "unit": "CASH"}},
+            {"_id": {"user": "b", "unit": "POINTS"}},
+        ]
+        stored = [{"user": "a", "unit": "CASH"}, {"user": "a", "unit": "POINTS"}]
+
+        self.assertEqual(
+            [
+                (key, bool(want), bool(have))
+                for key, want, have in _merge(expected, stored)
+            ],
+            [
+                (("a", "CASH"), True, True),
+                (("a", "POINTS"), False, True),
+                (("b", "POINTS"), True, False),
+            ],
+        )
+
+    def test_repair_filter_matches_only_the_row_as_read(self):
+        current = {"pending": 5, "credited": 0, "revoked": 2}
+
+        self.assertEqual(
+            _unchanged("a", "CASH", current),
+            {
+                "user": "a",
+                "unit": "CASH",
+                "pending": 5,
+                "credited": {"$in": [0, None]},
+                "revoked": 2,
+            },
+        )
+
+
+class BalanceRepairTests(MongoTestCase):
+    """
+    One drifted, one missing and one orphaned balance row.
+    """
+
+    def setUp(self):
+        self.drifted, self.missing, self.orphaned = [
+            User(
+                name=name, email=f"{name}@example.com", password="x", is_verified=True
+            ).save()
+            for name in ("drifted", "missing", "orphaned")
+        ]
+
+        RewardLedger._get_collection().insert_many(
+            [
+                self.ledger_row(self.drifted, "SIGNUP", 10, "POINTS", "PENDING"),
+                self.ledger_row(self.drifted, "FIRST_ORDER", 5, "POINTS", "CREDITED"),
+                self.ledger_row(self.missing, "SIGNUP", 20, "CASH", "PENDING"),
+            ]
+        )
+        RewardBalance._get_collection().insert_many(
+            [
+                {
+                    "user": self.drifted.id,
+                    "unit": "POINTS",
+                    "pending": 7,
+                    "credited": 5,
+                },
+                {"user": self.orphaned.id, "unit": "POINTS", "pending": 3},
+            ]
+        )
+
+    def ledger_row(self, user, reward_type, value, unit, status):
+        return {
+            "user": user.id,
+            "referral": None,
+            "reward_type": reward_type,
+            "reward_value": value,
+            "reward_unit": unit,
+            "status": status,
+            "created_at": datetime.utcnow(),
+        }
+
+    def test_dry_run_reports_without_writing(self):
+        report = verify_balances()
+
+        self.assertEqual(
+            (report["drifted"], report["missing"], report["orphaned"]), (1, 1, 1)
+        )
+        self.assertEqual(report["samples"][0]["stored"]["pending"], 7)
+        self.assertEqual(report["samples"][0]["expected"]["pending"], 10)
+        self.assertEqual(RewardBalance.objects.count(), 2)
+
+    def test_repair_matches_the_ledger(self):
+        verify_balances(repair=True)
+
+        self.assertEqual(
+            get_reward_balance(self.drifted.id)["POINTS"],
+            {"pending": 10, "credited": 5, "revoked": 0},
+        )
+        self.assertEqual(get_reward_balance(self.missing.id)["CASH"]["pending"], 20)
+        self.assertFalse(RewardBalance.objects(user=self.orphaned).count())
+
+        report = verify_balances()
+        self.assertEqual(
+            (report["drifted"], report["missing"], report["orphaned"]), (0, 0, 0)
+        )
+
+
+class ImportRowTests(SimpleTestCase):
+    def row(self, **fields):
+        return {"email": "someone@example.com", "name": "Someone", **fields}
+
+    def test_plain_password_is_returned_for_hashing(self):
+        doc, password = user_doc(self.row(email=" someone@example.com ", password=1))
+
+        self.assertEqual(doc["email"], "someone@example.com")
+        self.assertIsNone(doc["password"])
+        self.assertEqual(password, "1")
+        self.assertTrue(doc["is_verified"])
+
+    def test_bcrypt_hash_is_stored_as_is(self):
+        bcrypt_hash = "$2b$12$" + "a" * 53
+
+        doc, password = user_doc(self.row(password_hash=bcrypt_hash, is_verified="no"))
+
+        self.assertEqual(doc["password"], bcrypt_hash)
+        self.assertIsNone(password)
+        self.assertFalse(doc["is_verified"])
+
+    def test_invalid_rows(self):
+        for row, message in [
+            (self.row(email="not-an-email", password="x"), "not a valid email"),
+            (self.row(email="a@b@example.com", password="x"), "not a valid email"),
+            (self.row(name=" ", password="x"), "email and name are required"),
+            (self.row(), "password or password_hash is required"),
+            (self.row(password_hash="plain"), "must be a bcrypt hash"),
+        ]:
+            with self.assertRaisesMessage(ValueError, message):
+                user_doc(row)
+
+
+class PrepareUsersTests(MongoTestCase):
+    def setUp(self):
+        User(
+            name="existing", email="Taken@Example.com", password="x", is_verified=True
+        ).save()
+
+    def test_case_variants_are_rejected(self):
+        rows = [
+            {"email": "taken@example.com"},  # variant of a stored user
+            {"email": "Taken@Example.com"},  # replay: left to the unique index
+            {"email": "new@example.com"},
+            {"email": "NEW@example.com"},  # variant of an earlier row
+            {"email": "broken"},
+        ]
+        batch = [
+            (number, {"name": "row", "password": "x", **row})
+            for number, row in enumerate(rows, 1)
+        ]
+        counts, errors = {}, []
+
+        docs, passwords = prepare_users(batch, counts, errors)
+
+        self.assertEqual(
+            [doc["email"] for doc in docs], ["Taken@Example.com", "new@example.com"]
+        )
+        self.assertEqual(len(passwords), 2)
+        self.assertEqual(counts["invalid"], 3)
+        self.assertEqual(
+            errors,
+            [
+                {"row": 5, "error": "'broken' is not a valid email address"},
+                {"row": 1, "error": "email already registered as Taken@Example.com"},
+                {"row": 4, "error": "email already registered as new@example.com"},
+            ],
+        )
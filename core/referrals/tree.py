@@ -0,0 +1,380 @@
+"""
+Multi-tier referral tree.
+
+The Referral a user claimed carries that user's materialized `ancestry`:
+[{"user": referrer, "depth": 1}, {"user": referrer's referrer, "depth": 2},
+...] up to REFERRAL_TREE_MAX_DEPTH. Downline and subtree queries are
+then indexed array matches on ("ancestry.user", "ancestry.depth")
+instead of recursive $graphLookup walks.
+
+Every ancestry write bumps the document's `tree_version`. An apply
+re-reads its referrer's node after writing and starts over if it moved,
+so concurrent applies can neither close a cycle nor miss ancestors.
+
+The stored ancestry stops at the cap, so when the referrer's is full the
+cycle check keeps walking up from its top ancestor, one node (another
+REFERRAL_TREE_MAX_DEPTH levels) per read, until it reaches a root. Deep
+chains cost one indexed read per REFERRAL_TREE_MAX_DEPTH levels; applies
+are never rejected just for being deep.
+"""
+
+from django.conf import settings
+from pymongo import UpdateOne
+from .models import Referral
+
+# recomputations attach_ancestry tries while the referrer's node keeps moving
+ATTACH_ATTEMPTS = 5
+
+
+def _referrals():
+    return Referral._get_collection()
+
+
+def max_depth():
+    return settings.REFERRAL_TREE_MAX_DEPTH
+
+
+# -----------------------------------
+# Building ancestry
+# -----------------------------------
+def tree_node(user_id):
+    """
+    (ancestry, version) of `user_id`'s node, the referral it claimed:
+    ([], None) for a root (never used a code). `version` changes with
+    every write to the node, including a claim being undone.
+    """
+
+    doc = _referrals().find_one(
+        {"referral_code_used": user_id}, {"ancestry": 1, "tree_version": 1}
+    )
+
+    if not doc:
+        return [], None
+
+    return doc.get("ancestry") or [], (doc["_id"], doc.get("tree_version", 0))
+
+
+def extend_ancestry(referrer_id, referrer_ancestry, limit=None):
+    """
+    Ancestry of someone referred by `referrer_id`.
+    """
+
+    limit = limit or max_depth()
+    chain = [{"user": referrer_id, "depth": 1}] + [
+        {"user": a["user"], "depth": a["depth"] + 1} for a in referrer_ancestry
+    ]
+
+    return [a for a in chain if a["depth"] <= limit]
+
+
+def _depth_of(user_id):
+    """
+    Expression: depth of `user_id` in the document's ancestry.
+    """
+
+    return {
+        "$arrayElemAt": [
+            {
+                "$map": {
+                    "input": {
+                        "$filter": {
+                            "input": "$ancestry",
+                            "cond": {"$eq": ["$$this.user", user_id]},
+                        }
+                    },
+                    "in": "$$this.depth",
+                }
+            },
+            0,
+        ]
+    }
+
+
+def descendants_fixup(user_id, ancestry, limit=None):
+    """
+    (filter, pipeline) that appends `user_id`'s new ancestry to everyone
+    below it, offset by their depth under `user_id`. Entries past the
+    user's own depth are replaced, which keeps the update idempotent.
+    """
+
+    limit = limit or max_depth()
+
+    base = _depth_of(user_id)
+
+    kept = {
+        "$filter": {"input": "$ancestry", "cond": {"$lte": ["$$this.depth", "$$base"]}}
+    }
+    appended = {
+        "$filter": {
+            "input": {
+                "$map": {
+                    "input": ancestry,
+                    "as": "a",
+                    "in": {
+                        "user": "$$a.user",
+                        "depth": {"$add": ["$$a.depth", "$$base"]},
+                    },
+                }
+            },
+            "cond": {"$lte": ["$$this.depth", limit]},
+        }
+    }
+
+    pipeline = [
+        {
+            "$set": {
+                "ancestry": {
+                    "$let": {
+                        "vars": {"base": base},
+                        "in": {"$concatArrays": [kept, appended]},
+                    }
+                },
+                "tree_version": {"$add": [{"$ifNull": ["$tree_version", 0]}, 1]},
+            }
+        }
+    ]
+
+    return {"ancestry.user": user_id}, pipeline
+
+
+def in_upline(user_id, ancestry):
+    """
+    Whether `user_id` is above a full (capped) `ancestry`: walks up from
+    its top entry through each ancestor's own stored ancestry.
+    """
+
+    seen = set()
+
+    while len(ancestry) >= max_depth():
+        top = max(ancestry, key=lambda a: a["depth"])["user"]
+
+        if top in seen:  # a cycle left by older data; it does not reach us
+            return False
+        seen.add(top)
+
+        ancestry = tree_node(top)[0]
+
+        if any(a["user"] == user_id for a in ancestry):
+            return True
+
+    return False
+
+
+def _write_ancestry(referral_id, user_id, ancestry):
+    _referrals().update_one(
+        {"_id": referral_id},
+        {"$set": {"ancestry": ancestry}, "$inc": {"tree_version": 1}},
+    )
+
+    query, pipeline = descendants_fixup(user_id, ancestry)
+    _referrals().update_many(query, pipeline)
+
+
+def attach_ancestry(referral_id, user_id, referrer_id):
+    """
+    Stores the ancestry on the referral `user_id` just claimed and pushes
+    it down to `user_id`'s existing downline. Raises ValueError when the
+    referrer is in the user's own downline, at any depth (that would
+    close a cycle), or its node keeps moving; the caller then undoes the
+    claim.
+
+    The ancestry is written first and the referrer's node (and, past the
+    cap, the rest of the chain) re-read after: if it moved in between
+    (the referrer's own apply, or a concurrent apply closing a cycle
+    through this user), everything is recomputed. Of two applies closing
+    a cycle at least one sees the other's write.
+    """
+
+    written = False
+    cycle = "You cannot use a referral code from your own downline"
+
+    for _ in range(ATTACH_ATTEMPTS):
+        referrer_ancestry, version = tree_node(referrer_id)
+
+        if any(a["user"] == user_id for a in referrer_ancestry):
+            error = cycle
+            break
+
+        ancestry = extend_ancestry(referrer_id, referrer_ancestry)
+        _write_ancestry(referral_id, user_id, ancestry)
+        written = True
+
+        if tree_node(referrer_id)[1] != version:
+            continue
+
+        if in_upline(user_id, referrer_ancestry):
+            error = cycle
+            break
+
+        return ancestry
+    else:
+        error = "The referral tree is busy, please try again"
+
+    # back to a root: no ancestry here, downline truncated below user_id
+    if written:
+        _write_ancestry(referral_id, user_id, [])
+
+    raise ValueError(error)
+
+
+# -----------------------------------
+# Tiered rewards
+# -----------------------------------
+def tier_rewards(ancestry, reward_value):
+    """
+    [(user, tier, value), ...]: tier n gets REFERRAL_TIER_RATES[n-1]
+    percent of the base reward; tiers with no rate or a zero value are
+    skipped.
+    """
+
+    rates = settings.REFERRAL_TIER_RATES
+    rewards = []
+
+    for ancestor in ancestry:
+        tier = ancestor["depth"]
+        if tier > len(rates):
+            continue
+
+        value = reward_value * rates[tier - 1] // 100
+        if value > 0:
+            rewards.append((ancestor["user"], tier, value))
+
+    return rewards
+
+
+# -----------------------------------
+# Downline queries
+# -----------------------------------
+def parse_depth(params):
+    """
+    max_depth query param, 1..REFERRAL_TREE_MAX_DEPTH. Raises ValueError.
+    """
+
+    value = params.get("max_depth")
+    if value in (None, ""):
+        return max_depth()
+
+    try:
+        depth = int(value)
+    except ValueError:
+        raise ValueError("max_depth must be an integer")
+
+    if not 1 <= depth <= max_depth():
+        raise ValueError(f"max_depth must be between 1 and {max_depth()}")
+
+    return depth
+
+
+def downline_filter(user_id, depth):
+    return {"ancestry": {"$elemMatch": {"user": user_id, "depth": {"$lte": depth}}}}
+
+
+def downline_by_depth_pipeline(user_id, depth):
+    return [
+        {"$match": downline_filter(user_id, depth)},
+        {"$project": {"_id": 0, "depth": _depth_of(user_id)}},
+        {"$group": {"_id": "$depth", "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+
+
+def graph_lookup_pipeline(user_id, depth):
+    """
+    Recursive baseline for the benchmark: same counts via $graphLookup.
+    """
+
+    pipeline = [
+        {"$match": {"referred_by": user_id, "referral_code_used": {"$ne": None}}},
+    ]
+
+    if depth > 1:
+        pipeline.append(
+            {
+                "$graphLookup": {
+                    "from": Referral._get_collection_name(),
+                    "startWith": "$referral_code_used",
+                    "connectFromField": "referral_code_used",
+                    "connectToField": "referred_by",
+                    "as": "descendants",
+                    "maxDepth": depth - 2,
+                    "depthField": "level",
+                    "restrictSearchWithMatch": {"referral_code_used": {"$ne": None}},
+                }
+            }
+        )
+
+    pipeline.append(
+        {
+            "$group": {
+                "_id": None,
+                "direct": {"$sum": 1},
+                "indirect": {"$sum": {"$size": {"$ifNull": ["$descendants", []]}}},
+            }
+        }
+    )
+
+    return pipeline
+
+
+def downline_summary(rows, depth):
+    by_depth = {row["_id"]: row["count"] for row in rows}
+
+    return {
+        "max_depth": depth,
+        "total": sum(by_depth.values()),
+        "by_depth": [
+            {"depth": d, "count": by_depth.get(d, 0)} for d in range(1, depth + 1)
+        ],
+    }
+
+
+# -----------------------------------
+# Backfill
+# -----------------------------------
+def rebuild_ancestry(batch_size=1000):
+    """
+    Recomputes every stored ancestry from the referral edges.
+    Returns the number of referrals updated.
+    """
+
+    parent = {
+        doc["referral_code_used"]: doc["referred_by"]
+        for doc in _referrals().find(
+            {"referral_code_used": {"$ne": None}},
+            {"referral_code_used": 1, "referred_by": 1, "_id": 0},
+        )
+    }
+    limit = max_depth()
+
+    def chain(user_id):
+        ancestry, seen = [], {user_id}
+        current = parent.get(user_id)
+
+        while current is not None and len(ancestry) < limit and current not in seen:
+            ancestry.append({"user": current, "depth": len(ancestry) + 1})
+            seen.add(current)
+            current = parent.get(current)
+
+        return ancestry
+
+    ops, updated = [], 0
+
+    for user_id in parent:
+        ancestry = chain(user_id)
+
+        # only nodes that change: the version tells applies a node moved
+        ops.append(
+            UpdateOne(
+                {"referral_code_used": user_id, "ancestry": {"$ne": ancestry}},
+                {"$set": {"ancestry": ancestry}, "$inc": {"tree_version": 1}},
+            )
+        )
+
+        if len(ops) >= batch_size:
+            updated += _referrals().bulk_write(ops, ordered=False).modified_count
+            ops = []
+
+    if ops:
+        updated += _referrals().bulk_write(ops, ordered=False).modified_count
+
+    return updated
@@ -5,8 +5,11 @@ from .views import (
     referral_summary,
     referral_list,
     referral_timeline,
+    referral_downline,
     reward_history,
+    reward_balance,
 )
+from . import async_views
 
 urlpatterns = [
     path("generate/", generate_referral, name="generate-referral"),
@@ -14,5 +17,28 @@ urlpatterns = [
     path("analytics/summary/", referral_summary, name="referral-summary"),
     path("analytics/list/", referral_list, name="referral-list"),
     path("analytics/timeline/", referral_timeline, name="referral-timeline"),
+    path("analytics/downline/", referral_downline, name="referral-downline"),
     path("rewards/history/", reward_history, name="reward-history"),
+    path("rewards/balance/", reward_balance, name="reward-balance"),
+    # async (ASGI) fast path for the read-heavy endpoints
+    path(
+        "async/analytics/summary/",
+        async_views.referral_summary,
+        name="async-referral-summary",
+    ),
+    path(
+        "async/analytics/list/",
+        async_views.referral_list,
+        name="async-referral-list",
+    ),
+    path(
+        "async/analytics/timeline/",
+        async_views.referral_timeline,
+        name="async-referral-timeline",
+    ),
+    path(
+        "async/rewards/history/",
+        async_views.reward_history,
+        name="async-reward-history",
+    ),
 ]
@@ -1,14 +1,12 @@
-import random
-import string
+import secrets
+from django.conf import settings
 
 
-PREFIX = "SVH"
-
-
-def generate_random_code(length=6):
-    chars = string.ascii_uppercase + string.digits
-    return "".join(random.choices(chars, k=length))
+def generate_random_code(length=None, alphabet=None):
+    length = length or settings.REFERRAL_CODE_LENGTH
+    chars = alphabet or settings.REFERRAL_CODE_ALPHABET
+    return "".join(secrets.choice(chars) for _ in range(length))
 
 
 def build_referral_code():
-    return f"{PREFIX}-{generate_random_code()}"
+    return f"{settings.REFERRAL_CODE_PREFIX}-{generate_random_code()}"
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from pymongo import UpdateOne
+from .models import DataVersion
+
+
+def _versions():
+    return DataVersion._get_collection()
+
+
+def bump_data_versions(user_ids):
+    """
+    Invalidates the cached analytics of every user in `user_ids`.
+    """
+
+    now = datetime.utcnow()
+    ops = [
+        UpdateOne(
+            {"user": user_id},
+            {"$inc": {"version": 1}, "$set": {"bumped_at": now}},
+            upsert=True,
+        )
+        for user_id in dict.fromkeys(user_ids)
+        if user_id is not None
+    ]
+
+    if ops:
+        _versions().bulk_write(ops, ordered=False)
+
+
+def bump_all_data_versions():
+    """
+    After a rebuild: every stored version moves, so no cached copy survives.
+    """
+
+    _versions().update_many(
+        {}, {"$inc": {"version": 1}, "$set": {"bumped_at": datetime.utcnow()}}
+    )
+
+
+def get_data_version(user_id):
+    """
+    (version, bumped_at) of the user's analytics data.
+    """
+
+    doc = _versions().find_one(
+        {"user": user_id}, {"version": 1, "bumped_at": 1, "_id": 0}
+    )
+
+    return (doc["version"], doc.get("bumped_at")) if doc else (0, None)
+
+
+def needs_primary_reads(bumped_at):
+    """
+    True while a lagging secondary may still miss the user's last write,
+    which would otherwise be cached under the new version.
+    """
+
+    if bumped_at is None or settings.MONGO_ANALYTICS_READ_PREFERENCE == "primary":
+        return False
+
+    window = timedelta(seconds=max(settings.MONGO_ANALYTICS_MAX_STALENESS, 90))
+
+    return datetime.utcnow() - bumped_at < window
@@ -2,6 +2,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from utils.auth import authenticate
+from utils.ratelimit import rate_limited
 from rest_framework import status
 
 from .services import (
@@ -10,9 +11,16 @@ from .services import (
     get_referral_summary,
     get_referral_list,
     get_referral_timeline,
+    get_downline,
     get_reward_history,
+    get_balance,
+    ReferralCodeUnavailable,
 )
 from .serializers import referral_to_dict
+from .caching import cached_analytics
+from .pagination import parse_page_params
+from .rollups import parse_timeline_params
+from .tree import parse_depth
 
 
 @api_view(["POST"])
@@ -20,13 +28,19 @@ from .serializers import referral_to_dict
 def generate_referral(request):
     user = request.user
 
-    referral = generate_referral_for_user(user)
+    try:
+        referral = generate_referral_for_user(user)
+    except ReferralCodeUnavailable as e:
+        return Response(
+            {"error": str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
 
     return Response(referral_to_dict(referral), status=status.HTTP_201_CREATED)
 
 
 @api_view(["POST"])
 @authenticate
+@rate_limited
 def apply_referral(request):
     try:
         code = request.data.get("referral_code")
@@ -47,6 +61,7 @@ def apply_referral(request):
 
 @api_view(["GET"])
 @authenticate
+@cached_analytics
 def referral_summary(request):
     data = get_referral_summary(request.user)
     return Response(data, status=status.HTTP_200_OK)
@@ -54,20 +69,59 @@ def referral_summary(request):
 
 @api_view(["GET"])
 @authenticate
+@cached_analytics
 def referral_list(request):
-    data = get_referral_list(request.user)
+    try:
+        limit, cursor = parse_page_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = get_referral_list(request.user, limit=limit, cursor=cursor)
     return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
 @authenticate
+@cached_analytics
 def referral_timeline(request):
-    data = get_referral_timeline(request.user)
+    try:
+        params = parse_timeline_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = get_referral_timeline(request.user, **params)
     return Response(data, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
 @authenticate
+@cached_analytics
+def referral_downline(request):
+    try:
+        depth = parse_depth(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = get_downline(request.user, depth)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@authenticate
+@cached_analytics
 def reward_history(request):
-    data = get_reward_history(request.user)
+    try:
+        limit, cursor = parse_page_params(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    data = get_reward_history(request.user, limit=limit, cursor=cursor)
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@authenticate
+@cached_analytics
+def reward_balance(request):
+    data = get_balance(request.user)
     return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from utils.hashing import HashingPool, HashingPoolSaturated
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark login password checks through the bcrypt pool "
+        "for several work factors and pool sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--costs", type=_int_list, default=[10, 11, 12])
+        parser.add_argument("--pool-sizes", type=_int_list, default=[1, 2, 4])
+        parser.add_argument(
+            "--clients", type=int, default=16, help="Concurrent login callers."
+        )
+        parser.add_argument(
+            "--logins", type=int, default=64, help="Logins per scenario."
+        )
+        parser.add_argument("--max-queue", type=int, default=32)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'cost':>4} {'pool':>4} {'logins/s':>9} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'503s':>5}"
+        )
+
+        for cost in options["costs"]:
+            for workers in options["pool_sizes"]:
+                row = self.run_scenario(
+                    cost,
+                    workers,
+                    options["clients"],
+                    options["logins"],
+                    options["max_queue"],
+                )
+                self.stdout.write(
+                    f"{cost:>4} {workers:>4} {row['rate']:>9.1f} "
+                    f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['rejected']:>5}"
+                )
+
+    def run_scenario(self, cost, workers, clients, logins, max_queue):
+        pool = HashingPool(workers=workers, max_queue=max_queue)
+        hashed = pool.hash_password("benchmark-password", rounds=cost)
+
+        def login(_):
+            started = time.perf_counter()
+            try:
+                pool.check_password("benchmark-password", hashed)
+            except HashingPoolSaturated:
+                return None
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as callers:
+            results = list(callers.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+
+        pool.shutdown()
+
+        latencies = sorted(r for r in results if r is not None)
+        ok = len(latencies) or 1
+
+        return {
+            "rate": len(latencies) / elapsed,
+            "p50": latencies[int(0.50 * (ok - 1))] if latencies else 0.0,
+            "p95": latencies[int(0.95 * (ok - 1))] if latencies else 0.0,
+            "rejected": len(results) - len(latencies),
+        }
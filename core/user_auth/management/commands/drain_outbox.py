@@ -0,0 +1,58 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from user_auth.outbox import drain_once, outbox_stats
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails in batches on a thread pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE
+        )
+        parser.add_argument("--workers", type=int, default=settings.OUTBOX_WORKERS)
+        parser.add_argument(
+            "--max-attempts", type=int, default=settings.OUTBOX_MAX_ATTEMPTS
+        )
+        parser.add_argument(
+            "--lease-seconds", type=int, default=settings.OUTBOX_LEASE_SECONDS
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.OUTBOX_POLL_INTERVAL,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain until empty, then exit instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+
+            result = drain_once(
+                batch_size=options["batch_size"],
+                workers=options["workers"],
+                max_attempts=options["max_attempts"],
+                lease_seconds=options["lease_seconds"],
+            )
+
+            if result["claimed"]:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"claimed={result['claimed']} sent={result['SENT']} "
+                    f"retry={result['PENDING']} failed={result['FAILED']} "
+                    f"elapsed={elapsed:.2f}s"
+                )
+                continue
+
+            if options["once"]:
+                break
+
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"Outbox drained: {outbox_stats()}"))
@@ -5,9 +5,15 @@ from mongoengine import (
     BooleanField,
     DateTimeField,
     ReferenceField,
+    IntField,
+    FloatField,
+    ListField,
 )
 from datetime import datetime, timedelta
 
+# case-insensitive email comparison, backed by the users.email_ci index
+EMAIL_COLLATION = {"locale": "en", "strength": 2}
+
 
 class User(Document):
     name = StringField(required=True)
@@ -17,7 +23,13 @@ class User(Document):
     isAdmin = BooleanField(default=False)
     created_at = DateTimeField(default=datetime.now)
 
-    meta = {"collection": "users"}
+    meta = {
+        "collection": "users",
+        "indexes": [
+            # bulk import matches emails regardless of case
+            {"fields": ["email"], "name": "email_ci", "collation": EMAIL_COLLATION},
+        ],
+    }
 
 
 class Otp(Document):
@@ -28,7 +40,10 @@ class Otp(Document):
 
     meta = {
         "collection": "otps",
-        "indexes": [{"fields": ["created_at"], "expireAfterSeconds": 300}],
+        "indexes": [
+            {"fields": ["created_at"], "expireAfterSeconds": 300},
+            ("email", "otp"),
+        ],
     }
 
 
@@ -42,6 +57,75 @@ class Session(Document):
             {
                 "fields": ["created_at"],
                 "expireAfterSeconds": 604800,  # 7 days in seconds
-            }
+            },
+            "token",
         ]
     }
+
+
+class EmailOutbox(Document):
+
+    STATUS = ("PENDING", "SENDING", "SENT", "FAILED")
+
+    subject = StringField(required=True)
+    message = StringField(required=True)
+    from_email = StringField(required=True)
+    recipient_list = ListField(StringField(), required=True)
+
+    status = StringField(choices=STATUS, default="PENDING")
+    attempts = IntField(default=0)
+    next_attempt_at = DateTimeField(default=datetime.now)
+    locked_until = DateTimeField()
+    last_error = StringField()
+
+    created_at = DateTimeField(default=datetime.now)
+    sent_at = DateTimeField()
+    latency_ms = FloatField()
+
+    meta = {
+        "collection": "email_outbox",
+        "indexes": [
+            ("status", "next_attempt_at"),
+            ("status", "locked_until"),
+            ("status", "-sent_at"),
+            {
+                "fields": ["sent_at"],
+                "expireAfterSeconds": 604800,  # keep sent mail for 7 days
+            },
+        ],
+    }
+
+
+class RevokedToken(Document):
+    """
+    Logged-out JWT ids, kept until the token would have expired anyway.
+    """
+
+    jti = StringField(required=True, unique=True)
+    user = ReferenceField(User)
+    revoked_at = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField(required=True)  # UTC, from the token's exp
+
+    meta = {
+        "collection": "revoked_tokens",
+        "indexes": [
+            "revoked_at",  # incremental sync
+            {"fields": ["expires_at"], "expireAfterSeconds": 0},
+        ],
+    }
+
+
+class RateLimitBucket(Document):
+    """
+    Shared token bucket for utils.ratelimit's Mongo backend.
+    """
+
+    id = StringField(primary_key=True)  # "<url name>:<scope>:<key hash>"
+    tokens = FloatField()
+    updated_at = DateTimeField()
+    expires_at = DateTimeField()  # once idle this long the bucket is full again
+
+    meta = {
+        "collection": "rate_limits",
+        "indexes": [{"fields": ["expires_at"], "expireAfterSeconds": 0}],
+    }
@@ -0,0 +1,214 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+from mongoengine.queryset.visitor import Q
+from .models import EmailOutbox
+
+
+def enqueue_email(subject, message, from_email, recipient_list):
+    """
+    Stores an email in the outbox; the drain_outbox worker sends it.
+    """
+
+    entry = EmailOutbox(
+        subject=subject,
+        message=message,
+        from_email=from_email,
+        recipient_list=recipient_list,
+    )
+    entry.save()
+
+    return entry
+
+
+def claim_batch(batch_size, lease_seconds):
+    """
+    Atomically moves up to `batch_size` due emails to SENDING.
+    Emails whose lease expired (crashed worker) are claimed again.
+    """
+
+    claimed = []
+
+    for _ in range(batch_size):
+        now = datetime.now()
+
+        entry = EmailOutbox.objects(
+            Q(status="PENDING", next_attempt_at__lte=now)
+            | Q(status="SENDING", locked_until__lte=now)
+        ).modify(
+            set__status="SENDING",
+            set__locked_until=now + timedelta(seconds=lease_seconds),
+            inc__attempts=1,
+            new=True,
+        )
+
+        if not entry:
+            break
+
+        claimed.append(entry)
+
+    return claimed
+
+
+def backoff_delay(attempts):
+    """
+    Exponential backoff with jitter, capped at OUTBOX_BACKOFF_MAX.
+    """
+
+    delay = settings.OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1))
+    delay = min(delay, settings.OUTBOX_BACKOFF_MAX)
+
+    return delay * random.uniform(0.8, 1.2)
+
+
+def record_failure(entry, error, max_attempts):
+    """
+    Releases a claimed email for a retry after backoff, or marks it FAILED
+    once it used up `max_attempts`. Returns the status.
+    """
+
+    status = "FAILED" if entry.attempts >= max_attempts else "PENDING"
+
+    EmailOutbox.objects(id=entry.id).update_one(
+        set__status=status,
+        set__last_error=str(error)[:500],
+        set__next_attempt_at=datetime.now()
+        + timedelta(seconds=backoff_delay(entry.attempts)),
+        unset__locked_until=True,
+    )
+
+    return status
+
+
+def deliver(entry, connection, max_attempts):
+    """
+    Sends one claimed email and records the outcome. Returns the status.
+    """
+
+    started = time.perf_counter()
+
+    try:
+        send_mail(
+            subject=entry.subject,
+            message=entry.message,
+            from_email=entry.from_email,
+            recipient_list=entry.recipient_list,
+            fail_silently=False,
+            connection=connection,
+        )
+
+    except Exception as e:
+        return record_failure(entry, e, max_attempts)
+
+    EmailOutbox.objects(id=entry.id).update_one(
+        set__status="SENT",
+        set__sent_at=datetime.now(),
+        set__latency_ms=(time.perf_counter() - started) * 1000,
+        unset__locked_until=True,
+        unset__last_error=True,
+    )
+
+    return "SENT"
+
+
+def _deliver_chunk(chunk, max_attempts):
+    # one SMTP connection per worker thread, reused for its whole chunk
+    try:
+        connection = get_connection()
+        connection.open()
+
+    except Exception as e:
+        # SMTP down or refusing our credentials: back off the whole chunk
+        # instead of leaving it in SENDING until the lease expires
+        return [record_failure(entry, e, max_attempts) for entry in chunk]
+
+    try:
+        return [deliver(entry, connection, max_attempts) for entry in chunk]
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass  # the outcomes are already recorded
+
+
+def drain_once(batch_size, workers, max_attempts, lease_seconds):
+    """
+    Claims one batch and sends it on a pool of `workers` threads.
+    """
+
+    entries = claim_batch(batch_size, lease_seconds)
+
+    result = {"claimed": len(entries), "SENT": 0, "PENDING": 0, "FAILED": 0}
+
+    if not entries:
+        return result
+
+    workers = max(1, min(workers, len(entries)))
+    chunks = [entries[i::workers] for i in range(workers)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for statuses in pool.map(lambda c: _deliver_chunk(c, max_attempts), chunks):
+            for status in statuses:
+                result[status] += 1
+
+    return result
+
+
+def outbox_stats(sample_size=200):
+    """
+    Outbox depth per status and send latency over recent deliveries.
+    """
+
+    # one indexed count per status instead of a $group over the collection
+    depth = {
+        status: EmailOutbox.objects(status=status).count()
+        for status in EmailOutbox.STATUS
+    }
+
+    oldest = (
+        EmailOutbox.objects(status="PENDING")
+        .order_by("next_attempt_at")
+        .only("created_at")
+        .first()
+    )
+
+    recent = (
+        EmailOutbox.objects(status="SENT")
+        .order_by("-sent_at")
+        .only("latency_ms", "created_at", "sent_at")
+        .limit(sample_size)
+    )
+
+    send_ms = sorted(r.latency_ms for r in recent if r.latency_ms is not None)
+    queue_ms = sorted(
+        (r.sent_at - r.created_at).total_seconds() * 1000
+        for r in recent
+        if r.sent_at and r.created_at
+    )
+
+    return {
+        "depth": depth,
+        "oldest_pending_age_seconds": (
+            (datetime.now() - oldest.created_at).total_seconds() if oldest else 0
+        ),
+        "send_latency_ms": _percentiles(send_ms),
+        "queue_latency_ms": _percentiles(queue_ms),
+    }
+
+
+def _percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "max": None, "samples": 0}
+
+    def pick(q):
+        return round(values[min(len(values) - 1, int(q * len(values)))], 2)
+
+    return {
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "max": round(values[-1], 2),
+        "samples": len(values),
+    }
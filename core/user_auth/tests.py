@@ -1,3 +1,215 @@
-from django.test import TestCase
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from unittest import mock
+from bson import ObjectId
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from utils.ratelimit import LocalBackend, check_rate_limits, client_ip, parse_rate
+from utils.revocation import BloomFilter, RevocationList
+from utils.testing import MongoTestCase
+from .models import EmailOutbox, RevokedToken
+from .outbox import drain_once, enqueue_email
 
-# Create your tests here.
+
+class UnreachableSMTPBackend(BaseEmailBackend):
+    def open(self):
+        raise smtplib.SMTPConnectError(421, "service not available")
+
+    def send_messages(self, email_messages):
+        raise AssertionError("never reached: open() fails")
+
+
+class DrainOutboxTests(MongoTestCase):
+    def setUp(self):
+        for i in range(3):
+            enqueue_email(
+                "Your OTP",
+                f"code {i}",
+                "noreply@example.com",
+                [f"user-{i}@example.com"],
+            )
+
+    def drain(self, max_attempts=5):
+        return drain_once(
+            batch_size=10, workers=2, max_attempts=max_attempts, lease_seconds=60
+        )
+
+    @override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+    def test_sends_claimed_batch(self):
+        result = self.drain()
+
+        self.assertEqual(result["SENT"], 3)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(EmailOutbox.objects(status="SENT").count(), 3)
+
+    @override_settings(EMAIL_BACKEND="user_auth.tests.UnreachableSMTPBackend")
+    def test_connection_failure_reschedules_chunk(self):
+        started = datetime.now()
+
+        result = self.drain()
+
+        self.assertEqual(result["PENDING"], 3)
+        for entry in EmailOutbox.objects:
+            self.assertEqual(entry.status, "PENDING")
+            self.assertEqual(entry.attempts, 1)
+            self.assertIsNone(entry.locked_until)
+            self.assertIn("service not available", entry.last_error)
+            self.assertGreater(entry.next_attempt_at, started)
+
+    @override_settings(EMAIL_BACKEND="user_auth.tests.UnreachableSMTPBackend")
+    def test_connection_failure_counts_towards_max_attempts(self):
+        result = self.drain(max_attempts=1)
+
+        self.assertEqual(result["FAILED"], 3)
+        self.assertEqual(EmailOutbox.objects(status="FAILED").count(), 3)
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        members = [uuid.uuid4().hex for _ in range(1000)]
+        for jti in members:
+            bloom.add(jti)
+
+        self.assertTrue(all(jti in bloom for jti in members))
+
+        false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class RevocationListTests(MongoTestCase):
+    def revocation_list(self, full_sync_interval=3600):
+        return RevocationList(
+            sync_interval=0, full_sync_interval=full_sync_interval, capacity=100
+        )
+
+    def expires(self, **delta):
+        return (datetime.utcnow() + timedelta(**delta)).replace(microsecond=0)
+
+    def test_revoked_in_one_process_is_seen_by_another(self):
+        writer, reader = self.revocation_list(), self.revocation_list()
+
+        self.assertFalse(reader.is_revoked("jti-1"))  # first, full sync
+
+        writer.revoke("jti-1", ObjectId(), self.expires(hours=1))
+
+        self.assertTrue(writer.is_revoked("jti-1"))
+        self.assertTrue(reader.is_revoked("jti-1"))  # incremental sync
+        self.assertFalse(reader.is_revoked("jti-2"))
+        self.assertEqual(reader.stats()["revoked"], 1)
+
+    def test_revoking_twice_is_a_no_op(self):
+        revocations = self.revocation_list()
+
+        for _ in range(2):
+            revocations.revoke("jti-1", ObjectId(), self.expires(hours=1))
+
+        self.assertEqual(RevokedToken.objects(jti="jti-1").count(), 1)
+        self.assertTrue(revocations.is_revoked("jti-1"))
+
+    def test_full_sync_drops_expired_tokens(self):
+        RevokedToken._get_collection().insert_many(
+            [
+                {
+                    "jti": "expired",
+                    "revoked_at": datetime.utcnow(),
+                    "expires_at": self.expires(minutes=-1),
+                },
+                {
+                    "jti": "live",
+                    "revoked_at": datetime.utcnow(),
+                    "expires_at": self.expires(hours=1),
+                },
+            ]
+        )
+
+        revocations = self.revocation_list(full_sync_interval=0)
+
+        self.assertFalse(revocations.is_revoked("expired"))
+        self.assertTrue(revocations.is_revoked("live"))
+        self.assertEqual(revocations.stats()["revoked"], 1)
+
+
+class ParseRateTests(SimpleTestCase):
+    def test_capacity_and_refill(self):
+        self.assertEqual(parse_rate("10/m"), (10, 10 / 60))
+        self.assertEqual(parse_rate("5/10m"), (5, 5 / 600))
+        self.assertEqual(parse_rate("3/h"), (3, 3 / 3600))
+
+    def test_invalid_rates(self):
+        for rate in ("10", "ten/m", "10/w", "/m"):
+            with self.assertRaises(ValueError):
+                parse_rate(rate)
+
+
+@mock.patch("utils.ratelimit.time.monotonic")
+class LocalBackendTests(SimpleTestCase):
+    def test_bucket_empties_and_refills(self, monotonic):
+        backend = LocalBackend()
+        monotonic.return_value = 100.0
+
+        self.assertEqual([backend.take("k", 2, 1.0) for _ in range(2)], [0.0, 0.0])
+        self.assertAlmostEqual(backend.take("k", 2, 1.0), 1.0)
+
+        monotonic.return_value = 101.5
+        self.assertEqual(backend.take("k", 2, 1.0), 0.0)
+        self.assertAlmostEqual(backend.take("k", 2, 1.0), 0.5)
+
+    def test_refill_stops_at_capacity(self, monotonic):
+        backend = LocalBackend()
+        monotonic.return_value = 0.0
+        backend.take("k", 2, 1.0)
+
+        monotonic.return_value = 3600.0
+        waits = [backend.take("k", 2, 1.0) for _ in range(3)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertGreater(waits[2], 0)
+
+    def test_least_recently_used_key_is_evicted(self, monotonic):
+        backend = LocalBackend(max_keys=2)
+        monotonic.return_value = 0.0
+
+        for key in ("a", "b", "a", "c"):
+            backend.take(key, 1, 1.0)
+
+        self.assertEqual(list(backend._buckets), ["a", "c"])
+
+
+class RateLimitKeyTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def request(self, forwarded=None):
+        headers = {"REMOTE_ADDR": "10.0.0.1"}
+        if forwarded:
+            headers["HTTP_X_FORWARDED_FOR"] = forwarded
+        return self.factory.post("/", **headers)
+
+    def test_client_ip_skips_trusted_proxies(self):
+        spoofed = self.request("6.6.6.6, 1.2.3.4, 10.0.0.9")
+
+        with override_settings(RATE_LIMIT_PROXY_COUNT=0):
+            self.assertEqual(client_ip(spoofed), "10.0.0.1")
+        with override_settings(RATE_LIMIT_PROXY_COUNT=1):
+            self.assertEqual(client_ip(spoofed), "10.0.0.9")
+            self.assertEqual(client_ip(self.request()), "10.0.0.1")
+        with override_settings(RATE_LIMIT_PROXY_COUNT=2):
+            self.assertEqual(client_ip(spoofed), "1.2.3.4")
+            self.assertEqual(client_ip(self.request("1.2.3.4")), "10.0.0.1")
+
+    @override_settings(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMIT_BACKEND="local",
+        RATE_LIMITS={"test-login": {"email": "1/h"}},
+    )
+    def test_email_scope_ignores_case_and_whitespace(self):
+        def attempt(email):
+            request = self.request()
+            request.data = {"email": email}
+            return check_rate_limits(request, "test-login")
+
+        self.assertEqual(attempt(" Someone@Example.com"), 0.0)
+        self.assertGreater(attempt("someone@example.com "), 0)
+        self.assertEqual(attempt("other@example.com"), 0.0)
@@ -1,14 +1,18 @@
 import random
-import bcrypt
+import uuid
 import jwt
 from decouple import config
-from django.core.mail import send_mail
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
 from .models import User, Otp, Session
+from .outbox import enqueue_email
 from datetime import datetime, timedelta
 from utils.auth import authenticate
+from utils.ratelimit import rate_limited
+from utils.principal_cache import principal_cache
+from utils.hashing import hashing_pool, needs_rehash, HashingPoolSaturated
+from utils.revocation import revocation_list, token_expiry
 
 SECRET_KEY = config("JWT-SECRET")
 
@@ -17,7 +21,18 @@ def generate_otp():
     return str(random.randint(100000, 999999))
 
 
+def hashing_unavailable():
+    response = Response(
+        {"error": "Server busy, please retry shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response["Retry-After"] = "1"
+
+    return response
+
+
 @api_view(["POST"])
+@rate_limited
 def signup(request):
     name = request.data.get("name")
     email = request.data.get("email")
@@ -39,19 +54,21 @@ def signup(request):
 
     otp = generate_otp()
 
-    # password hashing
-    hash_pass = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    # password hashing (bounded pool, 503 when saturated)
+    try:
+        hash_pass = hashing_pool.hash_password(password)
+    except HashingPoolSaturated:
+        return hashing_unavailable()
 
     User(name=name, email=email, password=hash_pass, is_verified=False).save()
     Otp(email=email, otp=otp).save()
 
-    # Send OTP via email
-    send_mail(
+    # Queue OTP email; drain_outbox delivers it
+    enqueue_email(
         subject="Your OTP Code",
         message=f"Your OTP code is {otp}",
         from_email="gamesmugler95@gmail.com",
         recipient_list=[email],
-        fail_silently=False,
     )
 
     return Response(
@@ -61,6 +78,7 @@ def signup(request):
 
 
 @api_view(["POST"])
+@rate_limited
 def verify_otp(request):
     email = request.data.get("email")
     otp = request.data.get("otp")
@@ -86,6 +104,7 @@ def verify_otp(request):
 
     user.is_verified = True
     user.save()
+    principal_cache.invalidate_user(user.id)
 
     Otp.objects(email=email).delete()  # Delete used OTP
 
@@ -96,6 +115,7 @@ def verify_otp(request):
 
 
 @api_view(["POST"])
+@rate_limited
 def login(request):
     email = request.data.get("email")
     password = request.data.get("password")
@@ -113,12 +133,30 @@ def login(request):
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    if not bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+    try:
+        password_ok = hashing_pool.check_password(password, user.password)
+    except HashingPoolSaturated:
+        return hashing_unavailable()
+
+    if not password_ok:
         return Response(
             {"error": "Incorrect password."}, status=status.HTTP_401_UNAUTHORIZED
         )
 
-    payload = {"user_id": str(user.id), "exp": datetime.now() + timedelta(days=7)}
+    # Upgrade the stored hash when BCRYPT_ROUNDS changed
+    if needs_rehash(user.password):
+        try:
+            user.password = hashing_pool.hash_password(password)
+            User.objects(id=user.id).update_one(set__password=user.password)
+            principal_cache.invalidate_user(user.id)
+        except HashingPoolSaturated:
+            pass  # try again on the next login
+
+    payload = {
+        "user_id": str(user.id),
+        "exp": datetime.now() + timedelta(days=7),
+        "jti": uuid.uuid4().hex,  # lets logout revoke this token alone
+    }
     token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
     # Store token in Session model
@@ -175,17 +213,26 @@ def verify_session(request):
 @authenticate
 def logout(request):
     token = request.token  # Set by your @authenticate decorator
+    payload = request.token_payload
+
+    # Revoke the token itself; needed in stateless mode, harmless otherwise
+    revoked = bool(payload.get("jti"))
+    if revoked:
+        revocation_list.revoke(payload["jti"], request.user.id, token_expiry(payload))
 
     # Delete the session
     deleted = Session.objects(token=token).delete()
+    principal_cache.invalidate_token(token)
+
+    logged_out = deleted or revoked
 
     response = Response(
         (
             {"valid": True, "message": "Logged out successfully."}
-            if deleted
+            if logged_out
             else {"message": "Session not found."}
         ),
-        status=status.HTTP_200_OK if deleted else status.HTTP_404_NOT_FOUND,
+        status=status.HTTP_200_OK if logged_out else status.HTTP_404_NOT_FOUND,
     )
 
     # Clear the token cookie
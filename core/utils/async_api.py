@@ -0,0 +1,30 @@
+from functools import wraps
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    # DRF's encoder keeps datetimes identical to the sync @api_view output
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def async_api_view(methods):
+    """
+    Minimal async stand-in for DRF's @api_view: rejects other methods.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+
+            return await view_func(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -1,57 +1,163 @@
 # auth/middleware.py
+import asyncio
 import jwt
 from functools import wraps
+from bson import ObjectId
+from bson.errors import InvalidId
 from rest_framework.response import Response
 from rest_framework import status
 from user_auth.models import Session, User
 from decouple import config
+from django.conf import settings
+from utils.principal_cache import principal_cache
+from utils.revocation import revocation_list
+from utils.async_api import json_response
+from utils.mongo_async import get_async_db
 
 SECRET_KEY = config("JWT-SECRET")
 
 
+def _read_token(request):
+    # Check Authorization header
+    token = request.headers.get("Authorization", "").replace("Bearer ", "")
+
+    # If not in header, check cookies
+    if not token:
+        token = request.COOKIES.get("token", "")
+
+    return token
+
+
+def _decode_token(token):
+    """
+    Returns (payload, None) or (None, (body, status)).
+    """
+
+    if not token:
+        return None, (
+            {"message": "No Auth token provided."},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=["HS256"]), None
+    except jwt.ExpiredSignatureError:
+        return None, ({"error": "Token expired."}, status.HTTP_401_UNAUTHORIZED)
+    except jwt.InvalidTokenError:
+        return None, ({"error": "Invalid token."}, status.HTTP_401_UNAUTHORIZED)
+
+
+def _is_stateless(payload):
+    # tokens issued before jti existed keep being checked against Session
+    return settings.AUTH_STATELESS and bool(payload.get("jti"))
+
+
+SESSION_INVALID = (
+    {"error": "Session invalid or expired."},
+    status.HTTP_401_UNAUTHORIZED,
+)
+
+
 def authenticate(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
-        # Check Authorization header
-        token = request.headers.get("Authorization", "").replace("Bearer ", "")
-
-        # If not in header, check cookies
-        if not token:
-            token = request.COOKIES.get("token", "")
-
-        if not token:
-            return Response(
-                {"message": "No Auth token provided."},
-                status=status.HTTP_401_UNAUTHORIZED,
-            )
-
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        except jwt.ExpiredSignatureError:
-            return Response(
-                {"error": "Token expired."}, status=status.HTTP_401_UNAUTHORIZED
-            )
-        except jwt.InvalidTokenError:
-            return Response(
-                {"error": "Invalid token."}, status=status.HTTP_401_UNAUTHORIZED
-            )
-
-        session = Session.objects(token=token).first()
-        if not session:
-            return Response(
-                {"error": "Session invalid or expired."},
-                status=status.HTTP_401_UNAUTHORIZED,
-            )
-
-        # Fetch user and attach to request
-        user = User.objects(id=payload["user_id"]).first()
-        if not user:
-            return Response(
-                {"error": "User not found."}, status=status.HTTP_401_UNAUTHORIZED
-            )
+        token = _read_token(request)
+
+        payload, error = _decode_token(token)
+        if error:
+            return Response(error[0], status=error[1])
+
+        # stateless: a signed, unexpired, unrevoked token is authoritative
+        stateless = _is_stateless(payload)
+        if stateless and revocation_list.is_revoked(payload["jti"]):
+            return Response(*SESSION_INVALID)
+
+        cached = principal_cache.get(token)
+
+        if cached:
+            session, user = cached
+        else:
+            session = None if stateless else Session.objects(token=token).first()
+            if not session and not stateless:
+                return Response(*SESSION_INVALID)
+
+            # Fetch user and attach to request
+            user = User.objects(id=payload["user_id"]).first()
+            if not user:
+                return Response(
+                    {"error": "User not found."}, status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            principal_cache.set(token, session, user)
 
         request.user = user  # 🔐 Attach user object to request
         request.token = token
+        request.token_payload = payload
         return view_func(request, *args, **kwargs)
 
     return wrapper
+
+
+def authenticate_async(view_func):
+    """
+    Async counterpart of `authenticate` for native async views.
+    Session and user are fetched concurrently on a cache miss
+    (only the user in stateless mode).
+    """
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        token = _read_token(request)
+
+        payload, error = _decode_token(token)
+        if error:
+            return json_response(error[0], status=error[1])
+
+        stateless = _is_stateless(payload)
+        if stateless and await revocation_list.ais_revoked(payload["jti"]):
+            return json_response(*SESSION_INVALID)
+
+        cached = principal_cache.get(token)
+
+        if cached:
+            session, user = cached
+        else:
+            db = get_async_db()
+
+            try:
+                user_id = ObjectId(payload["user_id"])
+            except (KeyError, InvalidId):
+                return json_response(
+                    {"error": "User not found."}, status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            users = db[User._get_collection_name()]
+
+            if stateless:
+                session_doc = None
+                user_doc = await users.find_one({"_id": user_id})
+            else:
+                session_doc, user_doc = await asyncio.gather(
+                    db[Session._get_collection_name()].find_one({"token": token}),
+                    users.find_one({"_id": user_id}),
+                )
+
+                if not session_doc:
+                    return json_response(*SESSION_INVALID)
+
+            if not user_doc:
+                return json_response(
+                    {"error": "User not found."}, status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            session = Session._from_son(session_doc) if session_doc else None
+            user = User._from_son(user_doc)
+
+            principal_cache.set(token, session, user)
+
+        request.user = user
+        request.token = token
+        request.token_payload = payload
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
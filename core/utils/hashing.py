@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import bcrypt
+from django.conf import settings
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """
+    Bounded executor for bcrypt work.
+
+    At most `workers` hashes run at once, so a login burst cannot take
+    every CPU away from the cheap endpoints. At most `max_queue` more may
+    wait; beyond that `HashingPoolSaturated` is raised instead of queueing.
+    """
+
+    def __init__(self, workers, max_queue, timeout=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="bcrypt"
+        )
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated("Password hashing capacity exhausted")
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HashingPoolSaturated("Password hashing timed out")
+
+    def hash_password(self, password, rounds=None):
+        salt = bcrypt.gensalt(rounds=rounds or settings.BCRYPT_ROUNDS)
+        hashed = self.run(bcrypt.hashpw, password.encode("utf-8"), salt)
+
+        return hashed.decode("utf-8")
+
+    def check_password(self, password, hashed):
+        return self.run(
+            bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8")
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def hash_cost(hashed):
+    # "$2b$12$<salt+hash>" -> 12
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed):
+    return hash_cost(hashed) != settings.BCRYPT_ROUNDS
+
+
+hashing_pool = HashingPool(
+    workers=settings.HASH_POOL_WORKERS,
+    max_queue=settings.HASH_POOL_MAX_QUEUE,
+    timeout=settings.HASH_POOL_TIMEOUT,
+)
@@ -3,6 +3,7 @@
 from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
+from utils.async_api import json_response
 
 
 def isAdmin(view_func):
@@ -34,3 +35,25 @@ def isAdmin(view_func):
         return view_func(request, *args, **kwargs)
 
     return wrapper
+
+
+def isAdminAsync(view_func):
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = request.user
+
+        if not user:
+            return json_response(
+                {"error": "Authentication required."},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+
+        if not getattr(user, "isAdmin", False):
+            return json_response(
+                {"error": "Admin access required."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        return await view_func(request, *args, **kwargs)
+
+    return wrapper
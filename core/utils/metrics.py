@@ -0,0 +1,148 @@
+import os
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from utils.mongo_metrics import end_request, start_request
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by URL name.",
+    ["view", "method"],
+)
+MONGO_COMMANDS = Histogram(
+    "mongo_commands_per_request",
+    "Mongo commands issued per request, by URL name.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 89),
+)
+MONGO_SECONDS = Histogram(
+    "mongo_duration_seconds_per_request",
+    "Time spent in Mongo commands per request, by URL name.",
+    ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+MONGO_COLLECTION_COMMANDS = Counter(
+    "mongo_collection_commands",
+    "Mongo commands by URL name and collection.",
+    ["view", "collection"],
+)
+MONGO_COLLECTION_SECONDS = Counter(
+    "mongo_collection_duration_seconds",
+    "Time spent in Mongo commands by URL name and collection.",
+    ["view", "collection"],
+)
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return (match.url_name if match else None) or "unmatched"
+
+
+def server_timing(stats, total_ms):
+    """
+    Server-Timing value: app total, mongo total, then one entry per collection.
+    """
+
+    entries = [
+        f"app;dur={total_ms:.1f}",
+        f'mongo;dur={stats.duration_ms:.1f};desc="{stats.commands} cmds"',
+    ]
+
+    for collection, (count, ms) in sorted(stats.by_collection.items()):
+        entries.append(f'mongo-{collection};dur={ms:.1f};desc="{count} cmds"')
+
+    return ", ".join(entries)
+
+
+def _record(request, response, stats, started):
+    total = time.perf_counter() - started
+    view = _view_name(request)
+
+    REQUEST_SECONDS.labels(view, request.method).observe(total)
+    MONGO_COMMANDS.labels(view).observe(stats.commands)
+    MONGO_SECONDS.labels(view).observe(stats.duration_ms / 1000)
+
+    for collection, (count, ms) in stats.by_collection.items():
+        MONGO_COLLECTION_COMMANDS.labels(view, collection).inc(count)
+        MONGO_COLLECTION_SECONDS.labels(view, collection).inc(ms / 1000)
+
+    if settings.SERVER_TIMING_ENABLED:
+        response["Server-Timing"] = server_timing(stats, total * 1000)
+
+    return response
+
+
+class MongoMetricsMiddleware:
+    """
+    Counts the Mongo commands behind each request and reports them as
+    Prometheus metrics labelled by URL name, and as a Server-Timing header
+    when SERVER_TIMING_ENABLED.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        started = time.perf_counter()
+        stats, token = start_request()
+
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+
+        return _record(request, response, stats, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        stats, token = start_request()
+
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+
+        return _record(request, response, stats, started)
+
+
+def metrics(request):
+    """
+    Prometheus scrape endpoint, protected by METRICS_TOKEN. Without a
+    token it is only served while DEBUG is on.
+    """
+
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if request.headers.get("Authorization", "") != expected:
+            return HttpResponse(status=401)
+
+    elif not settings.DEBUG:
+        return HttpResponse(status=403)
+
+    # gunicorn runs several worker processes; merge their samples
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
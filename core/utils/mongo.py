@@ -0,0 +1,121 @@
+"""
+Mongo connections.
+
+Settings only register the aliases (MONGO_DATABASES); each process
+creates its clients on first use, so nothing is opened in a preloading
+gunicorn master and a forked child never reuses its parent's sockets.
+
+"analytics" is a second alias for heavy reads (analytics endpoints,
+leaderboard), normally secondaryPreferred with bounded staleness. Code
+that must read its own recent writes wraps the reads in primary_reads().
+"""
+
+import contextvars
+import os
+from contextlib import contextmanager
+from django.conf import settings
+from mongoengine import connection, register_connection
+from mongoengine.base.common import _document_registry
+from pymongo.read_preferences import make_read_preference, read_pref_mode_from_name
+
+DEFAULT_ALIAS = connection.DEFAULT_CONNECTION_NAME
+ANALYTICS_ALIAS = "analytics"
+
+# databases that benchmarks and tests may drop
+SCRATCH_SUFFIXES = ("-bench", "-scratch", "-test")
+
+_primary_reads = contextvars.ContextVar("mongo_primary_reads", default=False)
+
+
+def read_preference(name, max_staleness=-1):
+    """
+    pymongo read preference from its mode name ("secondaryPreferred").
+    max_staleness (seconds, >= 90) is ignored for "primary".
+    """
+
+    mode = read_pref_mode_from_name(name)
+
+    return make_read_preference(mode, None, max_staleness if mode else -1)
+
+
+def register_connections(databases, name=None):
+    """
+    Registers every alias of `databases` without connecting. `name`
+    points them all at another database (benchmarks).
+    """
+
+    for alias, options in databases.items():
+        options = dict(options)
+        db = name or options.pop("name")
+        options.pop("name", None)
+
+        register_connection(alias, db=db, connect=False, **options)
+
+
+def check_scratch_database(name):
+    """
+    Raises ValueError unless `name` is clearly a throwaway database:
+    never the configured one, and ending in one of SCRATCH_SUFFIXES.
+    """
+
+    if name == settings.MONGO_DB_NAME or not name.endswith(SCRATCH_SUFFIXES):
+        raise ValueError(
+            f"Refusing to use {name!r} as a scratch database: "
+            f"the name must end with one of {', '.join(SCRATCH_SUFFIXES)}"
+        )
+
+
+def client_options(alias):
+    """
+    MongoClient kwargs of an alias (for the async clients).
+    """
+
+    options = dict(settings.MONGO_DATABASES[alias])
+    options.pop("name", None)
+
+    return options
+
+
+# -----------------------------------
+# Read routing
+# -----------------------------------
+def analytics_alias():
+    return DEFAULT_ALIAS if _primary_reads.get() else ANALYTICS_ALIAS
+
+
+def analytics_collection(model):
+    """
+    `model`'s collection on the analytics alias (or the primary inside
+    primary_reads()).
+    """
+
+    return connection.get_db(analytics_alias())[model._get_collection_name()]
+
+
+@contextmanager
+def primary_reads(enabled=True):
+    token = _primary_reads.set(enabled)
+
+    try:
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+
+# -----------------------------------
+# Fork safety
+# -----------------------------------
+def _reset_after_fork():
+    """
+    Forget the clients inherited from the parent; every alias (and every
+    document's cached collection) reconnects on first use in the child.
+    """
+
+    connection._connections.clear()
+    connection._dbs.clear()
+
+    for document in _document_registry.values():
+        document._collection = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
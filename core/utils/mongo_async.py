@@ -0,0 +1,54 @@
+import asyncio
+import weakref
+from django.conf import settings
+from pymongo import AsyncMongoClient
+from utils.mongo import DEFAULT_ALIAS, client_options
+
+# clients per event loop and alias; async clients cannot be shared across loops
+_clients = weakref.WeakKeyDictionary()
+
+# pending closer tasks (one per loop); asyncio only keeps weak references
+_closers = set()
+
+
+async def _close_with_loop(clients):
+    """
+    Waits for the loop to shut down, then closes its clients.
+
+    Both asyncio.run() and asgiref's async_to_sync (an async view under
+    WSGI gets a fresh loop per request) cancel the remaining tasks before
+    closing the loop, so the pools never outlive it.
+    """
+
+    loop = asyncio.get_running_loop()
+
+    try:
+        await loop.create_future()
+    finally:
+        _clients.pop(loop, None)
+
+        for client in clients.values():
+            await client.close()
+
+
+def get_async_db(alias=DEFAULT_ALIAS):
+    """
+    Returns the async pymongo database of `alias` for the running event loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+
+    if clients is None:
+        clients = _clients[loop] = {}
+        closer = loop.create_task(_close_with_loop(clients))
+        _closers.add(closer)
+        closer.add_done_callback(_closers.discard)
+
+    client = clients.get(alias)
+
+    if client is None:
+        client = AsyncMongoClient(**client_options(alias))
+        clients[alias] = client
+
+    return client[settings.MONGO_DB_NAME]
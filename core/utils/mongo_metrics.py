@@ -0,0 +1,77 @@
+import contextvars
+from collections import defaultdict
+from pymongo import monitoring
+
+# commands whose collection name is not under the command name itself
+_COLLECTION_KEYS = {"getMore": "collection"}
+
+_current = contextvars.ContextVar("mongo_request_stats", default=None)
+
+
+class RequestStats:
+    """
+    Mongo commands issued while serving one request.
+    """
+
+    def __init__(self):
+        self.commands = 0
+        self.duration_ms = 0.0
+        self.by_collection = defaultdict(lambda: [0, 0.0])  # name -> [count, ms]
+        self._pending = {}
+
+    def started(self, event):
+        key = _COLLECTION_KEYS.get(event.command_name, event.command_name)
+        collection = event.command.get(key)
+
+        self._pending[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else "-"
+        )
+
+    def finished(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "-")
+        duration_ms = event.duration_micros / 1000
+
+        self.commands += 1
+        self.duration_ms += duration_ms
+        self.by_collection[collection][0] += 1
+        self.by_collection[collection][1] += duration_ms
+
+
+def start_request():
+    """
+    Starts collecting for the current request. Returns (stats, reset token).
+    """
+
+    stats = RequestStats()
+
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Routes command events to the stats of the request that issued them.
+    Commands outside a request (workers, management commands) are ignored.
+    """
+
+    def started(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.started(event)
+
+    def succeeded(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.finished(event)
+
+    def failed(self, event):
+        stats = _current.get()
+        if stats is not None:
+            stats.finished(event)
+
+
+# registered globally in settings, before the first client is created
+command_metrics = CommandMetrics()
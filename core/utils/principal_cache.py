@@ -0,0 +1,121 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class PrincipalCache:
+    """
+    In-process LRU cache of authenticated (session, user) pairs.
+
+    Entries are keyed by a SHA-256 of the token and expire after `ttl`
+    seconds. The cache is per process, so invalidation in one worker only
+    reaches other workers once their entries hit the TTL.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries = OrderedDict()  # key -> (expires_at, session, user)
+        self._keys_by_user = {}  # user_id -> {key, ...}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token):
+        key = hash_token(token)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, session, user = entry
+
+            if expires_at <= now:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return session, user
+
+    def set(self, token, session, user):
+        if self.max_size <= 0:
+            return
+
+        key = hash_token(token)
+        expires_at = time.monotonic() + self.ttl
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (expires_at, session, user)
+            self._keys_by_user.setdefault(str(user.id), set()).add(key)
+
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate_token(self, token):
+        with self._lock:
+            self._remove(hash_token(token))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(str(user_id), ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _remove(self, key):
+        # caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+
+        user_id = str(entry[2].id)
+        keys = self._keys_by_user.get(user_id)
+
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.AUTH_CACHE_MAX_SIZE,
+    ttl=settings.AUTH_CACHE_TTL,
+)
@@ -0,0 +1,211 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from django.conf import settings
+from pymongo import ReturnDocument
+from rest_framework import status
+from rest_framework.response import Response
+from user_auth.models import RateLimitBucket
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    "10/m" -> (capacity 10, refill 10 tokens per 60 seconds as tokens/sec).
+    """
+
+    count, _, period = rate.partition("/")
+    seconds = PERIODS.get(period.strip()[-1:]) if period else None
+
+    if not count.strip().isdigit() or not seconds:
+        raise ValueError(f"Invalid rate {rate!r}; expected e.g. '10/m'")
+
+    # "5/10m": the period may carry a multiplier
+    multiplier = period.strip()[:-1]
+    seconds *= int(multiplier) if multiplier else 1
+
+    return int(count), int(count) / seconds
+
+
+# -----------------------------------
+# Backends: take(key, capacity, refill) -> seconds to wait, 0 if allowed
+# -----------------------------------
+class LocalBackend:
+    """
+    Per-process buckets; bounded LRU so idle keys cannot grow memory.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, refill):
+        now = time.monotonic()
+
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / refill
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return wait
+
+
+class MongoBackend:
+    """
+    Buckets shared by all processes. Refill and take happen in a single
+    pipeline update on the server clock, so concurrent callers cannot
+    both spend the last token.
+    """
+
+    def take(self, key, capacity, refill):
+        elapsed = {
+            "$divide": [
+                {"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]},
+                1000,
+            ]
+        }
+        refilled = {
+            "$min": [
+                capacity,
+                {
+                    "$add": [
+                        {"$ifNull": ["$tokens", capacity]},
+                        {"$multiply": [elapsed, refill]},
+                    ]
+                },
+            ]
+        }
+        # an idle bucket is full again after this long; TTL removes it
+        idle_ms = math.ceil(capacity / refill * 1000)
+
+        doc = RateLimitBucket._get_collection().find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": "$$NOW"}},
+                {
+                    "$set": {
+                        "tokens": {
+                            "$cond": [
+                                {"$gte": ["$tokens", 1]},
+                                {"$subtract": ["$tokens", 1]},
+                                "$tokens",
+                            ]
+                        },
+                        "allowed": {"$gte": ["$tokens", 1]},
+                        "expires_at": {"$add": ["$$NOW", idle_ms]},
+                    }
+                },
+            ],
+            projection={"tokens": 1, "allowed": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+        if doc["allowed"]:
+            return 0.0
+
+        return (1 - doc["tokens"]) / refill
+
+
+_backends = {"local": LocalBackend(), "mongo": MongoBackend()}
+
+
+# -----------------------------------
+# Keys
+# -----------------------------------
+def client_ip(request):
+    """
+    REMOTE_ADDR, or the X-Forwarded-For entry added by the outermost of
+    RATE_LIMIT_PROXY_COUNT trusted proxies.
+    """
+
+    proxies = settings.RATE_LIMIT_PROXY_COUNT
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+
+    if proxies and forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _scope_value(request, scope):
+    if scope == "ip":
+        return client_ip(request)
+
+    if scope == "email":
+        email = request.data.get("email") if hasattr(request, "data") else None
+        return email.strip().lower() if isinstance(email, str) else None
+
+    if scope == "user":
+        user = getattr(request, "user", None)
+        user_id = getattr(user, "id", None)
+        return str(user_id) if user_id else None
+
+    raise ValueError(f"Unknown rate limit scope {scope!r}")
+
+
+def check_rate_limits(request, name):
+    """
+    Takes one token from every bucket configured for `name`.
+    Returns 0 when allowed, else the seconds until a retry can succeed.
+    """
+
+    rules = settings.RATE_LIMITS.get(name)
+    if not settings.RATE_LIMIT_ENABLED or not rules:
+        return 0.0
+
+    backend = _backends[settings.RATE_LIMIT_BACKEND]
+    wait = 0.0
+
+    for scope, rate in rules.items():
+        value = _scope_value(request, scope)
+        if not value:
+            continue
+
+        capacity, refill = parse_rate(rate)
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:24]
+
+        wait = max(wait, backend.take(f"{name}:{scope}:{digest}", capacity, refill))
+
+    return wait
+
+
+def rate_limited(view_func):
+    """
+    Applies RATE_LIMITS[url name]. Place below @api_view (and below
+    @authenticate for per-user limits); answers 429 with Retry-After.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        match = request.resolver_match
+        wait = check_rate_limits(request, match.url_name if match else None)
+
+        if wait:
+            response = Response(
+                {"error": "Too many requests. Please retry later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+            )
+            response["Retry-After"] = str(max(1, math.ceil(wait)))
+            return response
+
+        return view_func(request, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,197 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from pymongo.errors import DuplicateKeyError
+from user_auth.models import RevokedToken
+from utils.mongo_async import get_async_db
+
+# re-read a little before the newest revocation seen, to tolerate clock
+# skew between the app servers that write revoked_at
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings (double hashing on SHA-256).
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        capacity = max(1, capacity)
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item):
+        return all(
+            self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item)
+        )
+
+
+class RevocationList:
+    """
+    Revoked token ids (jti) held in memory behind a Bloom filter.
+
+    New revocations are pulled from Mongo at most once per `sync_interval`
+    seconds, so a logout in one process reaches the others within that
+    window. Every `full_sync_interval` seconds the list is reloaded from
+    scratch, which drops tokens that have expired since.
+    """
+
+    def __init__(self, sync_interval, full_sync_interval, capacity):
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+        self.capacity = capacity
+
+        self._jtis = {}  # jti -> expires_at
+        self._bloom = BloomFilter(capacity)
+        self._mark = None  # newest revoked_at seen
+        self._synced_at = None
+        self._full_synced_at = None
+        self._lock = threading.Lock()
+
+        self.bloom_negatives = 0
+        self.bloom_false_positives = 0
+
+    # -----------------------------------
+    # Lookups
+    # -----------------------------------
+    def is_revoked(self, jti):
+        due = self._claim_sync()
+        if due:
+            self._apply(list(self._collection().find(*self._query(due))), due)
+
+        return self._contains(jti)
+
+    async def ais_revoked(self, jti):
+        due = self._claim_sync()
+        if due:
+            collection = get_async_db()[RevokedToken._get_collection_name()]
+            docs = await collection.find(*self._query(due)).to_list(None)
+            self._apply(docs, due)
+
+        return self._contains(jti)
+
+    def _contains(self, jti):
+        if jti not in self._bloom:
+            self.bloom_negatives += 1
+            return False
+
+        if jti in self._jtis:
+            return True
+
+        self.bloom_false_positives += 1
+        return False
+
+    # -----------------------------------
+    # Revoking
+    # -----------------------------------
+    def revoke(self, jti, user_id, expires_at):
+        try:
+            self._collection().insert_one(
+                {
+                    "jti": jti,
+                    "user": user_id,
+                    "revoked_at": datetime.utcnow(),
+                    "expires_at": expires_at,
+                }
+            )
+        except DuplicateKeyError:
+            pass  # already revoked
+
+        with self._lock:
+            self._add(jti, expires_at)
+
+    # -----------------------------------
+    # Sync
+    # -----------------------------------
+    def _collection(self):
+        return RevokedToken._get_collection()
+
+    def _claim_sync(self):
+        """
+        None, "incremental" or "full". Claiming under the lock keeps
+        concurrent requests from all hitting Mongo at once.
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+            if (
+                self._full_synced_at is None
+                or now - self._full_synced_at >= self.full_sync_interval
+            ):
+                self._full_synced_at = self._synced_at = now
+                return "full"
+
+            if now - self._synced_at >= self.sync_interval:
+                self._synced_at = now
+                return "incremental"
+
+        return None
+
+    def _query(self, kind):
+        projection = {"jti": 1, "expires_at": 1, "revoked_at": 1, "_id": 0}
+
+        if kind == "full" or self._mark is None:
+            return {"expires_at": {"$gt": datetime.utcnow()}}, projection
+
+        return {"revoked_at": {"$gte": self._mark - SYNC_OVERLAP}}, projection
+
+    def _apply(self, docs, kind):
+        with self._lock:
+            if kind == "full":
+                self._jtis = {}
+                self._bloom = BloomFilter(max(self.capacity, 2 * len(docs)))
+
+            for doc in docs:
+                self._add(doc["jti"], doc["expires_at"])
+
+                if self._mark is None or doc["revoked_at"] > self._mark:
+                    self._mark = doc["revoked_at"]
+
+            if self._mark is None:
+                self._mark = datetime.utcnow()
+
+    def _add(self, jti, expires_at):
+        # caller holds the lock
+        self._jtis[jti] = expires_at
+        self._bloom.add(jti)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "revoked": len(self._jtis),
+                "bloom_bits": self._bloom.size,
+                "bloom_hashes": self._bloom.hashes,
+                "bloom_negatives": self.bloom_negatives,
+                "bloom_false_positives": self.bloom_false_positives,
+            }
+
+
+def token_expiry(payload):
+    """
+    The token's exp claim as a naive UTC datetime (as Mongo stores it).
+    """
+
+    return datetime.utcfromtimestamp(payload["exp"])
+
+
+revocation_list = RevocationList(
+    sync_interval=settings.REVOCATION_SYNC_INTERVAL,
+    full_sync_interval=settings.REVOCATION_FULL_SYNC_INTERVAL,
+    capacity=settings.REVOCATION_BLOOM_CAPACITY,
+)
@@ -0,0 +1,60 @@
+"""
+Test helpers.
+
+MongoTestCase points every mongoengine alias at a throwaway database for
+the duration of a test class, empties it after each test and drops it at
+the end, so tests never read or write the configured database.
+"""
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from mongoengine import disconnect_all
+from mongoengine.connection import get_db
+from referrals.config_cache import reward_config_cache
+from utils.mongo import check_scratch_database, register_connections
+from utils.principal_cache import principal_cache
+
+
+def _reset_caches():
+    principal_cache.clear()
+    reward_config_cache.invalidate()
+
+
+class MongoTestCase(SimpleTestCase):
+    db_name = f"{settings.MONGO_DB_NAME}-test"
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+
+        check_scratch_database(cls.db_name)
+
+        disconnect_all()
+        register_connections(settings.MONGO_DATABASES, name=cls.db_name)
+        get_db().client.drop_database(cls.db_name)
+        _reset_caches()
+
+        # the async clients pick their database from MONGO_DB_NAME
+        cls.enterClassContext(override_settings(MONGO_DB_NAME=cls.db_name))
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            get_db().client.drop_database(cls.db_name)
+        finally:
+            disconnect_all()
+            register_connections(settings.MONGO_DATABASES)
+            _reset_caches()
+            super().tearDownClass()
+
+    def tearDown(self):
+        # delete the documents but keep the collections: mongoengine only
+        # creates a document's indexes on its first access in the process
+        db = get_db()
+
+        for name in db.list_collection_names():
+            db[name].delete_many({})
+
+        _reset_caches()
+        super().tearDown()